@@ -28,11 +28,14 @@
 # POSSIBILITY OF SUCH DAMAGE.
 
 import numpy as np # for tolist()
+import threading # for performing independent actions concurrently
 
 import ros_interface # for ItemGeometry and all the functions
 
 ALREADY_SPAWNED = False
 EMULATE_REAL_WORLD = True
+# perform the independent actions of a path step at the same time, e.g., moving the torso and the base
+CONCURRENT_DISPATCH = True
 
 DEFAULT_MASS = 0.2
 
@@ -141,6 +144,115 @@ def set_world_state(signature, move_manipulation_objects):
     return ros_interface.set_world_state_client(robot_x_y_theta, robot_joint_state_dict, item_in_space_infos)
 
 
+def path_step_actions(path):
+    """
+    Returns the actions of a path_program step as a list of (name, action designator string, names of the actions
+    it depends on), in the order their observations are merged.
+    An action starts as soon as all the actions it depends on are done, so independent actions overlap.
+    """
+    action = path[0]
+    if action == 'move_arm':
+        (_, arm, conf1, conf2) = path
+        robot_config = conf2.value.conf
+        # the arm goal is relative to the base, which the torso moves
+        return [('torso', ros_interface.make_move_torso_action_msg(robot_config['pr2Torso']), []),
+                ('arm', ros_interface.make_arm_cart_action_msg(conf2.value, arm), ['torso'])]
+                # ros_interface.make_arm_joint_action_msg(robot_config['pr2LeftArm'], robot_config['pr2RightArm'])
+    elif action == 'move':
+        (_, conf1, conf2) = path
+        robot_config = conf2.value.conf
+        # the torso moves while the base drives, the arm goals are relative to the base, so the arms wait for both
+        return [('torso', ros_interface.make_move_torso_action_msg(robot_config['pr2Torso']), []),
+                ('going', ros_interface.make_going_action_msg(robot_config['pr2Base']), []),
+                # ('look', ros_interface.make_look_action_msg(robot_config['pr2Head']), ['going']),
+                ('left_arm', ros_interface.make_arm_cart_action_msg(conf2.value, 'left'), ['torso', 'going']),
+                ('right_arm', ros_interface.make_arm_cart_action_msg(conf2.value, 'right'), ['torso', 'going'])]
+    elif action == 'gripper':
+        (_, hand, position) = path
+        return [('gripper', ros_interface.make_set_gripper_action_msg(hand, position), [])]
+    elif action == 'grab':
+        (_, hand, object_name) = path
+        return [('grab', ros_interface.make_grip_action_msg(hand, object_name), [])]
+    elif action == 'detach':
+        (_, hand) = path
+        return [('detach', ros_interface.make_release_gripper_action_msg(hand), [])]
+    elif action == 'move_constraint':
+        (_, conf1, conf2) = path
+        raise NotImplementedError
+    elif action == 'pick':
+        (_, object_name) = path
+        raise NotImplementedError
+    elif action == 'release':
+        return [('left_gripper', ros_interface.make_release_gripper_action_msg('left'), []),
+                ('right_gripper', ros_interface.make_release_gripper_action_msg('right'), [])]
+    elif action == 'perceive':
+        (_, obj, region_name, conf, pose) = path
+        x_y_z = (pose.value.x, pose.value.y, pose.value.z)
+        return [('look', ros_interface.make_look_action_msg(x_y_z), []),
+                ('detect', ros_interface.make_detect_action_msg(region_name), ['look'])]
+    return []
+
+
+def perform_action(action_string):
+    """
+    Performs an action with a persistent service proxy from the pool, proxies are not shared between threads.
+    A proxy whose call failed may have a broken connection, so it is closed instead of going back to the pool.
+    """
+    service = ros_interface.acquire_perform_action_service()
+    try:
+        observations = ros_interface.perform_action_client(action_string, service)
+    except Exception:
+        service.close()
+        raise
+    ros_interface.release_perform_action_service(service)
+    return observations
+
+
+def perform_actions(actions):
+    """
+    Performs the actions of a path step, see path_step_actions, each one in its own thread as soon as
+    the actions it depends on are done, or one after another in the declared order if not CONCURRENT_DISPATCH.
+    Once an action failed, the actions that haven't started yet are skipped and its exception is raised.
+    Returns the observations of the actions in the declared order, no matter which finished first.
+    """
+    if not CONCURRENT_DISPATCH or len(actions) == 1:
+        return [ros_interface.perform_action_client(action_string) for (_, action_string, _) in actions]
+    done = dict((name, threading.Event()) for (name, _, _) in actions)
+    results = [None] * len(actions)
+    errors = []
+
+    def perform(index):
+        (name, action_string, dependencies) = actions[index]
+        try:
+            for dependency in dependencies:
+                done[dependency].wait()
+            if not errors:
+                results[index] = perform_action(action_string)
+        except Exception as exception:
+            errors.append(exception)
+        finally:
+            done[name].set()
+
+    threads = [threading.Thread(target=perform, args=(index,)) for index in range(len(actions))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+def set_observed_torso(action_observations, torso_joint_angle):
+    """
+    Going reports the joint states when the base arrives, when the torso may still be moving next to it.
+    The torso action returned, so the torso is at its goal.
+    """
+    for observation in action_observations:
+        if isinstance(observation, dict) and 'pr2Torso' in observation:
+            observation['pr2Torso'] = list(torso_joint_angle)
+
+
 def execute_path(path_program, execute_otherwise_simulate, environment_bodies, signature, arms):
     global ALREADY_SPAWNED, EMULATE_REAL_WORLD
     if not ALREADY_SPAWNED:
@@ -153,62 +265,8 @@ def execute_path(path_program, execute_otherwise_simulate, environment_bodies, s
 
     observations = []
     for path in path_program:
-        action = path[0]
-        if action == 'move_arm':
-            (_, arm, conf1, conf2) = path
-            robot_config = conf2.value.conf
-            observations.extend(
-                ros_interface.perform_action_client(ros_interface.make_move_torso_action_msg(robot_config['pr2Torso'])))
-            observations.extend(
-                ros_interface.perform_action_client(ros_interface.make_arm_cart_action_msg(conf2.value, arm))
-                # ros_interface.perform_action_client(ros_interface.make_arm_joint_action_msg(robot_config['pr2LeftArm'],
-                #                                                                             robot_config['pr2RightArm']))
-            )
-        elif action == 'move':
-            (_, conf1, conf2) = path
-            robot_config = conf2.value.conf
-            observations.extend(
-                ros_interface.perform_action_client(ros_interface.make_move_torso_action_msg(robot_config['pr2Torso'])))
-            observations.extend(
-                ros_interface.perform_action_client(ros_interface.make_going_action_msg(robot_config['pr2Base'])))
-            # observations.extend(
-            #     ros_interface.perform_action_client(ros_interface.make_look_action_msg(robot_config['pr2Head'])))
-            observations.extend(
-                ros_interface.perform_action_client(ros_interface.make_arm_cart_action_msg(conf2.value, 'left'))
-                # ros_interface.perform_action_client(ros_interface.make_arm_joint_action_msg(robot_config['pr2LeftArm'],
-                #                                                                             robot_config['pr2RightArm']))
-            )
-            observations.extend(
-                ros_interface.perform_action_client(ros_interface.make_arm_cart_action_msg(conf2.value, 'right'))
-            )
-        elif action == 'gripper':
-            (_, hand, position) = path
-            observations.extend(
-                ros_interface.perform_action_client(ros_interface.make_set_gripper_action_msg(hand, position)))
-        elif action == 'grab':
-            (_, hand, object_name) = path
-            observations.extend(
-                ros_interface.perform_action_client(ros_interface.make_grip_action_msg(hand, object_name)))
-        elif action == 'detach':
-            (_, hand) = path
-            observations.extend(
-                ros_interface.perform_action_client(ros_interface.make_release_gripper_action_msg(hand)))
-        elif action == 'move_constraint':
-            (_, conf1, conf2) = path
-            raise NotImplementedError
-        elif action == 'pick':
-            (_, object_name) = path
-            raise NotImplementedError
-        elif action == 'release':
-            observations.extend(
-                ros_interface.perform_action_client(ros_interface.make_release_gripper_action_msg('left')))
-            observations.extend(
-                ros_interface.perform_action_client(ros_interface.make_release_gripper_action_msg('right')))
-        elif action == 'perceive':
-            (_, obj, region_name, conf, pose) = path
-            x_y_z = (pose.value.x, pose.value.y, pose.value.z)
-            observations.extend(
-                ros_interface.perform_action_client(ros_interface.make_look_action_msg(x_y_z)))
-            observations.extend(
-                ros_interface.perform_action_client(ros_interface.make_detect_action_msg(region_name)))
-    return observations
\ No newline at end of file
+        for action_observations in perform_actions(path_step_actions(path)):
+            if path[0] == 'move' and CONCURRENT_DISPATCH:
+                set_observed_torso(action_observations, path[2].value.conf['pr2Torso'])
+            observations.extend(action_observations)
+    return observations
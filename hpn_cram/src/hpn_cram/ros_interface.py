@@ -29,6 +29,7 @@
 
 from collections import namedtuple
 import numpy as np  # for forward kinematics transform matrix
+import Queue  # for the pool of perform_designator proxies
 
 import json
 
@@ -53,6 +54,8 @@ ItemInSpace = namedtuple('ItemInSpace', ['name', 'position', 'rotation_matrix',
 spawn_world_service = None
 set_world_state_service = None
 perform_action_service = None
+# idle persistent perform_designator proxies for concurrent actions, each in use by one thread at a time
+perform_action_service_pool = Queue.Queue()
 
 
 def initialize_ros_clients():
@@ -66,10 +69,32 @@ def initialize_ros_clients():
                                              hpn_cram_msgs.srv.SpawnWorld)
     set_world_state_service = rospy.ServiceProxy(NODE_NAMESPACE + '/set_world_state',
                                                  hpn_cram_msgs.srv.SetWorldState)
+    # not persistent, so it connects anew for every call and survives restarts of the server
     perform_action_service = rospy.ServiceProxy(NODE_NAMESPACE + '/perform_designator',
                                                 cram_commander.srv.PerformDesignator)
 
 
+def make_perform_action_service():
+    """
+    Proxies are not thread-safe, so every thread that performs actions concurrently needs its own.
+    They are persistent to reuse the connection, which doesn't reconnect, so close them when a call fails.
+    """
+    return rospy.ServiceProxy(NODE_NAMESPACE + '/perform_designator', cram_commander.srv.PerformDesignator,
+                              persistent=True)
+
+
+def acquire_perform_action_service():
+    """Takes an idle proxy from the pool, or makes one if all of them are in use."""
+    try:
+        return perform_action_service_pool.get_nowait()
+    except Queue.Empty:
+        return make_perform_action_service()
+
+
+def release_perform_action_service(service):
+    perform_action_service_pool.put(service)
+
+
 def make_item_geometry_msg(item_info):
     item_geometry = hpn_cram_msgs.msg.ItemGeometry()
     item_geometry.item_name = item_info.name
@@ -295,10 +320,12 @@ def parse_return_json_string(input_string, return_string):
         return []
 
 
-def perform_action_client(action_string):
+def perform_action_client(action_string, service=None):
+    """Raises the rospy.ServiceException of a failed call, there are no observations to return then."""
     try:
         global perform_action_service
-        response = perform_action_service(action_string)
-        return parse_return_json_string(action_string, response.result)
+        response = (service or perform_action_service)(action_string)
     except rospy.ServiceException, e:
         print "Service call failed: %s" % e
+        raise
+    return parse_return_json_string(action_string, response.result)
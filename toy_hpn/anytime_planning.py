@@ -0,0 +1,211 @@
+import argparse  # for the command line interface
+import multiprocessing  # for improving plans in the background
+import Queue  # for Empty
+import time  # for deadlines
+
+import hpn.fbch  # for State and planBackward
+import hpn.globals  # for rebindPenalty
+
+from toy_fetch_place.world_state import *
+from toy_fetch_place.operators import *
+from toy_fetch_place.landmarks import order_goal_fluents
+from toy_fetch_place.plan_execution import Planner
+from toy_fetch_place.probability_lattice import set_probability_lattice
+from toy_fetch_place.tests import make_kitchen_world, make_goal_states
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class AnytimePlan:
+    """The best plan found so far, for a prefix of the ordered goal conjuncts, a partial plan for the whole goal."""
+    def __init__(self, steps, achieved_fluents, dropped_fluents, heuristic_value=None):
+        """
+        :param list[(str, list)] steps: see interactions
+        :param list[hpn.fbch.Fluent] achieved_fluents: goal conjuncts the plan achieves
+        :param list[hpn.fbch.Fluent] dropped_fluents: goal conjuncts relaxed away
+        :param float heuristic_value: of the whole goal in the belief after simulating the steps
+        """
+        self.steps = steps
+        self.achieved_fluents = achieved_fluents
+        self.dropped_fluents = dropped_fluents
+        self.heuristic_value = heuristic_value
+
+    def is_complete(self):
+        return not self.dropped_fluents
+
+    def __str__(self):
+        return 'AnytimePlan({} steps, dropped {})'.format(len(self.steps),
+                                                          [str(fluent) for fluent in self.dropped_fluents])
+
+
+class AnytimePlanner:
+    """
+    Plans for growing prefixes of the landmark ordered goal conjuncts (see landmarks.order_goal_fluents)
+    until a deadline, then returns the prefix plan with the lowest heuristic value of the whole goal after it,
+    and keeps planning in a background process.
+    The background search runs in a forked process, as HPN and the heuristics keep state in module globals,
+    e.g., heuristic_call_counter and the relaxed domains, which are not thread-safe.
+    Its plans are for the starting state as it was, so they are dropped once the starting state changes.
+    """
+    def __init__(self, operators, heuristic, time_budget):
+        """
+        :param list[hpn.fbch.Operator] operators:
+        :param heuristic: function (start, goal, ops, ancestors, infOkay) -> float
+        :param float time_budget: seconds until plan() returns
+        """
+        self.operators = operators
+        self.planner = Planner(operators, heuristic)
+        self.executor = self.planner.executor
+        self.heuristic = heuristic
+        self.time_budget = time_budget
+        self.best = None
+        self.starting_state = None
+        # version of the starting world state that the plans are for
+        self.starting_version = None
+        self.ordered_fluents = None
+        self.background_process = None
+        # (starting version, prefix length, steps, heuristic value) of the background plans
+        self.background_plans = None
+
+    def deadline_heuristic(self, deadline):
+        """
+        Wraps the heuristic such that it aborts the search after the deadline.
+        :param float deadline: time.time() value, None for none
+        """
+        def heuristic(start, goal, ops, ancestors, infOkay):
+            if deadline is not None and time.time() > deadline:
+                raise DeadlineExceeded()
+            return self.heuristic(start, goal, ops, ancestors, infOkay)
+        return heuristic
+
+    def heuristic_value_after(self, steps, world_state, goal_fluents):
+        """
+        :return float: the heuristic value of the goal in the belief after simulating the steps on a fork
+        """
+        simulated_state = world_state.fork()
+        for step in steps:
+            step = self.executor.rebind_step(step, simulated_state)
+            if self.executor.violated_preconditions(step, simulated_state):
+                return float('inf')
+            self.executor.simulate_step(step, simulated_state)
+        return self.heuristic(hpn.fbch.State([], simulated_state), hpn.fbch.State(goal_fluents), self.operators,
+                              [], True)
+
+    def plan_prefixes(self, first_prefix_length, deadline, found):
+        """
+        :param int first_prefix_length:
+        :param float deadline: time.time() value, None for none
+        :param found: function (prefix length, steps, heuristic value) called with every plan
+        :return int: the length of the prefix that ran out of time, None if all prefixes got planned for
+            or one is unachievable
+        """
+        world_state = self.starting_state.details
+        for prefix_length in range(first_prefix_length, len(self.ordered_fluents) + 1):
+            prefix = self.ordered_fluents[:prefix_length]
+            try:
+                steps = self.planner.plan_steps(world_state, prefix, self.deadline_heuristic(deadline))
+            except DeadlineExceeded:
+                return prefix_length
+            if steps is None:
+                return None
+            # a plan whose steps undo what later steps need can't be reordered, the next prefix may do better
+            steps = self.planner.without_threats(steps, prefix)
+            if steps is None:
+                continue
+            found(prefix_length, steps, self.heuristic_value_after(steps, world_state, self.ordered_fluents))
+        return None
+
+    def improve_best(self, prefix_length, steps, heuristic_value):
+        # a longer prefix is better on ties, it achieves more conjuncts for sure
+        if self.best is None or heuristic_value <= self.best.heuristic_value:
+            self.best = AnytimePlan(steps, self.ordered_fluents[:prefix_length], self.ordered_fluents[prefix_length:],
+                                    heuristic_value)
+
+    def plan_in_background(self, first_prefix_length, deadline):
+        """Runs in the background process, sends the plans to the planner in the calling process."""
+        def found(prefix_length, steps, heuristic_value):
+            self.background_plans.put((self.starting_version, prefix_length, steps, heuristic_value))
+        self.plan_prefixes(first_prefix_length, deadline, found)
+        self.background_plans.close()
+        self.background_plans.join_thread()
+
+    def plan(self, starting_state, goal, background=True, background_time_budget=None):
+        """
+        :param hpn.fbch.State starting_state: with the WorldState as details
+        :param hpn.fbch.State goal:
+        :param bool background: keep planning for the remaining prefixes in a process after the deadline,
+            get the improvements with get_best()
+        :param float background_time_budget: seconds for the background planning, unbounded if None
+        :return AnytimePlan: None if no plan was found, not even for the first conjunct
+        """
+        self.stop()
+        deadline = time.time() + self.time_budget
+        self.starting_state = starting_state
+        self.ordered_fluents = order_goal_fluents(goal.fluents, starting_state.details)
+        self.best = None
+        timed_out_prefix_length = self.plan_prefixes(1, deadline, self.improve_best)
+        self.starting_version = starting_state.details.version
+        if timed_out_prefix_length is not None and background:
+            background_deadline = None if background_time_budget is None else time.time() + background_time_budget
+            self.background_plans = multiprocessing.Queue()
+            self.background_process = multiprocessing.Process(target=self.plan_in_background,
+                                                               args=(timed_out_prefix_length, background_deadline))
+            self.background_process.daemon = True
+            self.background_process.start()
+        return self.get_best()
+
+    def collect_background_plans(self):
+        if self.background_plans is None:
+            return
+        while True:
+            try:
+                (starting_version, prefix_length, steps, heuristic_value) = self.background_plans.get_nowait()
+            except Queue.Empty:
+                break
+            if starting_version == self.starting_version:
+                self.improve_best(prefix_length, steps, heuristic_value)
+
+    def get_best(self):
+        """
+        :return AnytimePlan: a copy of the best plan so far, None if there is none or the starting state
+            changed since, e.g., because the caller executed steps, then the plans are outdated
+        """
+        if self.starting_state is None or self.starting_state.details.version != self.starting_version:
+            self.stop()
+            return None
+        self.collect_background_plans()
+        if self.best is None:
+            return None
+        return AnytimePlan(self.best.steps, self.best.achieved_fluents, self.best.dropped_fluents,
+                           self.best.heuristic_value)
+
+    def is_improving(self):
+        return self.background_process is not None and self.background_process.is_alive()
+
+    def stop(self):
+        """Stops the background planning, the plans it sent so far are still taken by get_best()."""
+        if self.background_process is not None:
+            self.background_process.terminate()
+            self.background_process.join()
+            self.background_process = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plans for one of the tests.py goals within a time budget.')
+    parser.add_argument('goal', type=int, help='index of the tests.py goal')
+    parser.add_argument('--budget', type=float, default=10, help='seconds until the best plan so far is returned')
+    parser.add_argument('--wait', type=float, default=0, help='seconds to let the background planning improve it')
+    arguments = parser.parse_args()
+    hpn.globals.glob.rebindPenalty = 5
+    operators = [go_operator, manipulate_environment_operator, pick_up_operator, place_operator,
+                 examine_environment_operator, examine_hand_operator]
+    planner = AnytimePlanner(operators, false_fluents_heuristic, arguments.budget)
+    world_state = WorldState.to_world_state(make_kitchen_world())
+    set_probability_lattice(world_state, operators)
+    print planner.plan(hpn.fbch.State([], world_state), make_goal_states()[arguments.goal])
+    if arguments.wait:
+        time.sleep(arguments.wait)
+        print planner.get_best()
+    planner.stop()
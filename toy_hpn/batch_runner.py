@@ -0,0 +1,260 @@
+import argparse  # for the command line interface
+import csv  # for the results table
+import multiprocessing  # for running episodes in parallel
+import os  # for devnull
+import random  # for seeding DDist draws and randomizing initial worlds
+import signal  # for timing out episodes in the workers
+import sys  # for silencing the workers
+import time  # for wall time
+
+import hpn.fbch  # for State and HPN
+import hpn.globals  # for rebindPenalty
+
+from toy_fetch_place.world import *
+from toy_fetch_place.world_state import *
+from toy_fetch_place.operators import *
+from toy_fetch_place.probability_lattice import set_probability_lattice
+from toy_fetch_place.tests import make_kitchen_world, make_goal_states
+
+
+DEFAULT_FAIL_PROBABILITIES = {'Go': 0.1, 'PickUp': 0.5, 'Place': 0.4, 'Regrasp': 0.8, 'ManipulateEnvironment': 0.3}
+
+OPERATORS = [go_operator, manipulate_environment_operator, pick_up_operator, place_operator,
+             examine_environment_operator, examine_hand_operator]
+
+# seconds the pool waits for an episode beyond its timeout before it kills the workers
+TIMEOUT_GRACE = 10
+
+RESULT_COLUMNS = ['episode', 'seed', 'goal_index', 'rebind_penalty', 'fail_probabilities',
+                  'success', 'wall_time', 'failed_primitives', 'executed_primitives', 'error']
+
+
+class EpisodeWorld(World):
+    """World that counts the primitives it executes and how many of them failed."""
+    def __init__(self, environment, robot, operator_fail_probabilities):
+        World.__init__(self, environment, robot, operator_fail_probabilities)
+        self.executed_primitives = 0
+        self.failed_primitives = 0
+
+    def executePrim(self, operator_name, primitive_arguments):
+        observation = World.executePrim(self, operator_name, primitive_arguments)
+        self.executed_primitives += 1
+        # a failed transition leaves the world as it was, so the observation is not the goal
+        if operator_name in ['ManipulateEnvironment', 'Go', 'PickUp', 'Place', 'Regrasp'] and \
+                observation != primitive_arguments[2]:
+            self.failed_primitives += 1
+        return observation
+
+
+def make_random_world(random_generator, operator_fail_probabilities):
+    """
+    Puts the items of the tests.py kitchen at random locations, possibly into robot's hands,
+    and opens random containers. The robot stands at a random location that is not a container.
+    :param random.Random random_generator:
+    :param dict[str: float] operator_fail_probabilities:
+    :return EpisodeWorld:
+    """
+    kitchen = make_kitchen_world()
+    items = [Item(item.name, item.item_type) for item in kitchen.items if item.item_type != 'robot']
+    free_arms = list(Robot.possible_arms)
+    items_in_hands = {}
+    items_at_locations = {location: [] for location in Environment.possible_locations}
+    for item in items:
+        # every fifth item or so ends up in a hand, as long as there are free hands
+        if free_arms and random_generator.random() < 0.2:
+            items_in_hands[free_arms.pop(random_generator.randrange(len(free_arms)))] = item
+        else:
+            items_at_locations[random_generator.choice(Environment.possible_locations)].append(item)
+    robot = Robot(kitchen.get_robot_name(), items_in_hands)
+    robot_locations = [location for location in Environment.possible_locations
+                       if location not in Environment.container_locations]
+    items_at_locations[random_generator.choice(robot_locations)].append(robot)
+    container_states = {container: random_generator.choice(Environment.possible_container_states)
+                        for container in Environment.container_locations}
+    environment = Environment(kitchen.environment.name, items_at_locations, container_states)
+    return EpisodeWorld(environment, robot, operator_fail_probabilities)
+
+
+def goal_holds_in_world(goal, world):
+    """
+    Checks the goal against the true world, ignoring the confidences, which only exist in the belief.
+    :param hpn.fbch.State goal:
+    :param World world:
+    :return bool:
+    """
+    for fluent in goal.fluents:
+        if fluent.predicate == 'Know':
+            (nested_fluent, value, probability) = fluent.args
+            if (nested_fluent.test(world) == value) != fluent.value:
+                return False
+        elif fluent.test(world) != fluent.value:
+            return False
+    return True
+
+
+class EpisodeTimeout(Exception):
+    pass
+
+
+def raise_episode_timeout(signal_number, frame):
+    raise EpisodeTimeout()
+
+
+def format_fail_probabilities(fail_probabilities):
+    return ' '.join('{}={}'.format(operator_name, probability)
+                    for (operator_name, probability) in sorted(fail_probabilities.items()))
+
+
+def parse_fail_probabilities(text):
+    """
+    :param str text: e.g., 'Go=0.1 PickUp=0.5', the operators not given keep their default fail probability
+    :return dict[str: float]:
+    """
+    fail_probabilities = dict(DEFAULT_FAIL_PROBABILITIES)
+    for assignment in text.replace(',', ' ').split():
+        (operator_name, probability) = assignment.split('=')
+        if operator_name not in DEFAULT_FAIL_PROBABILITIES:
+            raise argparse.ArgumentTypeError('unknown operator {}'.format(operator_name))
+        fail_probabilities[operator_name] = float(probability)
+    return fail_probabilities
+
+
+def timed_out_result(episode_spec):
+    return {'episode': episode_spec['episode'],
+            'seed': episode_spec['seed'],
+            'goal_index': episode_spec['goal_index'],
+            'rebind_penalty': episode_spec['rebind_penalty'],
+            'fail_probabilities': format_fail_probabilities(episode_spec['fail_probabilities']),
+            'success': False,
+            'wall_time': episode_spec['timeout'],
+            'failed_primitives': None,
+            'executed_primitives': None,
+            'error': 'timed out after {} seconds'.format(episode_spec['timeout'])}
+
+
+def run_episode(episode_spec):
+    """
+    Runs one HPN episode without drawing or file output, interrupted after episode_spec['timeout'] seconds.
+    :param dict episode_spec: as made by make_episode_specs()
+    :return dict: one row of the results table, with RESULT_COLUMNS as keys
+    """
+    random.seed(episode_spec['seed'])
+    world = make_random_world(random.Random(episode_spec['seed']), episode_spec['fail_probabilities'])
+    starting_state = hpn.fbch.State([], WorldState.to_world_state(world))
+    set_probability_lattice(starting_state.details, OPERATORS)
+    goal = make_goal_states()[episode_spec['goal_index']]
+    hpn.globals.glob.rebindPenalty = episode_spec['rebind_penalty']
+    error = ''
+    start_time = time.time()
+    signal.signal(signal.SIGALRM, raise_episode_timeout)
+    signal.setitimer(signal.ITIMER_REAL, episode_spec['timeout'])
+    try:
+        hpn.fbch.HPN(starting_state, goal, OPERATORS, world, h=false_fluents_heuristic,
+                     fileTag=None, hpnFileTag=None)
+    except EpisodeTimeout:
+        error = 'timed out after {} seconds'.format(episode_spec['timeout'])
+    except Exception as exception:
+        error = '{}: {}'.format(type(exception).__name__, exception)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    wall_time = time.time() - start_time
+    return {'episode': episode_spec['episode'],
+            'seed': episode_spec['seed'],
+            'goal_index': episode_spec['goal_index'],
+            'rebind_penalty': episode_spec['rebind_penalty'],
+            'fail_probabilities': format_fail_probabilities(episode_spec['fail_probabilities']),
+            'success': not error and goal_holds_in_world(goal, world),
+            'wall_time': wall_time,
+            'failed_primitives': world.failed_primitives,
+            'executed_primitives': world.executed_primitives,
+            'error': error}
+
+
+def make_episode_specs(episodes_per_goal, goal_indices=None, rebind_penalties=(5,),
+                       fail_probabilities_list=(DEFAULT_FAIL_PROBABILITIES,), first_seed=0, timeout=600):
+    """
+    Makes a sweep over goals, rebind penalties and fail probabilities,
+    with episodes_per_goal differently seeded episodes for each combination.
+    :param int episodes_per_goal:
+    :param list[int] goal_indices: indices into tests.make_goal_states(), all goals if None
+    :param list[float] rebind_penalties:
+    :param list[dict[str: float]] fail_probabilities_list:
+    :param int first_seed:
+    :param float timeout: seconds per episode, the episode is recorded as timed out after that
+    :return list[dict]:
+    """
+    if goal_indices is None:
+        goal_indices = range(len(make_goal_states()))
+    episode_specs = []
+    for fail_probabilities in fail_probabilities_list:
+        for rebind_penalty in rebind_penalties:
+            for goal_index in goal_indices:
+                for _ in range(episodes_per_goal):
+                    episode_specs.append({'episode': len(episode_specs),
+                                          'seed': first_seed + len(episode_specs),
+                                          'goal_index': goal_index,
+                                          'rebind_penalty': rebind_penalty,
+                                          'fail_probabilities': fail_probabilities,
+                                          'timeout': timeout})
+    return episode_specs
+
+
+def silence_output():
+    sys.stdout = open(os.devnull, 'w')
+
+
+def run_batch(episode_specs, processes=None, results_file_name=None):
+    """
+    Fans the episodes out over a process pool and collects their results into one table.
+    :param list[dict] episode_specs: as made by make_episode_specs()
+    :param int processes: number of worker processes, as many as CPUs if None
+    :param str results_file_name: if given, the table is written there as CSV
+    :return list[dict]: the results table sorted by episode
+    """
+    results = []
+    pending_specs = list(episode_specs)
+    while pending_specs:
+        pool = multiprocessing.Pool(processes, initializer=silence_output)
+        async_results = [pool.apply_async(run_episode, [episode_spec]) for episode_spec in pending_specs]
+        pool.close()
+        killed = False
+        for (index, async_result) in enumerate(async_results):
+            # the episodes time out on their own, an episode stuck where the alarm can't interrupt it
+            # gets the pool killed, and the episodes after it run again in a new pool
+            try:
+                results.append(async_result.get(pending_specs[index]['timeout'] + TIMEOUT_GRACE))
+            except multiprocessing.TimeoutError:
+                results.append(timed_out_result(pending_specs[index]))
+                pool.terminate()
+                pending_specs = pending_specs[index + 1:]
+                killed = True
+                break
+        pool.join()
+        if not killed:
+            pending_specs = []
+    results.sort(key=lambda result: result['episode'])
+    if results_file_name:
+        with open(results_file_name, 'wb') as results_file:
+            writer = csv.DictWriter(results_file, RESULT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(results)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs many seeded toy HPN episodes in parallel.')
+    parser.add_argument('results_file_name', help='CSV file to write the results table to')
+    parser.add_argument('--episodes-per-goal', type=int, default=100)
+    parser.add_argument('--goals', type=int, nargs='*', help='indices of the tests.py goals, all if not given')
+    parser.add_argument('--rebind-penalties', type=float, nargs='*', default=[5])
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--fail-probabilities', type=parse_fail_probabilities, nargs='*',
+                        default=[DEFAULT_FAIL_PROBABILITIES],
+                        help='fail probabilities to sweep over, each like "Go=0.1,PickUp=0.5", '
+                             'operators not given keep their default')
+    parser.add_argument('--first-seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=600, help='seconds per episode')
+    arguments = parser.parse_args()
+    run_batch(make_episode_specs(arguments.episodes_per_goal, arguments.goals, arguments.rebind_penalties,
+                                 arguments.fail_probabilities, arguments.first_seed, arguments.timeout),
+              arguments.processes, arguments.results_file_name)
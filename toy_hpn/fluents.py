@@ -5,9 +5,82 @@ import hpnutil.miscUtil  # for isVar in Know fluent
 
 from toy_fetch_place.world import *
 from toy_fetch_place.world_state import *
+from toy_fetch_place.goal_index import know_fluents_glb
 
 
-class ConfidenceFluent(hpn.fbch.Fluent):
+def make_heuristic_operator(name, cost):
+    operator = hpn.fbch.Operator(name, ['dummy'], {}, [], cost=cost)
+    # easyH need instanceCost value of the operator, which is calculated automatically
+    # however, the default value is 'none', which is a string, and easyH expects only numbers
+    # so we set instanceCost manually here after creation
+    operator.instanceCost = cost
+    return operator
+
+
+# easyH unions the operator sets of the false fluents and sums the costs of the operators in the union,
+# so every fluent needs operators of its own, or k fluents that each need an examine would cost 1 together
+def get_heuristic_operator(name, cost, fluent, world_state):
+    """
+    :param str name: e.g., HeuristicExamine
+    :param float cost:
+    :param hpn.fbch.Fluent fluent: the fluent that needs the operator
+    :param WorldState world_state: keeps the operators for itself and its forks, so they go away with the search
+    :return hpn.fbch.Operator: the same operator for the same name and fluent, made once
+    """
+    key = (name, fluent)
+    if key not in world_state.heuristic_operators:
+        world_state.heuristic_operators[key] = make_heuristic_operator(name, cost)
+    return world_state.heuristic_operators[key]
+
+
+def cached_heuristic_val(fluent, world_state, compute):
+    """
+    Caches the result of heuristicVal per fluent and world state version.
+    :param hpn.fbch.Fluent fluent:
+    :param WorldState world_state:
+    :param compute: function without arguments returning (cost, set of operators)
+    :return tuple: (cost, set of operators), the set is a fresh copy, so the caller can change it
+    """
+    (cost, operators) = world_state.get_or_evaluate(('heuristicVal', fluent),
+                                                    lambda: tuple(compute()))
+    return (cost, set(operators))
+
+
+class StructuralKeyFluent(object):
+    """
+    Hashes and compares fluents by a tuple of their predicate and arguments, cached until update(), and their value,
+    instead of by the strings HPN builds, which are only needed for display.
+    """
+    def make_structural_key(self):
+        """
+        :return tuple: predicate and arguments, without the value
+        """
+        return (self.predicate,) + tuple(self.args)
+
+    def structural_key(self):
+        if getattr(self, 'cached_structural_key', None) is None:
+            self.cached_structural_key = self.make_structural_key()
+        return self.cached_structural_key
+
+    def update(self):
+        self.cached_structural_key = None
+        self.cached_hash = None
+        super(StructuralKeyFluent, self).update()
+
+    def __hash__(self):
+        if getattr(self, 'cached_hash', None) is None:
+            self.cached_hash = hash(self.structural_key())
+        return self.cached_hash
+
+    def __eq__(self, other):
+        return isinstance(other, StructuralKeyFluent) and self.structural_key() == other.structural_key() and \
+            self.value == other.value
+
+    def __ne__(self, other):
+        return not self == other
+
+
+class ConfidenceFluent(StructuralKeyFluent, hpn.fbch.Fluent):
     def probability(self, world_state):
         '''
         This function should return a number between 0 and 1,
@@ -19,8 +92,17 @@ class ConfidenceFluent(hpn.fbch.Fluent):
         '''
         raise NotImplementedError
 
+    def value_and_probability(self, world_state):
+        '''
+        Returns (test(), probability()), cached in the world state until it changes.
+        :param WorldState world_state:
+        :return tuple:
+        '''
+        return world_state.get_or_evaluate(self.structural_key(),
+                                           lambda: (self.test(world_state), self.probability(world_state)))
+
 
-class Know(hpn.belief.BFluent):
+class Know(StructuralKeyFluent, hpn.belief.BFluent):
     predicate = 'Know'
     # Parameters are nested_fluent, value, probability/confidence
     # This class is based on (copy pasted and adapted from) hpn.belief.Bd
@@ -34,6 +116,15 @@ class Know(hpn.belief.BFluent):
         super(self.__class__, self).update()
 
     # Try to make this hash well, but also be optimistic.  In this case, p down
+    # The rounding is fixed, such that the key of a fluent doesn't depend on any transition model.
+    def make_structural_key(self):
+        (nested_fluent, value, probability) = self.args
+        if not hpnutil.miscUtil.isVar(nested_fluent):
+            nested_fluent = nested_fluent.structural_key()
+        if not hpnutil.miscUtil.isVar(probability):
+            probability = hpnutil.miscUtil.roundDownStr(probability, 2)
+        return (self.predicate, nested_fluent, value, probability)
+
     def optArgString(self):
         if hpnutil.miscUtil.isVar(self.args[2]):
             probStr = self.args[2]
@@ -63,8 +154,12 @@ class Know(hpn.belief.BFluent):
     def test(self, world_state):
         (nested_fluent, value, probability) = self.args
         assert hpnutil.miscUtil.isVar(probability) or (0 <= probability <= 1) or probability == None
-        fluent_value = nested_fluent.test(world_state)
-        fluent_probability = nested_fluent.probability(world_state)
+        (fluent_value, fluent_probability) = nested_fluent.value_and_probability(world_state)
+        lattice = world_state.probability_lattice
+        if lattice and probability is not None:
+            # only compare the levels the belief updates can reach, see probability_lattice
+            fluent_probability = lattice.round_down(fluent_probability)
+            probability = lattice.round_down(probability)
         return fluent_value == value and fluent_probability >= probability
 
     def heuristicVal(self, world_state):
@@ -72,58 +167,41 @@ class Know(hpn.belief.BFluent):
         Return cost and a set of operations.
         Useful if it will require backtracking to get good bindings
         """
+        return cached_heuristic_val(self, world_state, lambda: self.compute_heuristic_val(world_state))
+
+    def compute_heuristic_val(self, world_state):
         [nested_fluent, value, probability] = self.args
         know_or_not_know = self.value
-        examine_op = hpn.fbch.Operator('HeuristicExamine', ['dummy'], {}, [], cost=1)
-        # easyH need instanceCost value of the operator, which is calculated automatically
-        # however, the default value is 'none', which is a string, and easyH expects only numbers
-        # so we set instanceCost manually here after creation,
-        # and if it has to change automatically, it can happen afterwards
-        examine_op.instanceCost = 1
         if nested_fluent.predicate == 'Location':
             [item_name] = nested_fluent.args
             item_location = nested_fluent.value
             if item_location in world_state.get_item_locations(item_name):
                 confidence = world_state.get_probability_of_item_at_location(item_name, item_location)
                 if 0.5 <= confidence < 1.0:
-                    return (1, {examine_op})
+                    return (1, {get_heuristic_operator('HeuristicExamine', 1, self, world_state)})
                 elif confidence == 1.0:
                     return (0, set())
             else:
-                move_item_op = hpn.fbch.Operator('HeuristicMoveItem', ['dummy'], {}, [], cost=1)
-                move_item_op.instanceCost = 1
-                return (2, {move_item_op, examine_op})
-            return (1, {examine_op})
+                return (2, {get_heuristic_operator('HeuristicMoveItem', 1, self, world_state),
+                           get_heuristic_operator('HeuristicExamine', 1, self, world_state)})
+            return (1, {get_heuristic_operator('HeuristicExamine', 1, self, world_state)})
         elif nested_fluent.predicate == 'InHand':
-            return (1, {examine_op})
+            return (1, {get_heuristic_operator('HeuristicExamine', 1, self, world_state)})
         elif nested_fluent.predicate == 'ContainerState':
-            return (1, {examine_op})
+            return (1, {get_heuristic_operator('HeuristicExamine', 1, self, world_state)})
         else:
             raise Exception("Know currently only supports 3 nested fluents. {} was given.".
                             format(nested_fluent.predicate))
 
     def fglb(self, other_fluent, world_state):
-        [nested_fluent, value, probability] = self.args
-        know = self.value
-        if other_fluent.predicate == 'Know':
-            [other_nested_fluent, other_value, other_probability] = other_fluent.args
-            other_know = other_fluent.value
-            # F(X) = val1 and F(X) = val2 default behavior redefinition
-            if nested_fluent == other_nested_fluent and value == other_value and probability == other_probability\
-                    and know != other_know:
-                # Basic FBCH already does this case, but I think since we're
-                # overriding this method now, we have to handle it.
-                return False, {}
-            elif nested_fluent == other_nested_fluent and value == other_value and know == other_know\
-                and probability != other_probability:
-                if probability > other_probability:
-                    return self, {}
-                else:
-                    return other_fluent, {}
-            else:
-                return {self, other_fluent}, {}
-        else:
+        # same rules as for whole goals, see GoalFluentIndex
+        glb = know_fluents_glb(self, other_fluent)
+        if glb is False:
+            return False, {}
+        elif glb is None:
             return {self, other_fluent}, {}
+        else:
+            return glb, {}
 
 
 class IsRobot(hpn.fbch.Fluent):
@@ -144,13 +222,14 @@ class IsRobot(hpn.fbch.Fluent):
         Return cost and a set of operations.
         Useful if it will require backtracking to get good bindings
         """
+        return cached_heuristic_val(self, world_state, lambda: self.compute_heuristic_val(world_state))
+
+    def compute_heuristic_val(self, world_state):
         [name] = self.args
         if name == world_state.get_robot_name():
             return (0, set())
         else:
-            op = hpn.fbch.Operator('HeuristicIsRobot', ['dummy'], {}, [], cost = 100)
-            op.instanceCost = 100
-            return (1, {op})
+            return (1, {get_heuristic_operator('HeuristicIsRobot', 100, self, world_state)})
 
 
 class Location(ConfidenceFluent):
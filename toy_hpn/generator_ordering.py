@@ -0,0 +1,129 @@
+import copy  # for deepcopy
+import fcntl  # for locking the table file against other processes
+import json  # for the table file
+import os  # for replacing the table file
+import tempfile  # for mkstemp
+
+# Opt-in reordering of generator yields by how often a yielded binding ended up in a plan.
+# The table maps a context, the operator, the generator and its input values, to the bindings yielded in it,
+# each with how often it was proposed and how often a plan used it.
+# Plans are lists of steps (operator_name, argument_values), see interactions.
+
+DEFAULT_LEARNED_GENERATORS = ['GenExamineRegressProb', 'GenPlaceArm', 'GenCurrentContainerState', 'GenFreeArm',
+                              'GenRegraspNewArm', 'GenRegraspCurrentArm']
+
+
+def context_key(operator_name, generator, input_values):
+    return json.dumps([operator_name, generator.__class__.__name__, [str(value) for value in input_values]])
+
+
+def binding_key(binding):
+    return json.dumps([str(value) for value in binding])
+
+
+def load_table(file_name):
+    """
+    :return dict[str: dict[str: list[int]]]: the table of the file, empty if there's no file yet
+    """
+    if not os.path.exists(file_name):
+        return {}
+    with open(file_name) as table_file:
+        return json.load(table_file)
+
+
+class LearnedGeneratorOrdering:
+    """
+    Wraps the fun of generator instances of operators, which then yield the bindings in the order of their
+    success rate in the context, smoothed such that unseen bindings keep their hard-coded order among the bindings
+    with a rate of 1/2. The generators' yields are enumerated completely to reorder them, so only generators with
+    few candidates should be learned.
+    """
+    def __init__(self, file_name):
+        """
+        :param str file_name: JSON file, created on the first save
+        """
+        self.file_name = file_name
+        self.table = load_table(file_name)
+        # the table as of the last load or save, the counts beyond it are added to the file's when saving
+        self.saved_table = copy.deepcopy(self.table)
+        self.wrapped_generators = []
+
+    def save(self):
+        """
+        Adds the counts since the last save to the counts that other processes saved meanwhile
+        and replaces the file atomically.
+        """
+        with open(self.file_name + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            table = load_table(self.file_name)
+            for (context, bindings) in self.table.items():
+                for (key, (proposed, used)) in bindings.items():
+                    (saved_proposed, saved_used) = self.saved_table.get(context, {}).get(key, [0, 0])
+                    counts = table.setdefault(context, {}).setdefault(key, [0, 0])
+                    counts[1] += used - saved_used
+                    counts[0] = max(counts[0] + proposed - saved_proposed, counts[1])
+            (temporary_file, temporary_file_name) = tempfile.mkstemp(
+                suffix='.tmp', dir=os.path.dirname(os.path.abspath(self.file_name)))
+            with os.fdopen(temporary_file, 'w') as table_file:
+                json.dump(table, table_file, indent=1, sort_keys=True)
+            os.rename(temporary_file_name, self.file_name)
+        self.table = table
+        self.saved_table = copy.deepcopy(table)
+
+    def success_rate(self, context, binding):
+        (proposed, used) = self.table.get(context, {}).get(binding_key(binding), [0, 0])
+        return (used + 1.0) / (proposed + 2.0)
+
+    def install(self, operators, generator_names=DEFAULT_LEARNED_GENERATORS):
+        """
+        :param list[hpn.fbch.Operator] operators:
+        :param list[str] generator_names: class names of the generators to learn orderings for
+        """
+        for operator in operators:
+            for generator in operator.functions:
+                if generator.__class__.__name__ in generator_names and 'fun' not in generator.__dict__:
+                    # an instance attribute hides the class' staticmethod for this operator only
+                    generator.fun = self.ordered(operator.name, generator, generator.__class__.fun)
+                    self.wrapped_generators.append(generator)
+
+    def uninstall(self):
+        for generator in self.wrapped_generators:
+            del generator.fun
+        self.wrapped_generators = []
+
+    def ordered(self, operator_name, generator, fun):
+        def ordered_fun(generator_args, goal_fluents, world_state):
+            bindings = fun(generator_args, goal_fluents, world_state)
+            if bindings is None:
+                return
+            context = context_key(operator_name, generator, generator_args)
+            bindings = list(bindings)
+            # sorted is stable, so ties keep the hard-coded order
+            for binding in sorted(bindings, key=lambda binding: -self.success_rate(context, binding)):
+                counts = self.table.setdefault(context, {}).setdefault(binding_key(binding), [0, 0])
+                counts[0] += 1
+                yield binding
+        return ordered_fun
+
+    def record_plan(self, steps, operators):
+        """
+        Counts the bindings the plan's steps used as successes in their contexts. Call save() to keep them.
+        :param list[(str, list)] steps:
+        :param list[hpn.fbch.Operator] operators:
+        """
+        operators_by_name = dict((operator.name, operator) for operator in operators)
+        for (operator_name, argument_values) in steps:
+            operator = operators_by_name.get(operator_name)
+            if operator is None:
+                continue
+            bindings = dict(zip(operator.args, argument_values))
+            for generator in operator.functions:
+                if generator not in self.wrapped_generators:
+                    continue
+                context = context_key(operator_name, generator,
+                                      [bindings.get(variable) for variable in generator.inVars])
+                counts = self.table.setdefault(context, {}).setdefault(
+                    binding_key([bindings.get(variable) for variable in generator.outVars]), [0, 0])
+                counts[1] += 1
+                # a binding can also be used without having been proposed, e.g., from the goal
+                counts[0] = max(counts[0], counts[1])
@@ -4,6 +4,80 @@ import hpnutil.miscUtil  # for isVar
 
 from toy_fetch_place.world import *
 from toy_fetch_place.world_state import *
+from toy_fetch_place.interactions import know_template
+
+# Generators run in the innermost loop of regression, so what they compute from the world state is cached
+# in the current version of the state (see WorldState.get_or_evaluate) and candidate items are enumerated lazily,
+# the most relevant first.
+
+
+def get_free_and_busy_arms(world_state):
+    """
+    :param WorldState world_state:
+    :return (list[str], list[str]): free arms and arms holding an item, in the order of the robot's possible arms
+    """
+    def evaluate():
+        all_arms = world_state.robot.possible_arms
+        free_arms = [arm for arm in all_arms if not world_state.robot.get_item_in_hand(arm)]
+        return (free_arms, [arm for arm in all_arms if arm not in free_arms])
+    return world_state.get_or_evaluate(('free_and_busy_arms',), evaluate)
+
+
+def get_item_names_without_robot(world_state):
+    """
+    :param WorldState world_state:
+    :return list[str]: sorted
+    """
+    robot_name = world_state.get_robot_name()
+    return world_state.get_or_evaluate(('item_names_without_robot',), lambda: sorted(
+        item.name for item in world_state.items if item.name != robot_name))
+
+
+def goal_item_names(goal_fluents):
+    """
+    :param goal_fluents: iterable of hpn.fbch.Fluent
+    :return list[str]: items whose location or holding hand the goal is about, in the order of the fluents
+    """
+    item_names = []
+    for fluent in goal_fluents:
+        template = know_template(fluent)
+        if not template:
+            continue
+        (predicate, arguments, value) = template
+        if predicate == 'Location':
+            item_name = arguments[0]
+        elif predicate == 'InHand':
+            item_name = value
+        else:
+            continue
+        if item_name is not None and not hpnutil.miscUtil.isVar(item_name) and item_name not in item_names:
+            item_names.append(item_name)
+    return item_names
+
+
+def prioritized_item_names(world_state, goal_fluents):
+    """
+    Lazily enumerates the item names other than the robot's: the held items first,
+    then the items named in the goal, then the rest.
+    :param WorldState world_state:
+    :param goal_fluents: iterable of hpn.fbch.Fluent
+    :return: iterator of str
+    """
+    robot_name = world_state.get_robot_name()
+    enumerated_item_names = set([robot_name])
+    (free_arms, busy_arms) = get_free_and_busy_arms(world_state)
+    for arm in busy_arms:
+        item_name = world_state.robot.get_item_in_hand(arm).name
+        if item_name not in enumerated_item_names:
+            enumerated_item_names.add(item_name)
+            yield item_name
+    for item_name in goal_item_names(goal_fluents):
+        if item_name not in enumerated_item_names and item_name in world_state.items_by_name:
+            enumerated_item_names.add(item_name)
+            yield item_name
+    for item_name in get_item_names_without_robot(world_state):
+        if item_name not in enumerated_item_names:
+            yield item_name
 
 
 class GenRobotName(hpn.fbch.Function):
@@ -83,15 +157,14 @@ class GenRegraspNewArm(hpn.fbch.Function):
         # TODO: deal with this problem in a better way
         if not item_in_the_arm:
             return
-        all_arms = world_state.robot.possible_arms
-        all_free_arms = [arm for arm in all_arms if not world_state.robot.get_item_in_hand(arm)]
+        (all_free_arms, non_free_arms) = get_free_and_busy_arms(world_state)
         # first try all free arms
         for currently_free_arm in all_free_arms:
             yield [currently_free_arm, item_in_the_arm.name]
         # if that doesn't help, try busy arms, but make sure you're not regrasping from A to A
-        non_free_arms = set(all_arms).difference(set(all_free_arms)).difference(set([arm_holding_an_object]))
         for currently_non_free_arm in non_free_arms:
-            yield [currently_non_free_arm, item_in_the_arm.name]
+            if currently_non_free_arm != arm_holding_an_object:
+                yield [currently_non_free_arm, item_in_the_arm.name]
         return
 
 
@@ -156,32 +229,32 @@ class GenPlaceArm(hpn.fbch.Function):
         arms_holding_item = world_state.robot.get_hands_holding_item(item_name)
         for arm in arms_holding_item:
             yield [arm]
-        all_arms = world_state.robot.possible_arms
-        all_free_arms = [arm for arm in all_arms if not world_state.robot.get_item_in_hand(arm)]
-        all_free_arms = set(all_free_arms).difference(set(arms_holding_item))
+        (all_free_arms, non_free_arms) = get_free_and_busy_arms(world_state)
         # first try all free arms
         for currently_free_arm in all_free_arms:
-            yield [currently_free_arm]
-        # if that doesn't help, try busy arms, but make sure you're not regrasping from A to A
-        non_free_arms = set(all_arms).difference(set(all_free_arms))
+            if currently_free_arm not in arms_holding_item:
+                yield [currently_free_arm]
+        # if that doesn't help, try busy arms, but not the ones suggested already
         for currently_non_free_arm in non_free_arms:
-            yield [currently_non_free_arm]
+            if currently_non_free_arm not in arms_holding_item:
+                yield [currently_non_free_arm]
         return
 
 
 class GenPlaceItemName(hpn.fbch.Function):
     @staticmethod
     def fun(generator_args, goal_fluents, world_state):
-        """Suggests an item name to place down, given the arm. Prefers the item the robot is holding at the moment."""
+        """
+        Suggests an item name to place down, given the arm. Prefers the item the robot is holding at the moment,
+        then the other held items and the items named in the goal.
+        """
         [arm] = generator_args
-        all_item_names = [item.name for item in world_state.items]
-        all_item_names = set(all_item_names).difference({world_state.get_robot_name()})
         item_in_hand = world_state.robot.get_item_in_hand(arm)
         if item_in_hand:
             yield [item_in_hand.name]
-            all_item_names = all_item_names.difference({item_in_hand.name})
-        for it_name in all_item_names:
-            yield [it_name]
+        for it_name in prioritized_item_names(world_state, goal_fluents):
+            if not item_in_hand or it_name != item_in_hand.name:
+                yield [it_name]
 
 
 class GenFreeArm(hpn.fbch.Function):
@@ -195,13 +268,11 @@ class GenFreeArm(hpn.fbch.Function):
         :param world_state:
         :return:
         """
-        all_arms = world_state.robot.possible_arms
-        all_free_arms = [arm for arm in all_arms if not world_state.robot.get_item_in_hand(arm)]
+        (all_free_arms, non_free_arms) = get_free_and_busy_arms(world_state)
         # first try all free arms
         for currently_free_arm in all_free_arms:
             yield [currently_free_arm]
         # if that doesn't help, try busy arms
-        non_free_arms = set(all_arms).difference(set(all_free_arms))
         for currently_non_free_arm in non_free_arms:
             yield [currently_non_free_arm]
         return
@@ -229,7 +300,10 @@ class GenExamineRegressProb(hpn.fbch.Function):
     @staticmethod
     def fun(generator_args, goal_fluents, world_state):
         """Suggests a probability prior to examine operation.
-        As that probability doesn't matter, we should return all probability values."""
-        for i in [0.5, 0.75, 0.25, 1, 0]:
+        As that probability doesn't matter, we should return all probability values the transition model can reach."""
+        # without a lattice of the operators, all the probability values we usually need
+        levels = world_state.probability_lattice.examine_levels if world_state.probability_lattice else \
+            [0.5, 0.75, 0.25, 1, 0]
+        for i in levels:
             yield [i]
         return
\ No newline at end of file
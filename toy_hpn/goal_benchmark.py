@@ -0,0 +1,174 @@
+import argparse  # for the command line interface
+import json  # for the results and baseline files
+import multiprocessing  # for running every goal in a fresh process
+import os  # for the default baseline path
+import random  # for seeding DDist draws
+import resource  # for peak memory use
+import sys  # for the exit code
+import time  # for wall time
+
+import hpn.fbch  # for State and HPN
+import hpn.globals  # for rebindPenalty
+
+from toy_fetch_place.world_state import *
+from toy_fetch_place.operators import *
+from toy_fetch_place.probability_lattice import set_probability_lattice
+from toy_fetch_place.tests import make_kitchen_world, make_goal_states
+from toy_fetch_place.batch_runner import EpisodeWorld, OPERATORS, goal_holds_in_world, silence_output
+
+DEFAULT_BASELINE_FILE_NAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'goal_benchmark_baseline.json')
+
+# metric -> (relative tolerance, absolute tolerance) before an increase counts as a regression;
+# the counts are deterministic for a seed, times and memory are noisy
+REGRESSION_TOLERANCES = {'planning_time': (0.25, 0.05),
+                         'heuristic_calls': (0.0, 0),
+                         'generator_calls': (0.0, 0),
+                         'failed_primitives': (0.0, 0),
+                         'max_rss_kb': (0.25, 1024)}
+
+
+class GeneratorCallCounter:
+    """Counts calls of the generators of the operators by wrapping their fun, until restore()."""
+    def __init__(self, operators):
+        self.calls = {}
+        self.original_funs = {}
+        for operator in operators:
+            for generator in operator.functions:
+                generator_class = generator.__class__
+                if generator_class not in self.original_funs:
+                    self.original_funs[generator_class] = generator_class.fun
+                    generator_class.fun = staticmethod(self.counting(generator_class.__name__,
+                                                                     generator_class.fun))
+
+    def counting(self, name, fun):
+        def counting_fun(generator_args, goal_fluents, world_state):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            return fun(generator_args, goal_fluents, world_state)
+        return counting_fun
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def restore(self):
+        for (generator_class, fun) in self.original_funs.items():
+            generator_class.fun = staticmethod(fun)
+        self.original_funs = {}
+
+
+def run_goal(arguments):
+    """
+    Runs HPN on one tests.py goal in the kitchen, without visualization, with seeded draws.
+    :param (int, int) arguments: goal index and random seed
+    :return dict: the metrics of the goal
+    """
+    (goal_index, random_seed) = arguments
+    random.seed(random_seed)
+    kitchen = make_kitchen_world()
+    world = EpisodeWorld(kitchen.environment, kitchen.robot, kitchen.operator_fail_probabilities)
+    starting_state = hpn.fbch.State([], WorldState.to_world_state(world))
+    set_probability_lattice(starting_state.details, OPERATORS)
+    goal = make_goal_states()[goal_index]
+    hpn.globals.glob.rebindPenalty = 5
+    heuristic_call_counter.reset()
+    generator_call_counter = GeneratorCallCounter(OPERATORS)
+    error = ''
+    start_time = time.time()
+    try:
+        hpn.fbch.HPN(starting_state, goal, OPERATORS, world, h=false_fluents_heuristic,
+                     fileTag=None, hpnFileTag=None)
+    except Exception as exception:
+        error = '{}: {}'.format(type(exception).__name__, exception)
+    finally:
+        generator_call_counter.restore()
+    return {'goal_index': goal_index,
+            'seed': random_seed,
+            'success': not error and goal_holds_in_world(goal, world),
+            'planning_time': time.time() - start_time,
+            # about one per search node, HPN doesn't tell how many it expanded
+            'heuristic_calls': sum(heuristic_call_counter.calls_per_search),
+            'searches': len(heuristic_call_counter.calls_per_search),
+            'generator_calls': generator_call_counter.total_calls(),
+            # HPN doesn't tell when it replans, the failures are what it has to replan for
+            'failed_primitives': world.failed_primitives,
+            'executed_primitives': world.executed_primitives,
+            # this process only ran this goal, so the peak is the goal's, on Linux in kilobytes
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'error': error}
+
+
+def run_goal_benchmark(goal_indices=None, random_seed=0, timeout=600):
+    """
+    :param list[int] goal_indices: indices into tests.make_goal_states(), all goals if None
+    :param int random_seed: the same for every goal
+    :param float timeout: seconds per goal, the goal is recorded as timed out after that
+    :return list[dict]:
+    """
+    if goal_indices is None:
+        goal_indices = range(len(make_goal_states()))
+    results = []
+    for goal_index in goal_indices:
+        # a fresh process per goal, so that peak memory is per goal and a timed out goal can be killed
+        pool = multiprocessing.Pool(1, initializer=silence_output)
+        try:
+            result = pool.apply_async(run_goal, [(goal_index, random_seed)]).get(timeout)
+            pool.close()
+        except multiprocessing.TimeoutError:
+            result = {'goal_index': goal_index, 'seed': random_seed, 'success': False, 'planning_time': timeout,
+                      'error': 'timed out after {} seconds'.format(timeout)}
+            pool.terminate()
+        pool.join()
+        print json.dumps(result, sort_keys=True)
+        results.append(result)
+    return results
+
+
+def find_regressions(results, baseline_results):
+    """
+    :param list[dict] results:
+    :param list[dict] baseline_results:
+    :return list[str]: descriptions of the metrics that got worse than the baseline beyond REGRESSION_TOLERANCES
+    """
+    baseline_by_goal = {baseline['goal_index']: baseline for baseline in baseline_results}
+    regressions = []
+    for result in results:
+        baseline = baseline_by_goal.get(result['goal_index'])
+        if not baseline:
+            continue
+        if baseline.get('success') and not result.get('success'):
+            regressions.append('goal {}: failed ({})'.format(result['goal_index'], result.get('error')))
+        for (metric, (relative_tolerance, absolute_tolerance)) in sorted(REGRESSION_TOLERANCES.items()):
+            if result.get(metric) is None or baseline.get(metric) is None:
+                continue
+            if result[metric] > baseline[metric] * (1 + relative_tolerance) + absolute_tolerance:
+                regressions.append('goal {}: {} went from {} to {}'.format(result['goal_index'], metric,
+                                                                           baseline[metric], result[metric]))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks HPN on the tests.py goals against a baseline.')
+    parser.add_argument('--goals', type=int, nargs='*', help='indices of the tests.py goals, all if not given')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=600, help='seconds per goal')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_FILE_NAME, help='baseline JSON file')
+    parser.add_argument('--update-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--results', help='JSON file to write the results to')
+    arguments = parser.parse_args()
+    benchmark_results = run_goal_benchmark(arguments.goals, arguments.seed, arguments.timeout)
+    if arguments.results:
+        with open(arguments.results, 'w') as results_file:
+            json.dump({'results': benchmark_results}, results_file, indent=1, sort_keys=True)
+    if arguments.update_baseline:
+        with open(arguments.baseline, 'w') as baseline_file:
+            json.dump({'results': benchmark_results}, baseline_file, indent=1, sort_keys=True)
+        print 'Updated the baseline {}.'.format(arguments.baseline)
+    elif os.path.exists(arguments.baseline):
+        with open(arguments.baseline) as baseline_file:
+            found_regressions = find_regressions(benchmark_results, json.load(baseline_file)['results'])
+        for regression in found_regressions:
+            print 'REGRESSION ' + regression
+        if found_regressions:
+            sys.exit(1)
+        print 'No regressions against the baseline {}.'.format(arguments.baseline)
+    else:
+        print 'There is no baseline {} yet, make one with --update-baseline.'.format(arguments.baseline)
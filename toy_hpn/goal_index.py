@@ -0,0 +1,175 @@
+import hpnutil.miscUtil  # for isVar
+
+from toy_fetch_place.world import Robot
+
+
+class GoalFluentIndex:
+    """
+    Indexes the Know fluents of a goal by their nested fluents, so that contradictions and subsumptions
+    among k fluents are found with k dict lookups instead of k^2 fglb calls:
+      * Know(F, v1, p1) and Know(F, v2, p2) with v1 != v2 contradict, as F has only one value,
+        e.g., two locations of one item or two items in one hand
+      * Know(Location(Item), Loc) and Know(InHand(Hand), Item) contradict if Loc != Hand,
+        as well as Know(Location(Item), Hand) and Know(InHand(Hand), OtherItem)
+      * Know(F, v, p1) = true and Know(F, v, p2) = false contradict if p1 >= p2
+      * Know(F, v, p1) = true subsumes Know(F, v, p2) = true if p1 >= p2,
+        and Know(Location(Item), Hand, p) subsumes Know(InHand(Hand), Item, p), they are the same belief
+    Fluents with unbound variables and fluents other than Know are kept as they are.
+    """
+    def __init__(self, fluents=()):
+        self.contradiction = False
+        # (nested predicate, nested args, value) -> {know: strongest Know fluent}
+        self.know_fluents = {}
+        # (nested predicate, nested args) -> value, for nested fluents other than Location and InHand
+        self.nested_values = {}
+        # item name -> location, and hand -> item name or None, from both Location and InHand
+        self.item_locations = {}
+        self.hand_contents = {}
+        self.other_fluents = set()
+        for fluent in fluents:
+            if not self.add(fluent):
+                break
+
+    def add(self, fluent):
+        """
+        :param hpn.fbch.Fluent fluent:
+        :return bool: False if the fluent contradicts the ones added before
+        """
+        if self.contradiction:
+            return False
+        if fluent.predicate != 'Know' or not self.is_ground(fluent):
+            self.other_fluents.add(fluent)
+            return True
+        (nested_fluent, value, probability) = fluent.args
+        nested_key = (nested_fluent.predicate, tuple(nested_fluent.args))
+        know = fluent.value
+        if know and not self.add_value(nested_fluent, value):
+            self.contradiction = True
+            return False
+        strongest_fluents = self.know_fluents.setdefault(nested_key + (value,), {})
+        opposite_fluent = strongest_fluents.get(not know)
+        if opposite_fluent:
+            (true_probability, false_probability) = (probability, opposite_fluent.args[2]) if know else \
+                (opposite_fluent.args[2], probability)
+            if true_probability >= false_probability:
+                self.contradiction = True
+                return False
+        strongest_fluent = strongest_fluents.get(know)
+        # knowing with a higher probability is stronger, not knowing with a lower probability is stronger
+        if not strongest_fluent or (probability > strongest_fluent.args[2] if know
+                                    else probability < strongest_fluent.args[2]):
+            strongest_fluents[know] = fluent
+        return True
+
+    def add_value(self, nested_fluent, value):
+        if nested_fluent.predicate == 'Location':
+            [item_name] = nested_fluent.args
+            if value in Robot.possible_arms:
+                return self.add_item_location(item_name, value) and self.add_hand_content(value, item_name)
+            return self.add_item_location(item_name, value)
+        elif nested_fluent.predicate == 'InHand':
+            [hand] = nested_fluent.args
+            if value is None:
+                return self.add_hand_content(hand, value)
+            return self.add_hand_content(hand, value) and self.add_item_location(value, hand)
+        else:
+            nested_key = (nested_fluent.predicate, tuple(nested_fluent.args))
+            return self.nested_values.setdefault(nested_key, value) == value
+
+    def add_item_location(self, item_name, location):
+        return self.item_locations.setdefault(item_name, location) == location
+
+    def add_hand_content(self, hand, item_name):
+        return self.hand_contents.setdefault(hand, item_name) == item_name
+
+    @staticmethod
+    def is_ground(know_fluent):
+        (nested_fluent, value, probability) = know_fluent.args
+        return not (hpnutil.miscUtil.isVar(nested_fluent) or hpnutil.miscUtil.isVar(value) or
+                    hpnutil.miscUtil.isVar(probability) or
+                    [arg for arg in nested_fluent.args if hpnutil.miscUtil.isVar(arg)])
+
+    def get_fluents(self):
+        """
+        :return set | bool: the fluents without the subsumed ones, or False if they contradict
+        """
+        if self.contradiction:
+            return False
+        fluents = set(self.other_fluents)
+        for ((nested_predicate, nested_args, value), strongest_fluents) in self.know_fluents.items():
+            for (know, fluent) in strongest_fluents.items():
+                if know and nested_predicate == 'InHand' and value is not None:
+                    # the same belief as Know(Location(Item), Hand), keep only the stronger of the two
+                    location_fluent = self.know_fluents.get(('Location', (value,), nested_args[0]), {}).get(True)
+                    if location_fluent and location_fluent.args[2] >= fluent.args[2]:
+                        continue
+                elif know and nested_predicate == 'Location' and value in Robot.possible_arms:
+                    in_hand_fluent = self.know_fluents.get(('InHand', (value,), nested_args[0]), {}).get(True)
+                    if in_hand_fluent and in_hand_fluent.args[2] > fluent.args[2]:
+                        continue
+                fluents.add(fluent)
+        return fluents
+
+
+def know_fluents_glb(fluent, other_fluent):
+    """
+    The rules of GoalFluentIndex for just two fluents, with a few comparisons and without building an index,
+    as HPN merges goals one pair of fluents at a time.
+    :param hpn.fbch.Fluent fluent:
+    :param hpn.fbch.Fluent other_fluent:
+    :return hpn.fbch.Fluent | bool | None: False if the two contradict, the stronger one if it subsumes the other,
+        None if both stay
+    """
+    if fluent.predicate != 'Know' or other_fluent.predicate != 'Know' or \
+            not GoalFluentIndex.is_ground(fluent) or not GoalFluentIndex.is_ground(other_fluent):
+        return None
+    (nested_fluent, value, probability) = fluent.args
+    (other_nested_fluent, other_value, other_probability) = other_fluent.args
+    (know, other_know) = (fluent.value, other_fluent.value)
+    if (nested_fluent.predicate, nested_fluent.args) == (other_nested_fluent.predicate, other_nested_fluent.args):
+        if value != other_value:
+            return False if know and other_know else None
+        if know != other_know:
+            (true_probability, false_probability) = (probability, other_probability) if know else \
+                (other_probability, probability)
+            return False if true_probability >= false_probability else None
+        # knowing with a higher probability is stronger, not knowing with a lower probability is stronger
+        if know:
+            return fluent if probability >= other_probability else other_fluent
+        return fluent if probability <= other_probability else other_fluent
+    if not (know and other_know):
+        return None
+    facts = dict(location_facts(nested_fluent, value))
+    for (key, fact_value) in location_facts(other_nested_fluent, other_value):
+        if facts.get(key, fact_value) != fact_value:
+            return False
+    if nested_fluent.predicate == 'InHand' and other_nested_fluent.predicate == 'Location':
+        (fluent, other_fluent) = (other_fluent, fluent)
+        (nested_fluent, value, probability) = fluent.args
+        (other_nested_fluent, other_value, other_probability) = other_fluent.args
+    if nested_fluent.predicate == 'Location' and other_nested_fluent.predicate == 'InHand' and \
+            (value, nested_fluent.args[0]) == (other_nested_fluent.args[0], other_value):
+        # Know(Location(Item), Hand) and Know(InHand(Hand), Item) are the same belief,
+        # the location fluent is kept on equal probabilities
+        return fluent if probability >= other_probability else other_fluent
+    return None
+
+
+def location_facts(nested_fluent, value):
+    """
+    :return list[(tuple, str)]: ((item, item name), location) and ((hand, hand name), item name or None) that
+        the nested fluent having the value says, as GoalFluentIndex.add_value
+    """
+    if nested_fluent.predicate == 'Location':
+        [item_name] = nested_fluent.args
+        facts = [(('item', item_name), value)]
+        if value in Robot.possible_arms:
+            facts.append((('hand', value), item_name))
+        return facts
+    elif nested_fluent.predicate == 'InHand':
+        [hand] = nested_fluent.args
+        facts = [(('hand', hand), value)]
+        if value is not None:
+            facts.append((('item', value), hand))
+        return facts
+    return []
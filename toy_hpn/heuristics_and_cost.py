@@ -1,3 +1,94 @@
+from toy_fetch_place.goal_index import GoalFluentIndex
+from toy_fetch_place.relaxed_planning import goal_relaxed_facts, get_relaxed_planning_graph
+from toy_fetch_place.pattern_database import get_pattern_database
+from toy_fetch_place.landmarks import count_landmarks
+
+
+class HeuristicCallCounter:
+    """
+    Counts heuristic calls of each search. A search is recognized by its start state and the version of its details,
+    so planning again after executing a primitive starts a new count.
+    The start state itself is kept, an id could be reused by a new state once the old one is collected.
+    """
+    def __init__(self):
+        self.calls_per_search = []
+        self.current_start = None
+        self.current_version = None
+
+    def count(self, start):
+        version = getattr(start.details, 'version', None)
+        if start is not self.current_start or version != self.current_version:
+            self.current_start = start
+            self.current_version = version
+            self.calls_per_search.append(0)
+        self.calls_per_search[-1] += 1
+
+    def reset(self):
+        self.calls_per_search = []
+        self.current_start = None
+        self.current_version = None
+
+
+heuristic_call_counter = HeuristicCallCounter()
+
 
 def false_fluents_heuristic(start, goal, ops, ancestors, infOkay):
-    return goal.easyH(start, 1)
\ No newline at end of file
+    heuristic_call_counter.count(start)
+    # regression can pile up goals that can never hold together, cut them off right away
+    if GoalFluentIndex(goal.fluents).contradiction:
+        return float('inf')
+    return goal.easyH(start, 1)
+
+
+def relaxed_plan_heuristic(start, goal, ops, ancestors, infOkay):
+    """
+    hFF: cost of a plan for the goal in the domain without delete effects, see relaxed_planning.
+    Use as HPN(..., h=relaxed_plan_heuristic).
+    """
+    heuristic_call_counter.count(start)
+    if GoalFluentIndex(goal.fluents).contradiction:
+        return float('inf')
+    goal_facts = goal_relaxed_facts(goal.fluents, start.details)
+    if goal_facts is None:
+        return float('inf')
+    return get_relaxed_planning_graph(start.details).relaxed_plan_cost(goal_facts)
+
+
+def relaxed_add_heuristic(start, goal, ops, ancestors, infOkay):
+    """
+    hAdd: sum of the costs of achieving each goal fact separately in the domain without delete effects.
+    Use as HPN(..., h=relaxed_add_heuristic).
+    """
+    heuristic_call_counter.count(start)
+    if GoalFluentIndex(goal.fluents).contradiction:
+        return float('inf')
+    goal_facts = goal_relaxed_facts(goal.fluents, start.details)
+    if goal_facts is None:
+        return float('inf')
+    return get_relaxed_planning_graph(start.details).add_cost(goal_facts)
+
+
+def pattern_database_heuristic(start, goal, ops, ancestors, infOkay):
+    """
+    Admissible sum of the precomputed costs of the goal items, see pattern_database.
+    Falls back to counting false fluents for items or goals at locations the database doesn't know.
+    Use as HPN(..., h=pattern_database_heuristic).
+    """
+    heuristic_call_counter.count(start)
+    if GoalFluentIndex(goal.fluents).contradiction:
+        return float('inf')
+    heuristic_value = get_pattern_database(start.details).heuristic_value(start.details, goal.fluents)
+    if heuristic_value is None:
+        return goal.easyH(start, 1)
+    return heuristic_value
+
+
+def landmark_count_heuristic(start, goal, ops, ancestors, infOkay):
+    """
+    Number of landmarks of the goal that still have to be achieved, see landmarks.
+    Use as HPN(..., h=landmark_count_heuristic).
+    """
+    heuristic_call_counter.count(start)
+    if GoalFluentIndex(goal.fluents).contradiction:
+        return float('inf')
+    return count_landmarks(goal.fluents, start.details)
@@ -0,0 +1,214 @@
+import collections  # for Counter
+
+import hpnutil.miscUtil  # for isVar
+
+from toy_fetch_place.world import Robot
+
+# Plan steps are (operator_name, argument_values), with the values in the order of the operator's arguments,
+# which is (op.name, op.args) of the ground operator instances in HPN plans.
+# Know fluents are compared through the state variables their nested fluents set:
+#   Location(Item) = Loc       sets ('item_location', Item) to Loc, and ('hand', Loc) to Item if Loc is an arm
+#   InHand(Arm) = Item         sets ('hand', Arm) to Item, and ('item_location', Item) to Arm if Item is not None
+#   ContainerState(C) = State  sets ('container_state', C) to State
+# A result clobbers a fluent if it sets one of its variables to a different value.
+# Probabilities don't matter here, a result with a lower probability than needed doesn't undo anything.
+
+VARIABLE_KINDS = {'Location': {'item_location', 'hand'},
+                  'InHand': {'hand', 'item_location'},
+                  'ContainerState': {'container_state'}}
+
+
+def know_template(fluent):
+    """
+    :return (str, list, object) | None: nested predicate, nested arguments and value of a true Know fluent
+    """
+    if fluent.predicate != 'Know' or not fluent.value or hpnutil.miscUtil.isVar(fluent.args[0]):
+        return None
+    (nested_fluent, value, probability) = fluent.args
+    if nested_fluent.predicate not in VARIABLE_KINDS:
+        return None
+    return (nested_fluent.predicate, nested_fluent.args, value)
+
+
+def hpn_plan_steps(plan):
+    """
+    :param plan: as returned by hpn.fbch.planBackward, (operator, subgoal) pairs where the first operator is None
+    :return list[(str, list)]: the steps of the ground operators
+    """
+    return [(operator.name, list(operator.args)) for (operator, subgoal) in plan if operator is not None]
+
+
+def ground_assignments(template, bindings):
+    """
+    :param (str, list, object) template: as returned by know_template
+    :param dict bindings: operator argument names to values
+    :return list[(tuple, object)]: state variables and the values the fluent sets them to,
+        skipping the ones that still contain variables
+    """
+    def ground(argument):
+        return bindings.get(argument, argument) if hpnutil.miscUtil.isVar(argument) else argument
+    (predicate, arguments, value) = template
+    arguments = [ground(argument) for argument in arguments]
+    value = ground(value)
+    if predicate == 'Location':
+        assignments = [(('item_location', arguments[0]), value)]
+        if value in Robot.possible_arms:
+            assignments.append((('hand', value), arguments[0]))
+    elif predicate == 'InHand':
+        assignments = [(('hand', arguments[0]), value)]
+        if value is not None:
+            assignments.append((('item_location', value), arguments[0]))
+    else:
+        assignments = [(('container_state', arguments[0]), value)]
+    return [(variable, value) for (variable, value) in assignments
+            if not [part for part in variable + (value,) if hpnutil.miscUtil.isVar(part)]]
+
+
+def assignments_clobber(result_assignments, assignments):
+    values = dict(assignments)
+    for (variable, value) in result_assignments:
+        if variable in values and values[variable] != value:
+            return True
+    return False
+
+
+def assignments_support(result_assignments, assignments):
+    return bool(assignments) and set(assignments).issubset(result_assignments)
+
+
+def operator_preconditions(operator):
+    if isinstance(operator.preconditions, dict):
+        return [fluent for level in sorted(operator.preconditions) for fluent in operator.preconditions[level]]
+    return list(operator.preconditions)
+
+
+def operator_results(operator):
+    return [fluent for (result_fluents, _) in operator.results for fluent in result_fluents]
+
+
+class ClobberTable:
+    """
+    Precomputed for all pairs of operators: which results of the first one can delete which preconditions
+    of the second one, judging by the kinds of state variables they set.
+    Ground steps then only compare the pairs listed here.
+    """
+    def __init__(self, operators):
+        self.operators = {operator.name: operator for operator in operators}
+        self.preconditions = {}
+        self.results = {}
+        for operator in operators:
+            self.preconditions[operator.name] = [template for template in map(know_template,
+                                                                                operator_preconditions(operator))
+                                                 if template]
+            self.results[operator.name] = [template for template in map(know_template, operator_results(operator))
+                                           if template]
+        # (clobbering operator name, consuming operator name) -> [(result template, precondition template)]
+        self.table = {}
+        for (name, results) in self.results.items():
+            for (other_name, preconditions) in self.preconditions.items():
+                pairs = [(result, precondition) for result in results for precondition in preconditions
+                         if VARIABLE_KINDS[result[0]].intersection(VARIABLE_KINDS[precondition[0]])]
+                if pairs:
+                    self.table[(name, other_name)] = pairs
+
+    def bindings(self, step):
+        (operator_name, argument_values) = step
+        return dict(zip(self.operators[operator_name].args, argument_values))
+
+    def ground_results(self, step):
+        bindings = self.bindings(step)
+        return [assignment for template in self.results[step[0]]
+                for assignment in ground_assignments(template, bindings)]
+
+    def ground_preconditions(self, step):
+        """
+        :return list[(tuple, list)]: precondition templates with their ground assignments
+        """
+        bindings = self.bindings(step)
+        return [(template, ground_assignments(template, bindings)) for template in self.preconditions[step[0]]]
+
+    def step_clobbers_goal(self, step, goal_fluents):
+        """
+        :param (str, list) step:
+        :param goal_fluents: iterable of ground hpn.fbch.Fluent
+        :return list[hpn.fbch.Fluent]: the goal fluents the results of the step undo
+        """
+        result_assignments = self.ground_results(step)
+        return [fluent for fluent in goal_fluents if know_template(fluent) and
+                assignments_clobber(result_assignments, ground_assignments(know_template(fluent), {}))]
+
+    def find_threats(self, steps, goal_fluents=()):
+        """
+        Finds steps that undo a precondition of a later step, or a goal fluent, after it was achieved,
+        or after the start if no earlier step achieves it.
+        :param list[(str, list)] steps:
+        :param goal_fluents: iterable of ground hpn.fbch.Fluent, protected after the last step
+        :return list[(int, int, tuple)]: (clobbering step index, consuming step index, precondition template),
+            the consuming step index is len(steps) for goal fluents
+        """
+        results = [self.ground_results(step) for step in steps]
+        consumers = [(step[0], self.ground_preconditions(step)) for step in steps]
+        consumers.append((None, [(know_template(fluent), ground_assignments(know_template(fluent), {}))
+                                 for fluent in goal_fluents if know_template(fluent)]))
+        threats = []
+        for (consumer_index, (consumer_name, preconditions)) in enumerate(consumers):
+            for (template, assignments) in preconditions:
+                producer_index = -1
+                for step_index in range(consumer_index - 1, -1, -1):
+                    if assignments_support(results[step_index], assignments):
+                        producer_index = step_index
+                        break
+                for step_index in range(producer_index + 1, consumer_index):
+                    if consumer_name and (steps[step_index][0], consumer_name) not in self.table:
+                        continue
+                    if assignments_clobber(results[step_index], assignments):
+                        threats.append((step_index, consumer_index, template))
+        return threats
+
+    def open_preconditions(self, steps):
+        """
+        :return collections.Counter: the ground preconditions of the steps that no earlier step achieves,
+            so the start has to
+        """
+        results = [self.ground_results(step) for step in steps]
+        open_preconditions = collections.Counter()
+        for (step_index, step) in enumerate(steps):
+            for (template, assignments) in self.ground_preconditions(step):
+                if not [earlier_results for earlier_results in results[:step_index]
+                        if assignments_support(earlier_results, assignments)]:
+                    open_preconditions[(step[0], tuple(map(str, step[1])), tuple(assignments))] += 1
+        return open_preconditions
+
+    def reorder_plan(self, steps, goal_fluents=()):
+        """
+        Resolves threats by moving the clobbering step right after the consumer (promotion)
+        or to an earlier position, e.g., before the producer (demotion), as long as no precondition loses its producer.
+        :param list[(str, list)] steps:
+        :param goal_fluents: iterable of ground hpn.fbch.Fluent
+        :return list[(str, list)] | None: the steps without threats, or None if the plan has to be rejected
+        """
+        steps = list(steps)
+        threats = self.find_threats(steps, goal_fluents)
+        open_preconditions = self.open_preconditions(steps)
+        while threats:
+            (clobbering_index, consumer_index, template) = threats[0]
+            step = steps[clobbering_index]
+            rest = steps[:clobbering_index] + steps[clobbering_index + 1:]
+            candidates = []
+            if consumer_index < len(steps):
+                # consumer_index is the consumer's position in rest, so insert right after it
+                candidates.append(rest[:consumer_index] + [step] + rest[consumer_index:])
+            for producer_index in range(clobbering_index):
+                candidates.append(rest[:producer_index] + [step] + rest[producer_index:])
+            best = None
+            for candidate in candidates:
+                # another step achieving what the moved step needed from its producer doesn't count
+                if self.open_preconditions(candidate) - open_preconditions:
+                    continue
+                candidate_threats = self.find_threats(candidate, goal_fluents)
+                if len(candidate_threats) < len(threats) and (not best or len(candidate_threats) < len(best[1])):
+                    best = (candidate, candidate_threats)
+            if not best:
+                return None
+            (steps, threats) = best
+        return steps
@@ -0,0 +1,102 @@
+import hpnutil.miscUtil  # for isVar
+
+from toy_fetch_place.goal_index import GoalFluentIndex
+
+
+def fluent_predicates(fluent):
+    """
+    :return list[str]: the predicate of the fluent and, for Know fluents, the predicate of the nested fluent
+    """
+    predicates = [fluent.predicate]
+    if fluent.predicate == 'Know' and hasattr(fluent.args[0], 'predicate'):
+        predicates.append(fluent.args[0].predicate)
+    return predicates
+
+
+def find_rigid_predicates(operators, goal_predicates=('IsRobot', 'Location', 'InHand', 'ContainerState')):
+    """
+    A predicate is rigid if no operator result mentions it, so no plan can change it,
+    e.g., IsRobot in operators.py.
+    :param list[hpn.fbch.Operator] operators:
+    :param goal_predicates: predicates that can appear in goals
+    :return set[str]:
+    """
+    changing_predicates = set()
+    for operator in operators:
+        for (result_fluents, _) in operator.results:
+            for fluent in result_fluents:
+                changing_predicates.update(fluent_predicates(fluent))
+    return set(goal_predicates).difference(changing_predicates)
+
+
+class StaticInvariants:
+    """
+    Facts of the domain that no operator changes: rigid fluents, the arms of the robot,
+    the locations, the container states and the item names.
+    A goal violating them can never be achieved, so regressing it further is a waste.
+    """
+    def __init__(self, operators):
+        self.rigid_predicates = find_rigid_predicates(operators)
+
+    def value_is_impossible(self, know_fluent, world_state):
+        """
+        :param hpn.belief.BFluent know_fluent: a ground Know fluent which has to be true
+        :return bool: if the nested fluent can never have the value
+        """
+        (nested_fluent, value, probability) = know_fluent.args
+        if nested_fluent.predicate == 'Location':
+            [item_name] = nested_fluent.args
+            return item_name not in world_state.items_by_name or \
+                (value not in world_state.environment.possible_locations and
+                 value not in world_state.robot.possible_arms)
+        if nested_fluent.predicate == 'InHand':
+            [arm] = nested_fluent.args
+            return arm not in world_state.robot.possible_arms or \
+                (value is not None and value not in world_state.items_by_name)
+        if nested_fluent.predicate == 'ContainerState':
+            return value not in world_state.environment.possible_container_states
+        return False
+
+    def fluent_is_impossible(self, fluent, world_state):
+        """
+        :param hpn.fbch.Fluent fluent:
+        :param WorldState world_state:
+        :return bool: if the fluent is false and can never become true
+        """
+        if fluent.predicate == 'Know':
+            if not fluent.value or not GoalFluentIndex.is_ground(fluent):
+                return False
+            return self.value_is_impossible(fluent, world_state)
+        if fluent.predicate in self.rigid_predicates and \
+                not [arg for arg in fluent.args if hpnutil.miscUtil.isVar(arg)]:
+            return fluent.test(world_state) != fluent.value
+        return False
+
+    def goal_is_impossible(self, goal_fluents, world_state):
+        """
+        :param goal_fluents: iterable of hpn.fbch.Fluent
+        :param WorldState world_state:
+        :return bool: if a fluent is impossible or two of them are mutex, e.g., one item at two locations
+        """
+        for fluent in goal_fluents:
+            if world_state.get_or_evaluate(('ImpossibleFluent', fluent),
+                                           lambda: self.fluent_is_impossible(fluent, world_state)):
+                return True
+        return GoalFluentIndex(goal_fluents).contradiction
+
+
+def make_pruning_heuristic(heuristic, operators):
+    """
+    Wraps a heuristic such that it cuts off regressed goals that violate the static invariants of the operators.
+    Use as HPN(..., h=make_pruning_heuristic(false_fluents_heuristic, operators)).
+    :param heuristic: function (start, goal, ops, ancestors, infOkay) -> cost
+    :param list[hpn.fbch.Operator] operators:
+    :return: function (start, goal, ops, ancestors, infOkay) -> cost
+    """
+    static_invariants = StaticInvariants(operators)
+
+    def pruning_heuristic(start, goal, ops, ancestors, infOkay):
+        if static_invariants.goal_is_impossible(goal.fluents, start.details):
+            return float('inf')
+        return heuristic(start, goal, ops, ancestors, infOkay)
+    return pruning_heuristic
@@ -0,0 +1,149 @@
+import hpn.fbch  # for State and HPN
+
+from toy_fetch_place.relaxed_planning import goal_relaxed_facts, get_relaxed_planning_graph
+
+# Landmarks are relaxed facts (see relaxed_planning) that every plan for a goal has to achieve on the way,
+# e.g., ('robot_at', X) before picking up from X, or ('state', X, 'open') before going to the container X.
+# They are found by backchaining from the goal facts: the preconditions that all the first achievers of a fact
+# share are landmarks of the fact, where first achievers are those applicable before the fact is reachable.
+
+
+def extract_landmarks(goal_facts, graph):
+    """
+    :param list[tuple] goal_facts:
+    :param RelaxedPlanningGraph graph: of the start state
+    :return dict[tuple: set[tuple]] | None: landmarks that don't hold in the start state,
+        including the goal facts, each mapped to the landmarks ordered right before it,
+        or None if a goal fact is unreachable
+    """
+    landmarks = {}
+    open_facts = [fact for fact in goal_facts if fact not in graph.initial_facts]
+    while open_facts:
+        fact = open_facts.pop()
+        if fact in landmarks:
+            continue
+        if fact not in graph.fact_costs:
+            return None
+        reachable_without_fact = graph.domain.reachable_facts(graph.initial_facts, fact)
+        first_achievers = [action for action in graph.domain.actions_with_effect.get(fact, [])
+                           if all(precondition in reachable_without_fact for precondition in action.preconditions)]
+        shared_preconditions = set(first_achievers[0].preconditions) if first_achievers else set()
+        for action in first_achievers[1:]:
+            shared_preconditions.intersection_update(action.preconditions)
+        landmarks[fact] = set(precondition for precondition in shared_preconditions
+                              if precondition not in graph.initial_facts)
+        open_facts.extend(landmarks[fact])
+    return landmarks
+
+
+def get_landmarks(goal_facts, world_state):
+    """Landmarks of the goal facts, cached in the world state until it changes."""
+    return world_state.get_or_evaluate(
+        ('Landmarks', frozenset(goal_facts)),
+        lambda: extract_landmarks(goal_facts, get_relaxed_planning_graph(world_state)))
+
+
+def count_landmarks(goal_fluents, world_state):
+    """
+    :param goal_fluents: iterable of hpn.fbch.Fluent
+    :param WorldState world_state:
+    :return float: number of landmarks that still have to be achieved, inf if the goal is unreachable
+    """
+    goal_facts = goal_relaxed_facts(goal_fluents, world_state)
+    if goal_facts is None:
+        return float('inf')
+    landmarks = get_landmarks(goal_facts, world_state)
+    if landmarks is None:
+        return float('inf')
+    return len(landmarks)
+
+
+def fact_variable_and_value(fact):
+    """
+    :return list[(tuple, object)]: the state variables the fact sets, with their values
+    """
+    if fact[0] == 'robot_at':
+        return [(('robot_location',), fact[1])]
+    if fact[0] == 'state':
+        return [(('container_state', fact[1]), fact[2])]
+    if fact[0] in ['at', 'known_at']:
+        return [(('item_location', fact[1]), fact[2]), (('hand', fact[2]), fact[1])]
+    if fact[0] in ['empty', 'known_empty']:
+        return [(('hand', fact[1]), None)]
+    return []
+
+
+def clobbers(facts, other_facts):
+    """Whether achieving facts sets a variable of other_facts to a different value."""
+    other_values = {}
+    for other_fact in other_facts:
+        for (variable, value) in fact_variable_and_value(other_fact):
+            other_values.setdefault(variable, set()).add(value)
+    for fact in facts:
+        for (variable, value) in fact_variable_and_value(fact):
+            if variable in other_values and other_values[variable] != {value}:
+                return True
+    return False
+
+
+def goal_fluent_rank(fluent, robot_name):
+    """
+    Default order of goal conjuncts: items first, then the robot location, then free hands,
+    then container states, which are typically closing containers after being done with them.
+    """
+    if fluent.predicate != 'Know':
+        return 0
+    (nested_fluent, value, probability) = fluent.args
+    if nested_fluent.predicate == 'Location':
+        return 1 if nested_fluent.args[0] == robot_name else 0
+    if nested_fluent.predicate == 'InHand':
+        return 2 if value is None else 0
+    if nested_fluent.predicate == 'ContainerState':
+        return 3
+    return 0
+
+
+def order_goal_fluents(goal_fluents, world_state):
+    """
+    Orders goal conjuncts such that achieving one doesn't undo the ones before it:
+    a conjunct goes after all the conjuncts whose landmarks clobber it, the rest is ordered by goal_fluent_rank.
+    :param goal_fluents: iterable of hpn.fbch.Fluent
+    :param WorldState world_state:
+    :return list[hpn.fbch.Fluent]:
+    """
+    robot_name = world_state.get_robot_name()
+    fluents = sorted(goal_fluents, key=lambda fluent: (goal_fluent_rank(fluent, robot_name), str(fluent)))
+    goal_facts = []
+    achieved_facts = []
+    for fluent in fluents:
+        goal_facts.append(goal_relaxed_facts([fluent], world_state) or [])
+        landmarks = get_landmarks(goal_facts[-1], world_state) or {}
+        achieved_facts.append(set(goal_facts[-1]).union(landmarks.keys()))
+    # fluent j has to wait for fluent i if achieving i clobbers j
+    waits_for = [set(i for i in range(len(fluents)) if i != j and clobbers(achieved_facts[i], goal_facts[j]))
+                 for j in range(len(fluents))]
+    ordered = []
+    remaining = range(len(fluents))
+    while remaining:
+        ready = [j for j in remaining if not waits_for[j].intersection(remaining)]
+        # on cyclic clobbering, fall back to the rank
+        j = ready[0] if ready else remaining[0]
+        ordered.append(fluents[j])
+        remaining.remove(j)
+    return ordered
+
+
+def serialized_hpn(starting_state, goal, operators, world, **hpn_arguments):
+    """
+    Runs HPN on growing prefixes of the ordered goal conjuncts, so that every call only adds one conjunct
+    to the ones achieved already.
+    :param hpn.fbch.State starting_state: with the WorldState as details
+    :param hpn.fbch.State goal:
+    :param list[hpn.fbch.Operator] operators:
+    :param World world:
+    :param hpn_arguments: passed on to hpn.fbch.HPN
+    """
+    ordered_fluents = order_goal_fluents(goal.fluents, starting_state.details)
+    for prefix_length in range(1, len(ordered_fluents) + 1):
+        hpn.fbch.HPN(starting_state, hpn.fbch.State(ordered_fluents[:prefix_length]), operators, world,
+                     **hpn_arguments)
@@ -0,0 +1,294 @@
+import argparse  # for the command line interface
+import collections  # for deque
+import hashlib  # for naming the files after the locations
+import itertools  # for enumerating pattern states
+import json  # for the file header
+import os  # for the file paths
+import struct  # for the file header
+import tempfile  # for the directory of the files
+
+import numpy as np  # for the tables and memory mapping them
+
+from toy_fetch_place.world import *
+from toy_fetch_place.goal_index import GoalFluentIndex
+from toy_fetch_place.relaxed_planning import ASSUMED_CONFIDENCE
+
+# The pattern database abstracts a world state to a few items, each of them at a location
+# (one of the environment's possible_locations or the robot's possible_arms), known with probability 1 or only assumed.
+# The operators don't depend on the item names, so one table per pattern size serves all the item subsets.
+# Within a pattern, only PickUp, Place and Examine of its own items cost anything, Go and ManipulateEnvironment
+# cost 0 (zero-one cost partitioning), so the costs of disjoint patterns add up admissibly.
+# A table has a row for every pattern goal and a column for every pattern state,
+# the entries are the costs to reach the goal, or UNREACHABLE.
+#
+# File layout: MAGIC, the length of the JSON header as a little endian uint32, the JSON header,
+# then the uint8 tables at the offsets given in the header.
+
+MAGIC = 'TOYPDB\x00\x01'
+UNREACHABLE = 255
+# larger patterns are left out of a database if their table would have more entries, i.e., bytes
+MAX_TABLE_ENTRIES = 1 << 20
+
+
+def item_state_index(location_index, known):
+    return location_index * 2 + int(known)
+
+
+def item_goal_index(location_index, known):
+    """The goal index of an item is 0 if the item doesn't matter."""
+    return 1 + item_state_index(location_index, known)
+
+
+def item_successors(location_index, known, number_of_environment_locations, number_of_locations,
+                    occupied_location_indices):
+    """
+    :return list[(int, bool)]: the abstract states of the item after one PickUp, Place or Examine
+    """
+    if not known:
+        # ExamineEnvironment or ExamineHand
+        return [(location_index, True)]
+    if location_index < number_of_environment_locations:
+        # PickUp into a free arm, the result is only assumed
+        return [(arm_index, False) for arm_index in range(number_of_environment_locations, number_of_locations)
+                if arm_index not in occupied_location_indices]
+    # Place anywhere, the robot can go everywhere for free
+    return [(environment_location_index, False)
+            for environment_location_index in range(number_of_environment_locations)]
+
+
+def build_pattern_table(pattern_size, number_of_environment_locations, number_of_arms):
+    """
+    Computes the costs to go of all pattern states for all pattern goals, with a backward breadth first search per goal.
+    :param int pattern_size: number of items in the pattern
+    :param int number_of_environment_locations:
+    :param int number_of_arms:
+    :return np.ndarray: uint8 table with a row per goal and a column per state
+    """
+    number_of_locations = number_of_environment_locations + number_of_arms
+    number_of_item_states = number_of_locations * 2
+    number_of_item_goals = number_of_item_states + 1
+    item_states = [(location_index, known) for location_index in range(number_of_locations)
+                   for known in [False, True]]
+    # states with two items in the same arm are impossible, they don't get any predecessors
+    states = [state for state in itertools.product(item_states, repeat=pattern_size)
+              if len(set(location_index for (location_index, known) in state
+                         if location_index >= number_of_environment_locations)) ==
+              len([location_index for (location_index, known) in state
+                   if location_index >= number_of_environment_locations])]
+
+    def state_index(state):
+        index = 0
+        for (location_index, known) in state:
+            index = index * number_of_item_states + item_state_index(location_index, known)
+        return index
+
+    predecessors = {}
+    for state in states:
+        for (item, (location_index, known)) in enumerate(state):
+            occupied_location_indices = set(other_location_index for (other_item, (other_location_index, _))
+                                            in enumerate(state) if other_item != item)
+            for successor_item_state in item_successors(location_index, known, number_of_environment_locations,
+                                                        number_of_locations, occupied_location_indices):
+                successor = state[:item] + (successor_item_state,) + state[item + 1:]
+                predecessors.setdefault(state_index(successor), []).append(state_index(state))
+
+    def holds(item_goal, item_state):
+        (location_index, known) = item_state
+        if item_goal == 0:
+            return True
+        (goal_location_index, goal_known) = divmod(item_goal - 1, 2)
+        return location_index == goal_location_index and (known or not goal_known)
+
+    table = np.full((number_of_item_goals ** pattern_size, number_of_item_states ** pattern_size), UNREACHABLE,
+                    dtype=np.uint8)
+    for goal in itertools.product(range(number_of_item_goals), repeat=pattern_size):
+        goal_index = 0
+        for item_goal in goal:
+            goal_index = goal_index * number_of_item_goals + item_goal
+        costs = table[goal_index]
+        queue = collections.deque()
+        for state in states:
+            if all(holds(item_goal, item_state) for (item_goal, item_state) in zip(goal, state)):
+                costs[state_index(state)] = 0
+                queue.append(state_index(state))
+        while queue:
+            index = queue.popleft()
+            cost = costs[index] + 1
+            if cost >= UNREACHABLE:
+                continue
+            for predecessor in predecessors.get(index, []):
+                if costs[predecessor] == UNREACHABLE:
+                    costs[predecessor] = cost
+                    queue.append(predecessor)
+    return table
+
+
+def table_entries(pattern_size, number_of_locations):
+    return (number_of_locations * 2 + 1) ** pattern_size * (number_of_locations * 2) ** pattern_size
+
+
+def build_pattern_database(file_name, max_pattern_size=2, environment_locations=None, arms=None):
+    """
+    Builds the tables for all pattern sizes up to max_pattern_size, as long as they fit MAX_TABLE_ENTRIES,
+    and writes them to the file, replacing it atomically, so that concurrent processes only see whole files.
+    :param str file_name:
+    :param int max_pattern_size:
+    :param list[str] environment_locations: Environment.possible_locations if None
+    :param list[str] arms: Robot.possible_arms if None
+    """
+    environment_locations = list(environment_locations or Environment.possible_locations)
+    arms = list(arms or Robot.possible_arms)
+    tables = [build_pattern_table(pattern_size, len(environment_locations), len(arms))
+              for pattern_size in range(1, max_pattern_size + 1)
+              if pattern_size == 1 or
+              table_entries(pattern_size, len(environment_locations) + len(arms)) <= MAX_TABLE_ENTRIES]
+    header = {'environment_locations': environment_locations, 'arms': arms, 'tables': []}
+    # the offsets depend on the header length, which depends on the offsets, so fix the length first
+    header_length = 0
+    while True:
+        offset = len(MAGIC) + 4 + header_length
+        header['tables'] = []
+        for (pattern_size, table) in enumerate(tables, 1):
+            header['tables'].append({'pattern_size': pattern_size, 'offset': offset, 'shape': list(table.shape)})
+            offset += table.nbytes
+        encoded_header = json.dumps(header)
+        if len(encoded_header) <= header_length:
+            break
+        header_length = len(encoded_header)
+    temporary_file_name = '{}.{}.tmp'.format(file_name, os.getpid())
+    with open(temporary_file_name, 'wb') as pattern_database_file:
+        pattern_database_file.write(MAGIC)
+        pattern_database_file.write(struct.pack('<I', header_length))
+        pattern_database_file.write(encoded_header.ljust(header_length))
+        for table in tables:
+            pattern_database_file.write(table.tobytes())
+    os.rename(temporary_file_name, file_name)
+
+
+class PatternDatabase:
+    """Tables of a pattern database file, memory mapped, so that processes share the pages."""
+    def __init__(self, file_name):
+        with open(file_name, 'rb') as pattern_database_file:
+            if pattern_database_file.read(len(MAGIC)) != MAGIC:
+                raise Exception('{} is not a pattern database file.'.format(file_name))
+            (header_length,) = struct.unpack('<I', pattern_database_file.read(4))
+            header = json.loads(pattern_database_file.read(header_length))
+        self.environment_locations = header['environment_locations']
+        self.locations = header['environment_locations'] + header['arms']
+        self.location_indices = {location: index for (index, location) in enumerate(self.locations)}
+        self.number_of_item_states = len(self.locations) * 2
+        self.tables = {}
+        for table_header in header['tables']:
+            self.tables[table_header['pattern_size']] = np.memmap(file_name, dtype=np.uint8, mode='r',
+                                                                  offset=table_header['offset'],
+                                                                  shape=tuple(table_header['shape']))
+        self.max_pattern_size = max(self.tables.keys())
+
+    def cost(self, item_states, item_goals):
+        """
+        :param list[int] item_states: abstract state indices of the items of the pattern
+        :param list[int] item_goals: abstract goal indices of the same items
+        :return float: cost to go, inf if unreachable
+        """
+        state_index = 0
+        goal_index = 0
+        for (item_state, item_goal) in zip(item_states, item_goals):
+            state_index = state_index * self.number_of_item_states + item_state
+            goal_index = goal_index * (self.number_of_item_states + 1) + item_goal
+        cost = self.tables[len(item_states)][goal_index, state_index]
+        return float('inf') if cost == UNREACHABLE else int(cost)
+
+    def get_item_states(self, world_state):
+        """
+        :param WorldState world_state:
+        :return dict[str: int]: abstract state indices of the items at locations known to the database
+        """
+        item_states = {}
+        for item in world_state.items:
+            location = world_state.get_item_locations(item.name)[0]
+            if location in self.location_indices:
+                known = world_state.get_probability_of_item_at_location(item.name, location) >= 1
+                item_states[item.name] = item_state_index(self.location_indices[location], known)
+        return item_states
+
+    def get_item_goals(self, goal_fluents, robot_name):
+        """
+        :param goal_fluents: iterable of hpn.fbch.Fluent
+        :param str robot_name:
+        :return dict[str: int] | None: abstract goal indices of the items named in ground Know fluents,
+            None if a goal location is unknown to the database
+        """
+        item_goals = {}
+        for fluent in goal_fluents:
+            if fluent.predicate != 'Know' or not fluent.value or not GoalFluentIndex.is_ground(fluent):
+                continue
+            (nested_fluent, value, probability) = fluent.args
+            if nested_fluent.predicate == 'Location':
+                [item_name] = nested_fluent.args
+                location = value
+            elif nested_fluent.predicate == 'InHand' and value is not None:
+                (item_name, location) = (value, nested_fluent.args[0])
+            else:
+                continue
+            if item_name == robot_name:
+                continue
+            if location not in self.location_indices:
+                return None
+            # the results of PickUp and Place are only assumed, anything more has to be examined
+            item_goal = item_goal_index(self.location_indices[location], probability > ASSUMED_CONFIDENCE)
+            item_goals[item_name] = max(item_goals.get(item_name, 0), item_goal)
+        return item_goals
+
+    def heuristic_value(self, world_state, goal_fluents):
+        """
+        Sums the costs of the goal items, grouped into disjoint patterns of max_pattern_size items.
+        :return float | None: None if a goal item or its goal location is unknown to the database
+        """
+        item_states = world_state.get_or_evaluate(('PatternDatabaseItemStates', id(self)),
+                                                  lambda: self.get_item_states(world_state))
+        item_goals = self.get_item_goals(goal_fluents, world_state.get_robot_name())
+        if item_goals is None or [item_name for item_name in item_goals if item_name not in item_states]:
+            return None
+        item_names = sorted(item_goals)
+        total_cost = 0
+        for first in range(0, len(item_names), self.max_pattern_size):
+            pattern = item_names[first:first + self.max_pattern_size]
+            total_cost += self.cost([item_states[item_name] for item_name in pattern],
+                                    [item_goals[item_name] for item_name in pattern])
+        return total_cost
+
+
+def pattern_database_file_name(environment_locations, arms, max_pattern_size=2):
+    """
+    :return str: the file for the locations in the temporary directory, built once and shared by all processes
+    """
+    key = hashlib.sha1(json.dumps([list(environment_locations), list(arms), max_pattern_size, MAX_TABLE_ENTRIES]))
+    return os.path.join(tempfile.gettempdir(), 'toy_fetch_place_pattern_database_{}.bin'.format(key.hexdigest()[:16]))
+
+
+# loaded on first use, per environment locations and arms
+pattern_databases = {}
+
+
+def get_pattern_database(world_state):
+    """
+    :param WorldState world_state:
+    :return PatternDatabase: for the locations of the world state's environment and robot, built if missing
+    """
+    key = (tuple(world_state.environment.possible_locations), tuple(world_state.robot.possible_arms))
+    if key not in pattern_databases:
+        file_name = pattern_database_file_name(*key)
+        if not os.path.exists(file_name):
+            build_pattern_database(file_name, environment_locations=key[0], arms=key[1])
+        pattern_databases[key] = PatternDatabase(file_name)
+    return pattern_databases[key]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Builds the pattern database of the default kitchen locations '
+                                                 'for pattern_database_heuristic.')
+    parser.add_argument('--file-name', default=pattern_database_file_name(Environment.possible_locations,
+                                                                          Robot.possible_arms))
+    parser.add_argument('--max-pattern-size', type=int, default=2)
+    arguments = parser.parse_args()
+    build_pattern_database(arguments.file_name, arguments.max_pattern_size)
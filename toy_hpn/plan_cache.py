@@ -0,0 +1,152 @@
+import collections  # for OrderedDict
+import fcntl  # for locking the cache file against other processes
+import json  # for the cache file
+import os  # for replacing the cache file
+
+from toy_fetch_place.interactions import know_template
+
+# Plans are lists of steps (operator_name, argument_values), see interactions.
+# The cache file is a JSON list of [key, plan] pairs, from the least to the most recently used.
+# It is only written by store and close, under a lock file, merged with what other processes wrote meanwhile.
+
+
+def load_plans(file_name):
+    """
+    :return list[(str, list[(str, list)])]: the [key, plan] pairs of the file, with str instead of unicode values
+    """
+    def to_str(value):
+        return str(value) if isinstance(value, unicode) else value
+    if not os.path.exists(file_name):
+        return []
+    with open(file_name) as cache_file:
+        return [(str(key), [(str(operator_name), map(to_str, argument_values))
+                            for (operator_name, argument_values) in plan])
+                for (key, plan) in json.load(cache_file)]
+
+
+def relevant_item_names(world_state, goal_fluents):
+    """Items named in the goal and items in the robot's hands, the other items don't change how to plan."""
+    item_names = set(item.name for item in world_state.robot.get_all_items())
+    for fluent in goal_fluents:
+        template = know_template(fluent)
+        if not template:
+            continue
+        (predicate, arguments, value) = template
+        if predicate == 'Location':
+            item_names.add(arguments[0])
+        elif predicate == 'InHand' and value is not None:
+            item_names.add(value)
+    return sorted(item_name for item_name in item_names if item_name in world_state.items_by_name)
+
+
+def abstract_state_key(world_state, goal_fluents):
+    """
+    Canonical abstraction of the belief and the goal: where the robot and the relevant items are believed to be,
+    if their locations are known for sure, what the hands hold and the container states.
+    :param WorldState world_state:
+    :param goal_fluents: iterable of ground hpn.fbch.Fluent
+    :return str:
+    """
+    robot_name = world_state.get_robot_name()
+    item_locations = []
+    for item_name in [robot_name] + relevant_item_names(world_state, goal_fluents):
+        location = world_state.get_item_locations(item_name)[0]
+        known = world_state.get_probability_of_item_at_location(item_name, location) >= 1
+        item_locations.append([item_name, location, known])
+    hands = [[arm, world_state.robot.get_item_in_hand(arm) and world_state.robot.get_item_in_hand(arm).name]
+             for arm in world_state.robot.possible_arms]
+    container_states = [[container, world_state.environment.get_container_state(container)]
+                        for container in sorted(world_state.environment.container_locations)]
+    return json.dumps([item_locations, hands, container_states, sorted(str(fluent) for fluent in goal_fluents)])
+
+
+class PlanCache:
+    """Plans for abstract states and goals, kept on disk across episodes, evicting the least recently used."""
+    def __init__(self, file_name, max_entries=1000):
+        """
+        :param str file_name: JSON file, created on the first store
+        :param int max_entries:
+        """
+        self.file_name = file_name
+        self.max_entries = max_entries
+        self.plans = collections.OrderedDict(load_plans(file_name))
+        # keys stored, hit or dropped since the last save, the other keys are taken from the file when saving
+        self.used_keys = set()
+        self.dropped_keys = set()
+        self.changed = False
+        self.hits = 0
+        self.misses = 0
+
+    def save(self):
+        """
+        Merges the plans that other processes saved meanwhile and replaces the file atomically.
+        """
+        with open(self.file_name + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            plans = collections.OrderedDict((key, plan) for (key, plan) in load_plans(self.file_name)
+                                            if key not in self.dropped_keys and key not in self.used_keys)
+            # the plans used here go last, in the order they were used in, the others are as the file has them
+            for (key, plan) in self.plans.items():
+                if key in self.used_keys:
+                    plans[key] = plan
+            while len(plans) > self.max_entries:
+                plans.popitem(last=False)
+            temporary_file_name = '{}.{}.tmp'.format(self.file_name, os.getpid())
+            with open(temporary_file_name, 'w') as cache_file:
+                json.dump(plans.items(), cache_file)
+            os.rename(temporary_file_name, self.file_name)
+        self.plans = plans
+        self.used_keys = set()
+        self.dropped_keys = set()
+        self.changed = False
+
+    def close(self):
+        """Saves the recency of the hits and the dropped plans, if anything changed since the last store."""
+        if self.changed:
+            self.save()
+
+    def lookup(self, world_state, goal_fluents, executor):
+        """
+        :param WorldState world_state:
+        :param goal_fluents: iterable of ground hpn.fbch.Fluent
+        :param PlanExecutor executor: simulates the cached plan forward to validate it
+        :return list[(str, list)] | None: the cached plan if it still works from the world state
+        """
+        goal_fluents = list(goal_fluents)
+        key = abstract_state_key(world_state, goal_fluents)
+        plan = self.plans.pop(key, None)
+        if plan is None or not executor.plan_works(plan, world_state, goal_fluents):
+            self.misses += 1
+            if plan is not None:
+                self.dropped_keys.add(key)
+                self.changed = True
+            return None
+        self.hits += 1
+        # most recently used go last
+        self.plans[key] = plan
+        self.used_keys.add(key)
+        self.changed = True
+        return list(plan)
+
+    def store(self, world_state, goal_fluents, plan):
+        key = abstract_state_key(world_state, goal_fluents)
+        self.plans.pop(key, None)
+        self.plans[key] = [(operator_name, list(argument_values)) for (operator_name, argument_values) in plan]
+        self.used_keys.add(key)
+        self.dropped_keys.discard(key)
+        while len(self.plans) > self.max_entries:
+            self.plans.popitem(last=False)
+        self.save()
+
+    def get_or_plan(self, world_state, goal_fluents, executor, plan):
+        """
+        :param plan: function (world_state) -> list of steps or None, called on a cache miss
+        :return list[(str, list)] | None:
+        """
+        goal_fluents = list(goal_fluents)
+        steps = self.lookup(world_state, goal_fluents, executor)
+        if steps is None:
+            steps = plan(world_state)
+            if steps is not None:
+                self.store(world_state, goal_fluents, steps)
+        return steps
@@ -0,0 +1,374 @@
+import hpn.fbch  # for Fluent, State and planBackward
+import hpnutil.miscUtil  # for isVar
+
+from toy_fetch_place.world import Robot
+from toy_fetch_place.interactions import operator_preconditions, operator_results, hpn_plan_steps, ClobberTable
+from toy_fetch_place.landmarks import order_goal_fluents
+
+# Plans are lists of steps (operator_name, argument_values), see interactions.
+# Instead of replanning from scratch after a primitive fails, the executor keeps the rest of the plan
+# and patches it locally: it examines what the failure made uncertain and retries the failed step,
+# or it regresses the goal through the failed step and the rest of the plan and plans only for that subgoal.
+# A patch is only taken if simulating it on a fork of the belief shows that the rest of the plan works,
+# otherwise the planner is asked for a new plan for the whole goal.
+
+
+def ground_fluent(fluent, bindings):
+    """
+    :param hpn.fbch.Fluent fluent: with operator argument names as variables
+    :param dict bindings: operator argument names to values
+    :return hpn.fbch.Fluent: a new fluent with the variables replaced
+    """
+    def ground(argument):
+        if isinstance(argument, hpn.fbch.Fluent):
+            return ground_fluent(argument, bindings)
+        return bindings.get(argument, argument) if hpnutil.miscUtil.isVar(argument) else argument
+    return fluent.__class__([ground(argument) for argument in fluent.args], ground(fluent.value))
+
+
+def fluent_is_ground(fluent):
+    for argument in list(fluent.args) + [fluent.value]:
+        if isinstance(argument, hpn.fbch.Fluent):
+            if not fluent_is_ground(argument):
+                return False
+        elif hpnutil.miscUtil.isVar(argument):
+            return False
+    return True
+
+
+def result_achieves(result_fluent, fluent):
+    """Know results also achieve Know fluents of the same nested fluent and value with a lower probability."""
+    if result_fluent == fluent:
+        return True
+    if result_fluent.predicate != 'Know' or fluent.predicate != 'Know' or result_fluent.value != fluent.value:
+        return False
+    (result_nested_fluent, result_value, result_probability) = result_fluent.args
+    (nested_fluent, value, probability) = fluent.args
+    if hpnutil.miscUtil.isVar(result_probability) or hpnutil.miscUtil.isVar(probability):
+        return False
+    return result_nested_fluent == nested_fluent and result_value == value and result_probability >= probability
+
+
+def fluent_holds(fluent, world_state):
+    return fluent.test(world_state) == fluent.value
+
+
+def assumed_value_holds(fluent, world_state):
+    """For Know fluents, only compares the value believed most, not its probability."""
+    if fluent.predicate == 'Know':
+        (nested_fluent, value, probability) = fluent.args
+        return nested_fluent.value_and_probability(world_state)[0] == value
+    return fluent_holds(fluent, world_state)
+
+
+class PlanExecutor:
+    def __init__(self, operators, world, planner=None, max_repairs=20):
+        """
+        :param list[hpn.fbch.Operator] operators: their primitives and progress functions execute the steps
+        :param World world: executes the primitives
+        :param Planner planner: plans for the regressed subgoals of repairs, and for the whole goal
+            when no local patch works, no planning if None
+        :param int max_repairs: how many patches and replans to try before giving up
+        """
+        self.operators = {operator.name: operator for operator in operators}
+        self.world = world
+        self.planner = planner
+        self.max_repairs = max_repairs
+        self.executed_primitives = 0
+        self.repairs = 0
+        self.replans = 0
+
+    def bindings(self, step):
+        (operator_name, argument_values) = step
+        return dict(zip(self.operators[operator_name].args, argument_values))
+
+    def preconditions(self, step):
+        bindings = self.bindings(step)
+        return [ground_fluent(fluent, bindings) for fluent in operator_preconditions(self.operators[step[0]])]
+
+    def results(self, step):
+        bindings = self.bindings(step)
+        return [ground_fluent(fluent, bindings) for fluent in operator_results(self.operators[step[0]])]
+
+    def violated_preconditions(self, step, world_state):
+        return [fluent for fluent in self.preconditions(step) if not fluent_holds(fluent, world_state)]
+
+    def rebind_step(self, step, world_state):
+        """
+        Rebinds the arguments that generators take from the belief at planning time,
+        as they are outdated after a failure: the probability before examining and the current container state.
+        :return (str, list): a new step
+        """
+        (operator_name, argument_values) = step
+        argument_values = list(argument_values)
+        if operator_name == 'ExamineEnvironment':
+            (item_name, location) = argument_values[:2]
+            probability = world_state.get_probability_of_item_at_location(item_name, location)
+            argument_values[2] = probability if probability > 0 else argument_values[2]
+        elif operator_name == 'ExamineHand':
+            (item_name, arm) = argument_values[:2]
+            probability = world_state.get_probability_of_item_in_hand(item_name, arm)
+            argument_values[2] = probability if probability > 0 else argument_values[2]
+        elif operator_name == 'ManipulateEnvironment':
+            argument_values[4] = world_state.environment.get_container_state(argument_values[1])
+        return (operator_name, argument_values)
+
+    def step_failed(self, step, world_state):
+        return not all(assumed_value_holds(fluent, world_state) for fluent in self.results(step))
+
+    ################ executing ############
+
+    def execute_step(self, step, world_state):
+        """
+        Executes the primitive of the step in the world and updates the belief with the observation.
+        """
+        (operator_name, argument_values) = step
+        operator = self.operators[operator_name]
+        observation = self.world.executePrim(operator_name, operator.prim(argument_values, world_state))
+        self.executed_primitives += 1
+        operator.f(world_state, argument_values, observation)
+
+    def simulate_step(self, step, world_state):
+        """
+        Updates the belief as if the primitive succeeded and perception saw what the belief assumes.
+        """
+        (operator_name, argument_values) = step
+        operator = self.operators[operator_name]
+        primitive_arguments = operator.prim(argument_values, world_state)
+        if operator_name in ['ExamineEnvironment', 'ExamineHand']:
+            observation = [item.name for item in world_state.get_items_at_location(primitive_arguments) or []]
+        else:
+            observation = primitive_arguments[2]
+        operator.f(world_state, argument_values, observation)
+
+    def plan_works(self, steps, world_state, goal_fluents):
+        """
+        Simulates the steps on a fork of the belief.
+        :return bool: if the preconditions of all the steps and then the goal hold
+        """
+        simulated_state = world_state.fork()
+        for step in steps:
+            step = self.rebind_step(step, simulated_state)
+            if self.violated_preconditions(step, simulated_state):
+                return False
+            self.simulate_step(step, simulated_state)
+        return all(fluent_holds(fluent, simulated_state) for fluent in goal_fluents)
+
+    ################ repairing ############
+
+    def examine_steps(self, fluents, world_state):
+        """
+        :param list[hpn.fbch.Fluent] fluents: Know fluents whose value is believed, but not confidently enough
+        :return list[(str, list)]: examine steps which make sure of the believed values
+        """
+        robot_name = world_state.get_robot_name()
+        steps = []
+        for fluent in fluents:
+            if fluent.predicate != 'Know' or not assumed_value_holds(fluent, world_state):
+                continue
+            (nested_fluent, value, probability) = fluent.args
+            (_, believed_probability) = nested_fluent.value_and_probability(world_state)
+            if nested_fluent.predicate == 'Location' and nested_fluent.args[0] != robot_name:
+                [item_name] = nested_fluent.args
+                if value in Robot.possible_arms:
+                    step = ('ExamineHand', [item_name, value, believed_probability])
+                else:
+                    step = ('ExamineEnvironment', [item_name, value, believed_probability, robot_name])
+            elif nested_fluent.predicate == 'InHand':
+                step = ('ExamineHand', [value, nested_fluent.args[0], believed_probability])
+            else:
+                continue
+            if step[0] in self.operators and step not in steps:
+                steps.append(step)
+        return steps
+
+    def repair_candidates(self, failed_step, remaining_steps, world_state):
+        """
+        Local patches, from the cheapest: examining could show that the rest of the plan works as it is,
+        otherwise the failed step is retried, after examining what its own preconditions need.
+        """
+        next_step = remaining_steps[0] if remaining_steps else None
+        next_examine_steps = self.examine_steps(self.violated_preconditions(next_step, world_state), world_state) \
+            if next_step else []
+        candidates = [next_examine_steps + remaining_steps]
+        if failed_step:
+            retry_examine_steps = self.examine_steps(self.violated_preconditions(failed_step, world_state),
+                                                     world_state)
+            candidates.append(retry_examine_steps + [failed_step] + remaining_steps)
+            if retry_examine_steps:
+                candidates.append([failed_step] + remaining_steps)
+        return candidates
+
+    def regress(self, goal_fluents, steps):
+        """
+        :param list[hpn.fbch.Fluent] goal_fluents: ground
+        :param list[(str, list)] steps:
+        :return list[hpn.fbch.Fluent]: what has to hold before the steps for them to achieve the goal,
+            preconditions that the steps' bindings don't ground are left out
+        """
+        subgoal = list(goal_fluents)
+        for step in reversed(steps):
+            results = self.results(step)
+            subgoal = [fluent for fluent in subgoal
+                       if not [result for result in results if result_achieves(result, fluent)]]
+            for fluent in self.preconditions(step):
+                if fluent_is_ground(fluent) and fluent not in subgoal:
+                    subgoal.append(fluent)
+        return subgoal
+
+    def regression_candidates(self, failed_step, remaining_steps, world_state, goal_fluents):
+        """
+        Local plans for the goal regressed through the failed step and the rest of the plan, followed by them,
+        then through shorter and shorter rests, from the failed step on.
+        """
+        steps = ([failed_step] if failed_step else []) + remaining_steps
+        for start_index in range(len(steps)):
+            subgoal = self.regress(goal_fluents, steps[start_index:])
+            if all(fluent_holds(fluent, world_state) for fluent in subgoal):
+                continue
+            local_steps = self.planner.plan(world_state, subgoal)
+            if local_steps is not None:
+                yield local_steps + steps[start_index:]
+
+    def repair(self, failed_step, remaining_steps, world_state, goal_fluents):
+        """
+        :return list[(str, list)] | None: a patched plan which works in simulation, or a new plan from the planner
+        """
+        for candidate in self.repair_candidates(failed_step, remaining_steps, world_state):
+            if self.plan_works(candidate, world_state, goal_fluents):
+                self.repairs += 1
+                return candidate
+        if not self.planner:
+            return None
+        for candidate in self.regression_candidates(failed_step, remaining_steps, world_state, goal_fluents):
+            if self.plan_works(candidate, world_state, goal_fluents):
+                self.repairs += 1
+                return candidate
+        self.replans += 1
+        return self.planner.plan(world_state, goal_fluents)
+
+    def execute(self, steps, world_state, goal_fluents=()):
+        """
+        Executes the plan, patching it after failures.
+        :param list[(str, list)] steps:
+        :param WorldState world_state: the belief, updated by the progress functions
+        :param goal_fluents: iterable of ground hpn.fbch.Fluent, checked after the last step
+        :return bool: if the goal holds in the belief in the end
+        """
+        goal_fluents = list(goal_fluents)
+        steps = list(steps)
+        attempts = 0
+        while True:
+            failed_step = None
+            while steps and not failed_step:
+                steps[0] = self.rebind_step(steps[0], world_state)
+                if self.violated_preconditions(steps[0], world_state):
+                    break
+                step = steps.pop(0)
+                self.execute_step(step, world_state)
+                if self.step_failed(step, world_state):
+                    failed_step = step
+            if not failed_step and not steps and all(fluent_holds(fluent, world_state) for fluent in goal_fluents):
+                return True
+            attempts += 1
+            if attempts > self.max_repairs:
+                return False
+            steps = self.repair(failed_step, steps, world_state, goal_fluents)
+            if steps is None:
+                return False
+
+    def achieve(self, world_state, goal_fluents):
+        """
+        Plans for the goal with the planner and executes the plan, repairing it after failures.
+        :return bool: if the goal holds in the belief in the end
+        """
+        goal_fluents = list(goal_fluents)
+        steps = self.planner.plan(world_state, goal_fluents)
+        if steps is None:
+            return False
+        return self.execute(steps, world_state, goal_fluents)
+
+
+class Planner:
+    """
+    Plans with hpn.fbch.planBackward and checks the plan for steps that undo what a later step or the goal needs
+    (see interactions.ClobberTable). Such plans are reordered, or rejected if no order works,
+    in which case the landmark ordered goal conjuncts (see landmarks.order_goal_fluents) are planned for one after
+    the other, on a fork of the belief simulated forward.
+    With a plan cache, plans that still work in simulation are reused for the same abstract state and goal.
+    """
+    def __init__(self, operators, heuristic, clobber_table=None, plan_cache=None):
+        """
+        :param list[hpn.fbch.Operator] operators:
+        :param heuristic: function (start, goal, ops, ancestors, infOkay) -> float
+        :param ClobberTable clobber_table: precomputed for the operators, made if None
+        :param plan_cache.PlanCache plan_cache: None for planning every time
+        """
+        self.operators = operators
+        self.heuristic = heuristic
+        self.clobber_table = clobber_table or ClobberTable(operators)
+        self.plan_cache = plan_cache
+        self.executor = PlanExecutor(operators, None)
+        self.reordered_plans = 0
+        self.rejected_plans = 0
+
+    def plan_steps(self, world_state, goal_fluents, heuristic=None):
+        """
+        :param heuristic: instead of the planner's, e.g., one that aborts the search after a deadline
+        :return list[(str, list)] | None: the steps of the plan as found by the search, None if there is none
+        """
+        plan = hpn.fbch.planBackward(hpn.fbch.State([], world_state), hpn.fbch.State(goal_fluents), self.operators,
+                                     h=heuristic or self.heuristic, fileTag=None)
+        return None if plan is None else hpn_plan_steps(plan)
+
+    def without_threats(self, steps, goal_fluents):
+        """
+        :return list[(str, list)] | None: the steps, reordered if a step undoes what a later one needs,
+            None if the plan has to be rejected
+        """
+        if not self.clobber_table.find_threats(steps, goal_fluents):
+            return steps
+        steps = self.clobber_table.reorder_plan(steps, goal_fluents)
+        if steps is None:
+            self.rejected_plans += 1
+        else:
+            self.reordered_plans += 1
+        return steps
+
+    def plan_serialized(self, world_state, goal_fluents):
+        """
+        :return list[(str, list)] | None: the plans for the growing prefixes of the ordered goal conjuncts,
+            None if one of them fails or the whole plan doesn't achieve the goal in simulation
+        """
+        ordered_fluents = order_goal_fluents(goal_fluents, world_state)
+        simulated_state = world_state.fork()
+        steps = []
+        for prefix_length in range(1, len(ordered_fluents) + 1):
+            prefix_steps = self.plan_steps(simulated_state, ordered_fluents[:prefix_length])
+            if prefix_steps is None:
+                return None
+            for step in prefix_steps:
+                self.executor.simulate_step(self.executor.rebind_step(step, simulated_state), simulated_state)
+            steps.extend(prefix_steps)
+        return steps if self.executor.plan_works(steps, world_state, goal_fluents) else None
+
+    def plan(self, world_state, goal_fluents):
+        """
+        :param WorldState world_state:
+        :param goal_fluents: iterable of ground hpn.fbch.Fluent
+        :return list[(str, list)] | None:
+        """
+        goal_fluents = list(goal_fluents)
+        if self.plan_cache:
+            return self.plan_cache.get_or_plan(world_state, goal_fluents, self.executor,
+                                               lambda world_state: self.plan_uncached(world_state, goal_fluents))
+        return self.plan_uncached(world_state, goal_fluents)
+
+    def plan_uncached(self, world_state, goal_fluents):
+        steps = self.plan_steps(world_state, goal_fluents)
+        if steps is None:
+            return None
+        checked_steps = self.without_threats(steps, goal_fluents)
+        if checked_steps is not None:
+            return checked_steps
+        return self.plan_serialized(world_state, goal_fluents)
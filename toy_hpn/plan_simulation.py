@@ -0,0 +1,80 @@
+import numpy as np  # for simulating all rollouts at once
+
+
+def step_success_probability(operator_name, primitive_arguments, operator_fail_probabilities):
+    """
+    Probability that executing the primitive once changes the world as intended.
+    Follows World.container_state_transition_model and World.object_location_transition_model:
+    on failure nothing changes, and if the goal is the same as the start, the primitive cannot fail.
+    :param str operator_name:
+    :param primitive_arguments: whatever the primitive of the operator returns, as passed to World.executePrim
+    :param dict[str: float] operator_fail_probabilities: maps operator names to probabilities
+    :return float: a number from 0 to 1
+    """
+    if operator_name == 'ManipulateEnvironment':
+        # container_name, current_state, goal_state
+        start = primitive_arguments[1]
+        goal = primitive_arguments[2]
+    elif operator_name in ['Go', 'PickUp', 'Place', 'Regrasp']:
+        # item_or_robot, start_location, goal_location
+        start = primitive_arguments[1]
+        goal = primitive_arguments[2]
+    elif operator_name in ['ExamineEnvironment', 'ExamineHand']:
+        # perception is perfect
+        return 1.0
+    else:
+        raise Exception('Unknown operator primitive {}.'.format(operator_name))
+    if start == goal:
+        return 1.0
+    return 1.0 - operator_fail_probabilities[operator_name]
+
+
+def estimate_plan_success(plan, operator_fail_probabilities, number_of_rollouts=10000, max_retries=0,
+                          random_seed=None):
+    """
+    Monte Carlo estimate of how robust a plan is, with all rollouts simulated at once.
+    A failed primitive leaves the world unchanged, so it can be retried up to max_retries times
+    before the rollout is considered failed at that step.
+    :param list[(str, list)] plan: a list of (operator_name, primitive_arguments) as passed to World.executePrim
+    :param dict[str: float] operator_fail_probabilities: maps operator names to probabilities
+    :param int number_of_rollouts:
+    :param int max_retries: how many times a failed step is retried
+    :param int random_seed: for reproducible estimates
+    :return dict: with keys
+        'success_probability': fraction of rollouts in which all the steps succeeded,
+        'exact_success_probability': the same, computed analytically,
+        'failure_step_distribution': for each step, fraction of rollouts that failed at that step,
+        'expected_retries': average number of retries per rollout,
+        'expected_primitive_executions': average number of primitives executed per rollout
+    """
+    random_state = np.random.RandomState(random_seed)
+    number_of_steps = len(plan)
+    attempts_budget = max_retries + 1
+    success_probabilities = np.array([step_success_probability(operator_name, primitive_arguments,
+                                                               operator_fail_probabilities)
+                                      for (operator_name, primitive_arguments) in plan], dtype=float)
+    if number_of_steps == 0:
+        return {'success_probability': 1.0,
+                'exact_success_probability': 1.0,
+                'failure_step_distribution': [],
+                'expected_retries': 0.0,
+                'expected_primitive_executions': 0.0}
+    # number of attempts each step needs until it succeeds, for each rollout
+    never_succeeds = success_probabilities <= 0
+    attempts = random_state.geometric(np.where(never_succeeds, 1.0, success_probabilities),
+                                      size=(number_of_rollouts, number_of_steps))
+    attempts[:, never_succeeds] = attempts_budget + 1
+    failed = attempts > attempts_budget
+    rollout_failed = failed.any(axis=1)
+    # steps after the first failed one are never executed
+    first_failed_step = np.where(rollout_failed, failed.argmax(axis=1), number_of_steps)
+    executed = np.arange(number_of_steps)[np.newaxis, :] <= first_failed_step[:, np.newaxis]
+    executions = np.where(executed, np.minimum(attempts, attempts_budget), 0).sum(axis=1)
+    executed_steps = np.minimum(first_failed_step + 1, number_of_steps)
+    failure_step_counts = np.bincount(first_failed_step[rollout_failed], minlength=number_of_steps)
+    return {'success_probability': float(1.0 - rollout_failed.mean()),
+            'exact_success_probability':
+                float(np.prod(1.0 - (1.0 - success_probabilities) ** attempts_budget)),
+            'failure_step_distribution': (failure_step_counts / float(number_of_rollouts)).tolist(),
+            'expected_retries': float((executions - executed_steps).mean()),
+            'expected_primitive_executions': float(executions.mean())}
@@ -52,46 +52,50 @@ def goProgress(world_state, operator_arguments, observations):
 def pickUpProgress(world_state, operator_arguments, observations):
     # operator_arguments = ['RobotName', 'Arm', 'ItemName', 'ItemLocation']
     world_state.move_item_or_robot(operator_arguments[2], operator_arguments[3], observations)
+    world_state.predict_item_move(operator_arguments[2], operator_arguments[3], operator_arguments[1],
+                                  world_state.operator_fail_probabilities['PickUp'])
+    world_state.observe_item_move_outcome(operator_arguments[2], observations)
 
 
 def placeProgress(world_state, operator_arguments, observations):
     # operator_arguments = ['RobotName', 'Arm', 'ItemName', 'ItemLocation']
     world_state.move_item_or_robot(operator_arguments[2], operator_arguments[1], observations)
+    world_state.predict_item_move(operator_arguments[2], operator_arguments[1], operator_arguments[3],
+                                  world_state.operator_fail_probabilities['Place'])
+    world_state.observe_item_move_outcome(operator_arguments[2], observations)
 
 
 def regraspProgress(world_state, operator_arguments, observations):
     # operator_arguments = ['CurrentArm', 'NewArm', 'ItemName']
     world_state.move_item_or_robot(operator_arguments[2], operator_arguments[0], observations)
+    world_state.predict_item_move(operator_arguments[2], operator_arguments[0], operator_arguments[1],
+                                  world_state.operator_fail_probabilities['Regrasp'])
+    world_state.observe_item_move_outcome(operator_arguments[2], observations)
 
 
 def examineProgress(world_state, operator_arguments, observations):
-    item_name = operator_arguments[0]
+    # operator_arguments = ['ItemName', 'ItemLocation', ...]
     item_location = operator_arguments[1]
     list_of_item_names = observations
-    current_item_location = world_state.get_item_locations(item_name)[0]
-    if item_name in list_of_item_names:  # the item is indeed there
-        # perception can teleport objects, and things can disappear from closed drawers, thus, we use low-level setters
-        # remove item from current location
-        if current_item_location in world_state.environment.possible_locations:
-            # item was in the environment
-            world_state.environment.items_at_locations[current_item_location] =\
-                [it for it in world_state.environment.items_at_locations[current_item_location] if it.name != item_name]
-        elif current_item_location in world_state.robot.possible_arms:
-            # item was in robot's hand
-            world_state.robot.items_in_hands[current_item_location] = None
-        # add the item to the observed location
-        item = world_state.get_item_with_name(item_name)
-        if item_location in world_state.environment.possible_locations:
-            # item is in the environment
-            world_state.environment.items_at_locations[item_location].append(item)
-        elif item_location in world_state.robot.possible_arms:
-            # item is in robot's hand
-            world_state.robot.items_in_hands[item_location] = item
-        # set the confidence to 1.0
-        world_state.set_probability_of_item_at_location(item_name, current_item_location, item_location, 1.0)
-    else:   # say that we know the object is NOT at other locations: Know(Location(Object), SomewhereElse, 0) = true
-        if item_location in world_state.robot.possible_arms and not list_of_item_names:
-            # the goal location is in robot's hand and we observed that the hand is empty,
-            # so say that we know the arm is empty with confidence of 1
-            world_state.robot.items_in_hands[item_location] = None
-            world_state.robot.set_item_in_hand_confidence(item_location, 1.0)
\ No newline at end of file
+    # the observed items are at the location for sure, and all the others are not
+    world_state.observe_items_at_location(item_location, list_of_item_names)
+    # perception can teleport objects, and things can disappear from closed drawers, thus, we use low-level setters
+    for observed_item_name in list_of_item_names:
+        if item_location not in world_state.get_item_locations(observed_item_name):
+            world_state.teleport_item(observed_item_name, item_location)
+    # the items that we assumed to be at the location but didn't see are most probably somewhere else
+    if item_location in world_state.robot.possible_arms:
+        item_in_hand = world_state.robot.get_item_in_hand(item_location)
+        missing_items = [item_in_hand] if item_in_hand else []
+    else:
+        missing_items = list(world_state.environment.get_items_at_location(item_location))
+    for item in missing_items:
+        if item.name not in list_of_item_names:
+            if item_location in world_state.robot.possible_arms:
+                # the hand is empty for sure, so the item goes somewhere else even if its belief ties
+                world_state.teleport_item(item.name, world_state.get_most_probable_environment_location(item.name))
+                continue
+            # without evidence for one of the other locations, the item stays where it was assumed
+            most_probable_locations = world_state.get_most_probable_environment_locations(item.name)
+            if len(most_probable_locations) == 1:
+                world_state.teleport_item(item.name, most_probable_locations[0])
@@ -0,0 +1,164 @@
+import numpy as np  # for the belief rows the moves are simulated on
+
+import hpnutil.miscUtil  # for isVar
+
+from toy_fetch_place.world_state import predict_move, observe_outcome
+
+# Confidences in Know fluents only take a few values under the transition model: 1 after examining or for the
+# robot's own location, the initial confidence of items that were never perceived, the result confidences the
+# operators assume, e.g., 0.75 for PickUp and Place, and what the belief updates of the progress functions make of
+# these after picking up, placing or regrasping, whether the move is observed to succeed or to fail.
+# The levels are found by running the same updates (world_state.predict_move and observe_outcome) on small belief
+# rows. Know tests compare the confidences and the required probabilities rounded down onto the levels, to be
+# optimistic like the rounding of the Know keys, and examine operators are only regressed to levels,
+# so the regressed goals of different branches share their probabilities and collapse into the same search node.
+# The levels depend on the operators that are planned with and on the model of the world state,
+# so the lattice is given to the world state (see set_probability_lattice) instead of being global.
+
+# operators whose progress functions spread an item's belief according to their fail probability
+MOVING_OPERATOR_NAMES = ['PickUp', 'Place', 'Regrasp']
+# decimals of the levels, which also absorbs floating point noise
+LEVEL_DECIMALS = 4
+# columns of the belief rows the moves are simulated on: two locations, two arms and all the other locations
+(LOCATION, OTHER_LOCATION, ARM, OTHER_ARM, ELSEWHERE) = range(5)
+# (start column, goal column) of the moves each operator can make
+OPERATOR_MOVES = {'PickUp': [(LOCATION, ARM), (OTHER_LOCATION, ARM)],
+                  'Place': [(ARM, LOCATION), (ARM, OTHER_LOCATION)],
+                  'Regrasp': [(ARM, OTHER_ARM)]}
+
+
+class ProbabilityLattice:
+    def __init__(self, levels, examine_levels):
+        """
+        :param list[float] levels: all the levels, including 0 and 1
+        :param list[float] examine_levels: levels worth regressing an examine operator to, in descending order
+        """
+        self.levels = sorted(set(levels).union([0.0, 1.0]))
+        self.examine_levels = examine_levels
+
+    def round_down(self, probability):
+        """
+        :param float probability:
+        :return float: the highest level that is at most probability
+        """
+        rounded_probability = round(probability, LEVEL_DECIMALS)
+        for level in reversed(self.levels):
+            if level <= rounded_probability:
+                return level
+        return 0.0
+
+    def __str__(self):
+        return 'ProbabilityLattice({}, examine {})'.format(self.levels, self.examine_levels)
+
+
+def operator_result_confidences(operators):
+    """
+    :param list[hpn.fbch.Operator] operators:
+    :return list[float]: the probabilities below 1 of the Know fluents in the results of the operators
+    """
+    confidences = set()
+    for operator in operators:
+        for (result_fluents, _) in operator.results:
+            for fluent in result_fluents:
+                if fluent.predicate != 'Know' or hpnutil.miscUtil.isVar(fluent.args[2]):
+                    continue
+                if 0 < fluent.args[2] < 1:
+                    confidences.add(float(fluent.args[2]))
+    return sorted(confidences)
+
+
+def relabel(row, column):
+    """
+    :param np.ndarray row:
+    :param int column: where the item is assumed
+    :return (np.ndarray, int): the row with the columns of its kind swapped, such that the item is assumed
+        at LOCATION or ARM, which is returned too
+    """
+    if column == OTHER_LOCATION:
+        return (row[[OTHER_LOCATION, LOCATION, ARM, OTHER_ARM, ELSEWHERE]], LOCATION)
+    if column == OTHER_ARM:
+        return (row[[LOCATION, OTHER_LOCATION, OTHER_ARM, ARM, ELSEWHERE]], ARM)
+    return (row, column)
+
+
+def move_outcomes(row, assumed_column, operator_fail_probabilities, outcome_observation_accuracy):
+    """
+    :param np.ndarray row: belief over the columns above
+    :param int assumed_column: LOCATION or ARM, where the world state assumes the item
+    :param dict[str: float] operator_fail_probabilities: of the enabled moving operators
+    :param float outcome_observation_accuracy: see WorldState
+    :return list[(np.ndarray, int, float)]: the row and the assumed column after every move of the item that
+        the operators can make, observed to succeed or to fail, see relabel, and the confidence in the assumed column
+    """
+    outcomes = []
+    for (operator_name, fail_probability) in sorted(operator_fail_probabilities.items()):
+        for (start_column, goal_column) in OPERATOR_MOVES[operator_name]:
+            if start_column != assumed_column:
+                continue
+            for observed_column in [goal_column, start_column]:
+                next_row = row.copy()
+                predict_move(next_row, start_column, goal_column, fail_probability)
+                observe_outcome(next_row, observed_column, outcome_observation_accuracy)
+                (next_row, next_assumed_column) = relabel(next_row, observed_column)
+                outcomes.append((next_row, next_assumed_column, float(next_row[next_assumed_column])))
+    return outcomes
+
+
+def build_probability_lattice(operators, operator_fail_probabilities, initial_confidence,
+                              outcome_observation_accuracy, number_of_locations, max_moves=2):
+    """
+    :param list[hpn.fbch.Operator] operators: the enabled operators, disabled ones add no levels
+    :param dict[str: float] operator_fail_probabilities:
+    :param float initial_confidence: of items that were never perceived
+    :param float outcome_observation_accuracy: see WorldState
+    :param int number_of_locations: environment locations, over which the initial belief spreads the rest
+    :param int max_moves: how many moves in a row to follow from a certain or an initial belief
+    :return ProbabilityLattice:
+    """
+    operator_names = set(operator.name for operator in operators)
+    move_fail_probabilities = {operator_name: operator_fail_probabilities[operator_name]
+                               for operator_name in MOVING_OPERATOR_NAMES
+                               if operator_name in operator_names and operator_name in operator_fail_probabilities}
+    # the item known or never perceived at a location or in an arm,
+    # the initial belief spreads the rest evenly over the other environment locations, like the world state
+    certain_rows = []
+    initial_rows = []
+    for column in [LOCATION, ARM]:
+        row = np.zeros(ELSEWHERE + 1)
+        row[column] = 1.0
+        certain_rows.append((row, column))
+        other_locations = number_of_locations - (1 if column == LOCATION else 0)
+        initial_row = np.zeros(ELSEWHERE + 1)
+        initial_row[[LOCATION, OTHER_LOCATION]] = (1.0 - initial_confidence) / max(other_locations, 1)
+        initial_row[ELSEWHERE] = (1.0 - initial_confidence) * max(other_locations - 2, 0) / max(other_locations, 1)
+        initial_row[column] = initial_confidence
+        initial_rows.append((initial_row, column))
+    # the confidences right before examining are typically those after a single move of a known item;
+    # an examine regressed to confidence 1 achieves nothing, and 0 is the fallback of examining anywhere
+    single_move_levels = [confidence for (row, column) in certain_rows
+                          for (_, _, confidence) in move_outcomes(row, column, move_fail_probabilities,
+                                                                  outcome_observation_accuracy)]
+    result_confidences = operator_result_confidences(operators)
+    examine_levels = set(round(level, LEVEL_DECIMALS)
+                         for level in [initial_confidence] + result_confidences + single_move_levels)
+    examine_levels = sorted(examine_levels.difference([0.0, 1.0]), reverse=True) + [0]
+    levels = set(examine_levels)
+    frontier = certain_rows + initial_rows
+    for moves in range(max_moves):
+        outcomes = [outcome for (row, column) in frontier
+                    for outcome in move_outcomes(row, column, move_fail_probabilities, outcome_observation_accuracy)]
+        levels.update(round(confidence, LEVEL_DECIMALS) for (_, _, confidence) in outcomes)
+        frontier = [(row, column) for (row, column, _) in outcomes]
+    return ProbabilityLattice(levels, examine_levels)
+
+
+def set_probability_lattice(world_state, operators):
+    """
+    Gives the world state, and the forks made from it afterwards, the lattice of the operators and its model.
+    :param WorldState world_state:
+    :param list[hpn.fbch.Operator] operators:
+    """
+    world_state.probability_lattice = build_probability_lattice(operators, world_state.operator_fail_probabilities,
+                                                                world_state.initial_confidence,
+                                                                world_state.outcome_observation_accuracy,
+                                                                len(world_state.environment.possible_locations))
@@ -0,0 +1,210 @@
+import argparse  # for the command line interface
+import json  # for the report
+import random  # for seeding DDist draws
+import timeit  # for default_timer
+import warnings  # for missing hook points
+
+import hpn.fbch  # for Function, Operator, State and HPN
+import hpn.globals  # for rebindPenalty
+import hpnutil.miscUtil  # for isVar
+
+import toy_fetch_place.fluents
+import toy_fetch_place.generators
+from toy_fetch_place.world_state import *
+from toy_fetch_place.operators import *
+from toy_fetch_place.probability_lattice import set_probability_lattice
+from toy_fetch_place.tests import make_kitchen_world, make_goal_states
+
+PROFILED_FLUENT_METHODS = ['test', 'heuristicVal', 'fglb']
+
+
+def fluent_label(fluent, method_name):
+    """Know fluents are labeled by their nested predicate, e.g., Know(Location).test."""
+    if fluent.predicate == 'Know' and not hpnutil.miscUtil.isVar(fluent.args[0]):
+        return 'Know({}).{}'.format(fluent.args[0].predicate, method_name)
+    return '{}.{}'.format(fluent.predicate, method_name)
+
+
+class SearchProfiler:
+    """
+    Counts calls, yields and time of fluent tests, heuristicVal, fglb, generators and operator regression
+    while installed. Time is kept per label in total and without nested profiled calls (self time),
+    and per stack of labels for flame graphs.
+    """
+    def __init__(self):
+        self.statistics = {}
+        self.stack_self_times = {}
+        self.stack = []
+        # for each open frame, the time spent in nested profiled calls
+        self.children_times = []
+        self.originals = []
+
+    ################ measuring ############
+
+    def enter(self, label):
+        self.stack.append(label)
+        self.children_times.append(0.0)
+        return timeit.default_timer()
+
+    def leave(self, label, start_time, calls=0, yields=0):
+        elapsed_time = timeit.default_timer() - start_time
+        children_time = self.children_times.pop()
+        stack_key = ';'.join(self.stack)
+        self.stack.pop()
+        if self.children_times:
+            self.children_times[-1] += elapsed_time
+        statistics = self.statistics.setdefault(label, {'calls': 0, 'yields': 0, 'total_time': 0.0,
+                                                        'self_time': 0.0})
+        statistics['calls'] += calls
+        statistics['yields'] += yields
+        # recursive calls of the same label would be counted twice in the total
+        if label not in self.stack:
+            statistics['total_time'] += elapsed_time
+        statistics['self_time'] += elapsed_time - children_time
+        self.stack_self_times[stack_key] = self.stack_self_times.get(stack_key, 0.0) + elapsed_time - children_time
+
+    def profile_call(self, label, function, *arguments):
+        start_time = self.enter(label)
+        try:
+            return function(*arguments)
+        finally:
+            self.leave(label, start_time, calls=1)
+
+    def profile_generator(self, label, function, *arguments):
+        """
+        Generators are consumed lazily by the search, so every next() is measured on its own,
+        under whatever the stack is at that moment.
+        """
+        start_time = self.enter(label)
+        try:
+            values = function(*arguments)
+        finally:
+            self.leave(label, start_time, calls=1)
+        if values is None:
+            return None
+        if isinstance(values, list):
+            self.statistics[label]['yields'] += len(values)
+            return values
+        return self.iterate(label, iter(values))
+
+    def iterate(self, label, iterator):
+        while True:
+            start_time = self.enter(label)
+            try:
+                value = next(iterator)
+            except StopIteration:
+                self.leave(label, start_time)
+                return
+            except:
+                self.leave(label, start_time)
+                raise
+            self.leave(label, start_time, yields=1)
+            yield value
+
+    ################ installing ############
+
+    def patch(self, owner, attribute_name, replacement):
+        self.originals.append((owner, attribute_name, owner.__dict__[attribute_name]))
+        setattr(owner, attribute_name, replacement)
+
+    def install(self):
+        for fluent_class in vars(toy_fetch_place.fluents).values():
+            if isinstance(fluent_class, type) and issubclass(fluent_class, hpn.fbch.Fluent) and \
+                    fluent_class.__module__ == toy_fetch_place.fluents.__name__:
+                for method_name in PROFILED_FLUENT_METHODS:
+                    if method_name in fluent_class.__dict__:
+                        self.patch(fluent_class, method_name,
+                                   self.profiled_fluent_method(method_name, fluent_class.__dict__[method_name]))
+        for generator_class in vars(toy_fetch_place.generators).values():
+            if isinstance(generator_class, type) and issubclass(generator_class, hpn.fbch.Function) and \
+                    'fun' in generator_class.__dict__:
+                self.patch(generator_class, 'fun', staticmethod(
+                    self.profiled_generator(generator_class.__name__, generator_class.fun)))
+        if 'regress' in hpn.fbch.Operator.__dict__:
+            self.patch(hpn.fbch.Operator, 'regress', self.profiled_regress(hpn.fbch.Operator.__dict__['regress']))
+        else:
+            warnings.warn('hpn.fbch.Operator has no regress method, the report has no regression rows')
+
+    def uninstall(self):
+        for (owner, attribute_name, original) in reversed(self.originals):
+            setattr(owner, attribute_name, original)
+        self.originals = []
+
+    def profiled_fluent_method(self, method_name, method):
+        profiler = self
+
+        def profiled_method(fluent, *arguments):
+            return profiler.profile_call(fluent_label(fluent, method_name), method, fluent, *arguments)
+        return profiled_method
+
+    def profiled_generator(self, name, fun):
+        profiler = self
+
+        def profiled_fun(generator_args, goal_fluents, world_state):
+            return profiler.profile_generator(name, fun, generator_args, goal_fluents, world_state)
+        return profiled_fun
+
+    def profiled_regress(self, regress):
+        profiler = self
+
+        def profiled_regress(operator, *arguments, **keyword_arguments):
+            return profiler.profile_call('{}.regress'.format(operator.name),
+                                         lambda: regress(operator, *arguments, **keyword_arguments))
+        return profiled_regress
+
+    ################ reporting ############
+
+    def report(self):
+        """
+        :return dict[str: dict]: label -> calls, yields, total_time and self_time in seconds
+        """
+        return dict((label, dict(statistics)) for (label, statistics) in self.statistics.items())
+
+    def write_report(self, file_name):
+        with open(file_name, 'w') as report_file:
+            json.dump(self.report(), report_file, indent=1, sort_keys=True)
+
+    def write_collapsed_stacks(self, file_name):
+        """Writes one 'label;label;label microseconds' line per stack, the input format of flamegraph.pl."""
+        with open(file_name, 'w') as stacks_file:
+            for (stack_key, self_time) in sorted(self.stack_self_times.items()):
+                stacks_file.write('{} {}\n'.format(stack_key, int(round(self_time * 1e6))))
+
+
+def profile_goal(goal_index, random_seed=0):
+    """
+    Runs HPN on one tests.py goal in the kitchen under the profiler.
+    :return SearchProfiler:
+    """
+    random.seed(random_seed)
+    world = make_kitchen_world()
+    starting_state = hpn.fbch.State([], WorldState.to_world_state(world))
+    operators = [go_operator, manipulate_environment_operator, pick_up_operator, place_operator,
+                 examine_environment_operator, examine_hand_operator]
+    set_probability_lattice(starting_state.details, operators)
+    hpn.globals.glob.rebindPenalty = 5
+    profiler = SearchProfiler()
+    profiler.install()
+    try:
+        hpn.fbch.HPN(starting_state, make_goal_states()[goal_index], operators, world, h=false_fluents_heuristic,
+                     fileTag=None, hpnFileTag=None)
+    finally:
+        profiler.uninstall()
+    return profiler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Profiles HPN planning for one of the tests.py goals.')
+    parser.add_argument('goal', type=int, help='index of the tests.py goal')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--report', default='profile_report.json', help='JSON file for the per label statistics')
+    parser.add_argument('--stacks', default='profile_stacks.txt', help='collapsed stacks file for flamegraph.pl')
+    arguments = parser.parse_args()
+    goal_profiler = profile_goal(arguments.goal, arguments.seed)
+    goal_profiler.write_report(arguments.report)
+    goal_profiler.write_collapsed_stacks(arguments.stacks)
+    for (label, label_statistics) in sorted(goal_profiler.report().items(),
+                                            key=lambda (label, label_statistics): -label_statistics['self_time']):
+        print '{:40} {:8} calls {:8} yields {:10.4f}s total {:10.4f}s self'.format(
+            label, label_statistics['calls'], label_statistics['yields'], label_statistics['total_time'],
+            label_statistics['self_time'])
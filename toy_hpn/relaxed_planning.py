@@ -0,0 +1,265 @@
+import heapq  # for the priority queue of facts
+
+import hpnutil.miscUtil  # for isVar
+
+# Facts of the relaxed domain are tuples:
+#   ('at', item, location)          the item is at the location or in the arm, believed with probability < 1
+#   ('known_at', item, location)    the same, but known with probability 1
+#   ('empty', arm), ('known_empty', arm)
+#   ('robot_at', location)          robot localization is perfect, so this is always known
+#   ('state', container, state)     there's no perception of container states, so this is always known
+# Operators' results have confidence 0.75, and their preconditions need 1,
+# so a "known" fact has to be achieved by examining after picking or placing.
+
+# probabilities above this need a known fact, the results of PickUp and Place are only 0.75
+ASSUMED_CONFIDENCE = 0.75
+
+
+class RelaxedAction:
+    def __init__(self, name, preconditions, effects, cost=1):
+        """
+        :param tuple name: operator name and arguments, for debugging
+        :param list[tuple] preconditions: facts
+        :param list[tuple] effects: facts, only added, the relaxed domain doesn't delete anything
+        :param float cost:
+        """
+        self.name = name
+        self.preconditions = preconditions
+        self.effects = effects
+        self.cost = cost
+
+
+def ground_relaxed_actions(item_names, locations, container_locations, arms):
+    """
+    Grounds the operators of operators.py without delete effects.
+    :param list[str] item_names: names of all items except for the robot
+    :param list[str] locations: environment locations
+    :param list[str] container_locations:
+    :param list[str] arms:
+    :return list[RelaxedAction]:
+    """
+    actions = []
+    for start_location in locations:
+        for destination_location in locations:
+            if start_location != destination_location:
+                preconditions = [('robot_at', start_location)]
+                if destination_location in container_locations:
+                    preconditions.append(('state', destination_location, 'open'))
+                actions.append(RelaxedAction(('Go', start_location, destination_location), preconditions,
+                                             [('robot_at', destination_location)]))
+    for container in container_locations:
+        for state in ['open', 'closed']:
+            for arm in arms:
+                actions.append(RelaxedAction(('ManipulateEnvironment', container, state, arm),
+                                             [('robot_at', 'floor'), ('known_empty', arm)],
+                                             [('state', container, state)]))
+    for arm in arms:
+        actions.append(RelaxedAction(('ExamineHand', None, arm), [('empty', arm)], [('known_empty', arm)]))
+        for item_name in item_names:
+            actions.append(RelaxedAction(('ExamineHand', item_name, arm), [('at', item_name, arm)],
+                                         [('known_at', item_name, arm)]))
+            for location in locations:
+                actions.append(RelaxedAction(('PickUp', arm, item_name, location),
+                                             [('known_empty', arm), ('known_at', item_name, location),
+                                              ('robot_at', location)],
+                                             [('at', item_name, arm)]))
+                actions.append(RelaxedAction(('Place', arm, item_name, location),
+                                             [('known_at', item_name, arm), ('robot_at', location)],
+                                             [('at', item_name, location), ('empty', arm)]))
+    for item_name in item_names:
+        for location in locations:
+            actions.append(RelaxedAction(('ExamineEnvironment', item_name, location),
+                                         [('at', item_name, location), ('robot_at', location)],
+                                         [('known_at', item_name, location)]))
+    return actions
+
+
+class RelaxedDomain:
+    """Ground relaxed actions of one world, indexed by their preconditions and effects."""
+    def __init__(self, world_state):
+        self.robot_name = world_state.get_robot_name()
+        self.actions = ground_relaxed_actions(
+            [item.name for item in world_state.items if item.name != self.robot_name],
+            list(world_state.environment.possible_locations), list(world_state.environment.container_locations),
+            list(world_state.robot.possible_arms))
+        self.actions_with_precondition = {}
+        self.actions_with_effect = {}
+        for action in self.actions:
+            for precondition in action.preconditions:
+                self.actions_with_precondition.setdefault(precondition, []).append(action)
+            for effect in action.effects:
+                self.actions_with_effect.setdefault(effect, []).append(action)
+
+    def reachable_facts(self, initial_facts, forbidden_fact=None):
+        """
+        :param set[tuple] initial_facts:
+        :param tuple forbidden_fact: if given, actions achieving it are not applied
+        :return set[tuple]: facts reachable from the initial ones, ignoring costs
+        """
+        reachable = set(initial_facts)
+        open_facts = list(reachable)
+        unsatisfied_preconditions = {}
+        while open_facts:
+            fact = open_facts.pop()
+            for action in self.actions_with_precondition.get(fact, []):
+                remaining = unsatisfied_preconditions.get(action, len(action.preconditions)) - 1
+                unsatisfied_preconditions[action] = remaining
+                if remaining == 0 and forbidden_fact not in action.effects:
+                    for effect in action.effects:
+                        if effect not in reachable:
+                            reachable.add(effect)
+                            open_facts.append(effect)
+        return reachable
+
+
+# grounding only depends on the items and locations of a world, so it's shared by all its states
+relaxed_domains = {}
+
+
+def get_relaxed_domain(world_state):
+    key = (tuple(item.name for item in world_state.items), tuple(world_state.environment.possible_locations),
+           tuple(world_state.environment.container_locations), tuple(world_state.robot.possible_arms))
+    if key not in relaxed_domains:
+        relaxed_domains[key] = RelaxedDomain(world_state)
+    return relaxed_domains[key]
+
+
+def initial_relaxed_facts(world_state, robot_name):
+    facts = set()
+    for item in world_state.items:
+        for location in world_state.get_item_locations(item.name):
+            if item.name == robot_name:
+                facts.add(('robot_at', location))
+                continue
+            facts.add(('at', item.name, location))
+            if world_state.get_probability_of_item_at_location(item.name, location) >= 1:
+                facts.add(('known_at', item.name, location))
+    for arm in world_state.robot.possible_arms:
+        if not world_state.robot.get_item_in_hand(arm):
+            facts.add(('empty', arm))
+            if world_state.get_probability_of_item_in_hand(None, arm) >= 1:
+                facts.add(('known_empty', arm))
+    for container in world_state.environment.container_locations:
+        facts.add(('state', container, world_state.environment.get_container_state(container)))
+    return facts
+
+
+class RelaxedPlanningGraph:
+    """
+    hAdd costs of all facts reachable from one world state, with the best supporting action of each fact,
+    computed with a Dijkstra-like sweep over the facts.
+    """
+    def __init__(self, world_state):
+        self.domain = get_relaxed_domain(world_state)
+        self.initial_facts = initial_relaxed_facts(world_state, self.domain.robot_name)
+        self.fact_costs = {}
+        self.best_supporters = {}
+        queue = []
+        for fact in self.initial_facts:
+            self.fact_costs[fact] = 0
+            heapq.heappush(queue, (0, fact))
+        unsatisfied_preconditions = {}
+        preconditions_costs = {}
+        done = set()
+        while queue:
+            (cost, fact) = heapq.heappop(queue)
+            if fact in done:
+                continue
+            done.add(fact)
+            for action in self.domain.actions_with_precondition.get(fact, []):
+                remaining = unsatisfied_preconditions.get(action, len(action.preconditions)) - 1
+                unsatisfied_preconditions[action] = remaining
+                preconditions_costs[action] = preconditions_costs.get(action, 0) + cost
+                if remaining == 0:
+                    action_cost = preconditions_costs[action] + action.cost
+                    for effect in action.effects:
+                        if effect not in self.fact_costs or action_cost < self.fact_costs[effect]:
+                            self.fact_costs[effect] = action_cost
+                            self.best_supporters[effect] = action
+                            heapq.heappush(queue, (action_cost, effect))
+
+    def add_cost(self, goal_facts):
+        """
+        :param list[tuple] goal_facts:
+        :return float: sum of the hAdd costs of the facts, inf if one is unreachable
+        """
+        total_cost = 0
+        for fact in goal_facts:
+            if fact not in self.fact_costs:
+                return float('inf')
+            total_cost += self.fact_costs[fact]
+        return total_cost
+
+    def relaxed_plan_cost(self, goal_facts):
+        """
+        :param list[tuple] goal_facts:
+        :return float: cost of the relaxed plan extracted with the best supporters (hFF), inf if unreachable
+        """
+        relaxed_plan = set()
+        open_facts = list(goal_facts)
+        visited_facts = set()
+        while open_facts:
+            fact = open_facts.pop()
+            if fact in visited_facts:
+                continue
+            visited_facts.add(fact)
+            if fact not in self.fact_costs:
+                return float('inf')
+            action = self.best_supporters.get(fact)
+            if action and action not in relaxed_plan:
+                relaxed_plan.add(action)
+                open_facts.extend(action.preconditions)
+        return sum(action.cost for action in relaxed_plan)
+
+
+def get_relaxed_planning_graph(world_state):
+    """The graph is cached in the world state until it changes."""
+    return world_state.get_or_evaluate(('RelaxedPlanningGraph',), lambda: RelaxedPlanningGraph(world_state))
+
+
+def goal_relaxed_facts(goal_fluents, world_state):
+    """
+    Translates the goal fluents into relaxed facts.
+    Fluents with unbound variables and Know = false fluents are ignored, they don't add any cost.
+    :param goal_fluents: iterable of hpn.fbch.Fluent
+    :param WorldState world_state:
+    :return list[tuple] | None: None if the goal contains a false IsRobot fluent, which nothing can achieve
+    """
+    robot_name = world_state.get_robot_name()
+    facts = []
+    for fluent in goal_fluents:
+        if fluent.predicate == 'IsRobot':
+            [name] = fluent.args
+            if hpnutil.miscUtil.isVar(name):
+                continue
+            if (name == robot_name) != fluent.value:
+                return None
+            continue
+        if fluent.predicate != 'Know' or not fluent.value:
+            continue
+        (nested_fluent, value, probability) = fluent.args
+        if hpnutil.miscUtil.isVar(nested_fluent) or hpnutil.miscUtil.isVar(value) or \
+                hpnutil.miscUtil.isVar(probability) or \
+                [arg for arg in nested_fluent.args if hpnutil.miscUtil.isVar(arg)] or probability <= 0:
+            continue
+        known = probability > ASSUMED_CONFIDENCE
+        if nested_fluent.predicate == 'Location':
+            [item_name] = nested_fluent.args
+            if item_name == robot_name:
+                facts.append(('robot_at', value))
+            else:
+                facts.append(('known_at' if known else 'at', item_name, value))
+        elif nested_fluent.predicate == 'InHand':
+            [arm] = nested_fluent.args
+            if value is None:
+                facts.append(('known_empty' if known else 'empty', arm))
+            else:
+                facts.append(('known_at' if known else 'at', value, arm))
+        elif nested_fluent.predicate == 'ContainerState':
+            [container] = nested_fluent.args
+            if container in world_state.environment.container_locations:
+                facts.append(('state', container, value))
+            elif value != 'open':
+                # locations that aren't containers are always open
+                return None
+    return facts
@@ -0,0 +1,162 @@
+import argparse  # for the command line interface
+import gc  # for collecting garbage between measurements
+import json  # for the results file
+import multiprocessing  # for running every size in a fresh process
+import os  # for devnull
+import resource  # for peak memory use
+import sys  # for silencing HPN
+import time  # for wall time
+
+import hpn.fbch  # for State and HPN
+import hpn.globals  # for rebindPenalty
+
+from toy_fetch_place.world import *
+from toy_fetch_place.world_state import *
+from toy_fetch_place.fluents import *
+from toy_fetch_place.operators import *
+from toy_fetch_place.scenarios import make_scenario
+from toy_fetch_place.probability_lattice import set_probability_lattice
+from toy_fetch_place.relaxed_planning import get_relaxed_planning_graph
+
+OPERATORS = [go_operator, manipulate_environment_operator, pick_up_operator, place_operator,
+             examine_environment_operator, examine_hand_operator]
+
+
+def timed(function):
+    start_time = time.time()
+    result = function()
+    return (time.time() - start_time, result)
+
+
+def scenario_goal(world_state):
+    """
+    Moving the first item in the environment onto the first surface, or onto the floor if there are none.
+    :return hpn.fbch.State | None: None if the scenario is invalid, i.e., there's no item in the environment
+    """
+    surfaces = [location for location in world_state.environment.possible_locations
+                if location not in world_state.environment.container_locations]
+    item_names = [item.name for item in world_state.environment.get_all_items()
+                  if item.name != world_state.get_robot_name()]
+    if not item_names or not surfaces:
+        return None
+    return hpn.fbch.State([Know([Location([item_names[0]]), surfaces[0], 1], True)])
+
+
+def plan_scenario(world, world_state, goal):
+    """
+    :return (float, str): wall time of HPN planning and executing in the simulated world, and an error if any
+    """
+    hpn.globals.glob.rebindPenalty = 5
+    standard_output = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    error = ''
+    start_time = time.time()
+    try:
+        hpn.fbch.HPN(hpn.fbch.State([], world_state), goal, OPERATORS, world, h=false_fluents_heuristic,
+                     fileTag=None, hpnFileTag=None)
+    except Exception as exception:
+        error = '{}: {}'.format(type(exception).__name__, exception)
+    finally:
+        sys.stdout.close()
+        sys.stdout = standard_output
+    return (time.time() - start_time, error)
+
+
+def benchmark_scenario(number_of_locations, number_of_containers, number_of_items, random_seed=0, plan=True):
+    """
+    :return dict: one row of the results
+    """
+    def construct():
+        world = make_scenario(number_of_locations, number_of_containers, number_of_items, random_seed=random_seed)
+        world_state = WorldState.to_world_state(world)
+        set_probability_lattice(world_state, OPERATORS)
+        return (world, world_state)
+    gc.collect()
+    (construction_time, (world, world_state)) = timed(construct)
+    fluents = [Know([Location([item.name]), world_state.get_item_locations(item.name)[0], 0.5], True)
+               for item in world_state.items]
+    (cold_fluent_time, _) = timed(lambda: [fluent.test(world_state) for fluent in fluents])
+    (warm_fluent_time, _) = timed(lambda: [fluent.test(world_state) for fluent in fluents])
+    (fork_time, _) = timed(lambda: world_state.fork())
+    goal = scenario_goal(world_state)
+    if goal is None:
+        return {'locations': number_of_locations,
+                'containers': number_of_containers,
+                'items': number_of_items,
+                'seed': random_seed,
+                'planning_error': 'invalid scenario: no item in the environment to move'}
+    (relaxed_planning_graph_time, _) = timed(lambda: get_relaxed_planning_graph(world_state))
+    (heuristic_time, heuristic_value) = timed(lambda: relaxed_plan_heuristic(
+        hpn.fbch.State([], world_state), goal, OPERATORS, [], True))
+    result = {'locations': number_of_locations,
+              'containers': number_of_containers,
+              'items': number_of_items,
+              'seed': random_seed,
+              'construction_time': construction_time,
+              'cold_fluent_evaluation_time': cold_fluent_time,
+              'warm_fluent_evaluation_time': warm_fluent_time,
+              'fluents_evaluated': len(fluents),
+              'fork_time': fork_time,
+              'relaxed_planning_graph_time': relaxed_planning_graph_time,
+              'heuristic_time': heuristic_time,
+              'heuristic_value': heuristic_value,
+              'belief_bytes': world_state.locations_belief.nbytes,
+              'planning_time': None,
+              'planning_error': None}
+    if plan:
+        (result['planning_time'], result['planning_error']) = plan_scenario(world, world_state, goal)
+    # this process only ran this scenario, so the peak is the scenario's, on Linux in kilobytes
+    result['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+def run_scaling_benchmark(item_counts, location_counts, containers_fraction=0.5, random_seed=0, plan=True,
+                          results_file_name=None, timeout=600):
+    """
+    :param list[int] item_counts:
+    :param list[int] location_counts: each at least 2, the floor and one more location
+    :param float containers_fraction: fraction of the locations other than the floor that are containers
+    :param int random_seed:
+    :param bool plan: also time HPN, which is the slowest part by far
+    :param str results_file_name: if given, the results are written there as JSON
+    :param float timeout: seconds per scenario, the scenario is recorded as timed out after that
+    :return list[dict]:
+    """
+    results = []
+    for number_of_locations in location_counts:
+        number_of_containers = int((number_of_locations - 1) * containers_fraction)
+        for number_of_items in item_counts:
+            # a fresh process per scenario, so that peak memory is per scenario and a timed out one can be killed
+            pool = multiprocessing.Pool(1)
+            try:
+                result = pool.apply_async(benchmark_scenario, [number_of_locations, number_of_containers,
+                                                               number_of_items, random_seed, plan]).get(timeout)
+                pool.close()
+            except multiprocessing.TimeoutError:
+                result = {'locations': number_of_locations,
+                          'containers': number_of_containers,
+                          'items': number_of_items,
+                          'seed': random_seed,
+                          'planning_error': 'timed out after {} seconds'.format(timeout)}
+                pool.terminate()
+            pool.join()
+            print json.dumps(result)
+            results.append(result)
+    if results_file_name:
+        with open(results_file_name, 'w') as results_file:
+            json.dump({'results': results}, results_file, indent=1, sort_keys=True)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Times toy HPN on growing generated worlds.')
+    parser.add_argument('results_file_name', help='JSON file to write the results to')
+    parser.add_argument('--items', type=int, nargs='*', default=[10, 100, 1000])
+    parser.add_argument('--locations', type=int, nargs='*', default=[8, 32])
+    parser.add_argument('--containers-fraction', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-planning', action='store_true', help='skip timing HPN')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds per scenario')
+    arguments = parser.parse_args()
+    run_scaling_benchmark(arguments.items, arguments.locations, arguments.containers_fraction, arguments.seed,
+                          not arguments.no_planning, arguments.results_file_name, arguments.timeout)
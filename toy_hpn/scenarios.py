@@ -0,0 +1,51 @@
+import random  # for placing items and choosing container states
+
+from toy_fetch_place.world import *
+
+
+def make_scenario_locations(number_of_locations, number_of_containers):
+    """
+    :param int number_of_locations: including the floor, which the robot needs for manipulating containers
+    :param int number_of_containers: how many of the locations other than the floor are containers
+    :return (list[str], list[str]): locations and container locations
+    """
+    if number_of_containers > number_of_locations - 1:
+        raise Exception('{} locations can have {} containers at most.'.format(number_of_locations,
+                                                                              number_of_locations - 1))
+    containers = ['container_{}'.format(index) for index in range(number_of_containers)]
+    surfaces = ['surface_{}'.format(index) for index in range(number_of_locations - number_of_containers - 1)]
+    return (containers + surfaces + ['floor'], containers)
+
+
+def make_scenario(number_of_locations=8, number_of_containers=5, number_of_items=6, operator_fail_probabilities=None,
+                  number_of_items_in_hands=0, open_container_probability=0.0, random_seed=None):
+    """
+    Builds a world of any size, unlike the tests.py kitchen with its class-level locations.
+    Items get the item types in turn and random locations, the robot stands on the floor.
+    :param int number_of_locations:
+    :param int number_of_containers:
+    :param int number_of_items: not counting the robot
+    :param dict[str: float] operator_fail_probabilities: the tests.py ones if None
+    :param int number_of_items_in_hands: up to one item per arm
+    :param float open_container_probability:
+    :param random_seed:
+    :return World:
+    """
+    random_generator = random.Random(random_seed)
+    (locations, containers) = make_scenario_locations(number_of_locations, number_of_containers)
+    item_types = [item_type for item_type in Item.possible_types if item_type != 'robot']
+    items = [Item('{}_{}'.format(item_types[index % len(item_types)], index), item_types[index % len(item_types)])
+             for index in range(number_of_items)]
+    items_in_hands = {arm: item for (arm, item) in zip(Robot.possible_arms, items[:number_of_items_in_hands])}
+    items_at_locations = {location: [] for location in locations}
+    for item in items[len(items_in_hands):]:
+        items_at_locations[random_generator.choice(locations)].append(item)
+    robot = Robot('pr2', items_in_hands)
+    items_at_locations['floor'].append(robot)
+    container_states = {container: 'open' if random_generator.random() < open_container_probability else 'closed'
+                        for container in containers}
+    environment = Environment('scenario', items_at_locations, container_states, locations, containers)
+    if operator_fail_probabilities is None:
+        operator_fail_probabilities = {'Go': 0.1, 'PickUp': 0.5, 'Place': 0.4, 'Regrasp': 0.8,
+                                       'ManipulateEnvironment': 0.3}
+    return World(environment, robot, operator_fail_probabilities)
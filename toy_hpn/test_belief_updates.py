@@ -0,0 +1,85 @@
+import unittest
+
+from toy_fetch_place.world_state import *
+from toy_fetch_place.fluents import *
+from toy_fetch_place.primitives_and_progress import *
+from toy_fetch_place.tests import make_kitchen_world
+
+
+def make_kitchen_world_state_at_spoon():
+    """
+    :return WorldState: the kitchen with the robot at the open sink_drawer_upper, where the spoon is
+    """
+    world_state = WorldState.to_world_state(make_kitchen_world())
+    world_state.manipulate_environment('sink_drawer_upper', 'open')
+    world_state.move_item_or_robot('pr2', 'floor', 'sink_drawer_upper')
+    return world_state
+
+
+class BeliefUpdateTest(unittest.TestCase):
+    def assert_rows_sum_up_to_1(self, world_state):
+        for row_sum in world_state.locations_belief.sum(axis=1):
+            self.assertAlmostEqual(row_sum, 1.0)
+
+    def test_initial_belief(self):
+        world_state = WorldState.to_world_state(make_kitchen_world())
+        self.assertEqual(world_state.get_probability_of_item_at_location('spoon_1', 'sink_drawer_upper'),
+                         world_state.initial_confidence)
+        self.assertEqual(world_state.get_probability_of_item_at_location('pr2', 'floor'), 1.0)
+        self.assertEqual(world_state.get_probability_of_item_in_hand('milk_1', 'left_arm'),
+                         world_state.initial_confidence)
+        self.assert_rows_sum_up_to_1(world_state)
+
+    def test_pick_up_and_place_known_item(self):
+        world_state = make_kitchen_world_state_at_spoon()
+        world_state.set_probability_of_item_at_location('spoon_1', None, 'sink_drawer_upper', 1.0)
+        pickUpProgress(world_state, ['pr2', 'right_arm', 'spoon_1', 'sink_drawer_upper'], 'right_arm')
+        self.assertEqual(world_state.get_item_locations('spoon_1'), ['right_arm'])
+        # prediction: 0.5 in the arm and 0.5 left behind, observation of the arm with accuracy 0.75
+        self.assertAlmostEqual(world_state.get_probability_of_item_in_hand('spoon_1', 'right_arm'), 0.75)
+        self.assertAlmostEqual(world_state.get_probability_of_item_at_location('spoon_1', 'sink_drawer_upper'), 0.25)
+        placeProgress(world_state, ['pr2', 'right_arm', 'spoon_1', 'sink_drawer_upper'], 'sink_drawer_upper')
+        self.assertEqual(world_state.get_item_locations('spoon_1'), ['sink_drawer_upper'])
+        # prediction: 0.25 + 0.75 * 0.6 at the location and 0.75 * 0.4 in the arm
+        self.assertAlmostEqual(world_state.get_probability_of_item_at_location('spoon_1', 'sink_drawer_upper'),
+                               0.7 * 0.75 / (0.7 * 0.75 + 0.3 * 0.25))
+        self.assert_rows_sum_up_to_1(world_state)
+
+    def test_failed_pick_up(self):
+        world_state = make_kitchen_world_state_at_spoon()
+        world_state.set_probability_of_item_at_location('spoon_1', None, 'sink_drawer_upper', 1.0)
+        pickUpProgress(world_state, ['pr2', 'right_arm', 'spoon_1', 'sink_drawer_upper'], 'sink_drawer_upper')
+        self.assertEqual(world_state.get_item_locations('spoon_1'), ['sink_drawer_upper'])
+        self.assertAlmostEqual(world_state.get_probability_of_item_at_location('spoon_1', 'sink_drawer_upper'), 0.75)
+        self.assertIsNone(world_state.robot.get_item_in_hand('right_arm'))
+        self.assert_rows_sum_up_to_1(world_state)
+
+    def test_examine_finds_item_elsewhere(self):
+        world_state = WorldState.to_world_state(make_kitchen_world())
+        examineProgress(world_state, ['cup_1', 'fridge', 0.5], ['cup_1'])
+        self.assertEqual(world_state.get_item_locations('cup_1'), ['fridge'])
+        self.assertEqual(world_state.get_probability_of_item_at_location('cup_1', 'fridge'), 1.0)
+        self.assertEqual(world_state.get_probability_of_item_at_location('cup_1', 'sink_drawer_middle'), 0.0)
+        self.assert_rows_sum_up_to_1(world_state)
+
+    def test_examine_empty_hand(self):
+        # the belief of the held milk is spread evenly over the environment, so its most probable locations tie
+        world_state = WorldState.to_world_state(make_kitchen_world())
+        examineProgress(world_state, ['milk_1', 'left_arm', 0.5], [])
+        self.assertIsNone(InHand(['left_arm']).test(world_state))
+        self.assertTrue(Know([InHand(['left_arm']), None, 1], True).test(world_state))
+        self.assertEqual(world_state.get_probability_of_item_in_hand('milk_1', 'left_arm'), 0.0)
+        self.assertIn(world_state.get_item_locations('milk_1')[0], world_state.environment.possible_locations)
+        self.assert_rows_sum_up_to_1(world_state)
+
+    def test_fork_doesnt_change_parent_belief(self):
+        world_state = WorldState.to_world_state(make_kitchen_world())
+        forked_world_state = world_state.fork()
+        examineProgress(forked_world_state, ['cup_1', 'fridge', 0.5], ['cup_1'])
+        self.assertEqual(world_state.get_item_locations('cup_1'), ['sink_drawer_middle'])
+        self.assertEqual(world_state.get_probability_of_item_at_location('cup_1', 'sink_drawer_middle'),
+                         world_state.initial_confidence)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import itertools  # for product and combinations
+import unittest
+
+from toy_fetch_place.fluents import *
+from toy_fetch_place.goal_index import GoalFluentIndex, know_fluents_glb
+
+
+def make_know_fluents():
+    """
+    :return list[Know]: Know fluents of locations and hand contents that contradict or subsume each other in all
+        the ways GoalFluentIndex knows
+    """
+    nested_fluents_and_values = [(lambda: Location(['cup_1']), ['sink_drawer_middle', 'fridge', 'left_arm']),
+                                 (lambda: Location(['bowl_1']), ['left_arm']),
+                                 (lambda: InHand(['left_arm']), ['cup_1', 'bowl_1', None]),
+                                 (lambda: InHand(['right_arm']), ['cup_1']),
+                                 (lambda: ContainerState(['fridge']), ['open', 'closed'])]
+    fluents = []
+    for (make_nested_fluent, values) in nested_fluents_and_values:
+        for (value, probability, know) in itertools.product(values, [0.5, 1], [True, False]):
+            fluents.append(Know([make_nested_fluent(), value, probability], know))
+    return fluents
+
+
+class GoalFluentIndexTest(unittest.TestCase):
+    def test_contradictions(self):
+        self.assertTrue(GoalFluentIndex([Know([Location(['cup_1']), 'fridge', 1], True),
+                                         Know([Location(['cup_1']), 'sink_drawer_middle', 1], True)]).contradiction)
+        self.assertTrue(GoalFluentIndex([Know([Location(['cup_1']), 'left_arm', 1], True),
+                                         Know([InHand(['left_arm']), None, 1], True)]).contradiction)
+        self.assertTrue(GoalFluentIndex([Know([Location(['cup_1']), 'fridge', 1], True),
+                                         Know([Location(['cup_1']), 'fridge', 0.5], False)]).contradiction)
+        self.assertFalse(GoalFluentIndex([Know([Location(['cup_1']), 'fridge', 0.5], True),
+                                          Know([Location(['cup_1']), 'fridge', 1], False)]).contradiction)
+
+    def test_subsumption(self):
+        location_fluent = Know([Location(['cup_1']), 'left_arm', 1], True)
+        fluents = GoalFluentIndex([Know([InHand(['left_arm']), 'cup_1', 0.75], True), location_fluent,
+                                   Know([Location(['cup_1']), 'left_arm', 0.5], True)]).get_fluents()
+        self.assertEqual(fluents, {location_fluent})
+
+    def test_pairwise_glb_agrees_with_index(self):
+        for (fluent, other_fluent) in itertools.combinations(make_know_fluents(), 2):
+            fluents = GoalFluentIndex([fluent, other_fluent]).get_fluents()
+            glb = know_fluents_glb(fluent, other_fluent)
+            message = '{} and {}'.format(fluent, other_fluent)
+            if fluents is False:
+                self.assertIs(glb, False, message)
+            elif len(fluents) == 1:
+                self.assertIs(glb, list(fluents)[0], message)
+            else:
+                self.assertIsNone(glb, message)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+import collections  # for deque
+import unittest
+
+import hpn.fbch  # for State
+
+from toy_fetch_place.world import *
+from toy_fetch_place.world_state import *
+from toy_fetch_place.fluents import *
+from toy_fetch_place.heuristics_and_cost import *
+from toy_fetch_place.relaxed_planning import ASSUMED_CONFIDENCE
+from toy_fetch_place.pattern_database import get_pattern_database
+
+# Exact costs come from a breadth first search in the determinized domain that the operators plan in:
+# every primitive succeeds, the results of PickUp and Place are only assumed until examined, and every step costs 1.
+# Abstract states are (robot location, ((item name, location, known), ...), (arm known to be empty, ...),
+# (container state, ...)).
+
+GOALS = [[Know([Location(['cup_1']), 'sink_area_counter_top', 1], True)],
+         [Know([Location(['cup_1']), 'fridge', 1], True)],
+         [Know([Location(['cup_1']), 'fridge', 0.75], True)],
+         [Know([InHand(['right_arm']), 'cup_1', 1], True)],
+         [Know([InHand(['left_arm']), 'cup_1', 1], True)],
+         [Know([InHand(['left_arm']), None, 1], True)],
+         [Know([Location(['pr2']), 'fridge', 1], True)],
+         [Know([Location(['milk_1']), 'fridge', 1], True), Know([ContainerState(['fridge']), 'closed', 1], True)],
+         [Know([Location(['milk_1']), 'kitchen_island_counter_top', 1], True),
+          Know([Location(['cup_1']), 'left_arm', 1], True)]]
+
+
+def make_small_kitchen_world():
+    cup = Item('cup_1', 'cup')
+    milk = Item('milk_1', 'milk')
+    robot = Robot('pr2', {'left_arm': milk})
+    environment = Environment('kitchen', {'sink_drawer_middle': [cup], 'floor': [robot]})
+    fail_probabilities = {'Go': 0.1, 'PickUp': 0.5, 'Place': 0.4, 'Regrasp': 0.8, 'ManipulateEnvironment': 0.3}
+    return World(environment, robot, fail_probabilities)
+
+
+def make_start_world_states():
+    """
+    :return list[WorldState]: the small kitchen as it starts, with the cup examined at its open drawer,
+        and with the milk put down unseen
+    """
+    world_state = WorldState.to_world_state(make_small_kitchen_world())
+    at_cup_world_state = world_state.fork()
+    at_cup_world_state.manipulate_environment('sink_drawer_middle', 'open')
+    at_cup_world_state.move_item_or_robot('pr2', 'floor', 'sink_drawer_middle')
+    at_cup_world_state.set_probability_of_item_at_location('cup_1', None, 'sink_drawer_middle', 1.0)
+    milk_put_down_world_state = world_state.fork()
+    milk_put_down_world_state.teleport_item('milk_1', 'kitchen_island_counter_top')
+    return [world_state, at_cup_world_state, milk_put_down_world_state]
+
+
+def abstract_state(world_state):
+    robot_name = world_state.get_robot_name()
+    item_states = []
+    for item in world_state.items:
+        if item.name != robot_name:
+            location = world_state.get_item_locations(item.name)[0]
+            known = world_state.get_probability_of_item_at_location(item.name, location) >= 1
+            item_states.append((item.name, location, known))
+    known_empty_arms = tuple(world_state.get_probability_of_item_in_hand(None, arm) >= 1
+                             for arm in world_state.robot.possible_arms)
+    container_states = tuple(world_state.environment.get_container_state(container)
+                             for container in world_state.environment.container_locations)
+    return (world_state.get_item_locations(robot_name)[0], tuple(sorted(item_states)), known_empty_arms,
+            container_states)
+
+
+def successors(state, locations, containers, arms):
+    """
+    :return generator of tuple: the abstract states after Go, ManipulateEnvironment, ExamineHand, ExamineEnvironment,
+        PickUp and Place
+    """
+    (robot_location, item_states, known_empty_arms, container_states) = state
+    occupied_arms = set(location for (_, location, _) in item_states if location in arms)
+    free_arm_indices = [index for (index, arm) in enumerate(arms)
+                        if arm not in occupied_arms and known_empty_arms[index]]
+    for location in locations:
+        if location != robot_location and \
+                (location not in containers or container_states[containers.index(location)] == 'open'):
+            yield (location, item_states, known_empty_arms, container_states)
+    if robot_location == 'floor' and free_arm_indices:
+        for (index, container) in enumerate(containers):
+            other_state = 'closed' if container_states[index] == 'open' else 'open'
+            yield (robot_location, item_states, known_empty_arms,
+                   container_states[:index] + (other_state,) + container_states[index + 1:])
+    for (index, arm) in enumerate(arms):
+        if arm not in occupied_arms and not known_empty_arms[index]:
+            yield (robot_location, item_states, known_empty_arms[:index] + (True,) + known_empty_arms[index + 1:],
+                   container_states)
+    for (index, (item_name, location, known)) in enumerate(item_states):
+        def moved(new_location, new_known):
+            return item_states[:index] + ((item_name, new_location, new_known),) + item_states[index + 1:]
+        if not known and (location in arms or location == robot_location):
+            yield (robot_location, moved(location, True), known_empty_arms, container_states)
+        elif known and location == robot_location:
+            for arm_index in free_arm_indices:
+                yield (robot_location, moved(arms[arm_index], False), known_empty_arms, container_states)
+        elif known and location in arms:
+            arm_index = arms.index(location)
+            yield (robot_location, moved(robot_location, False),
+                   known_empty_arms[:arm_index] + (False,) + known_empty_arms[arm_index + 1:], container_states)
+
+
+def fluent_holds(fluent, state, containers, arms):
+    (robot_location, item_states, known_empty_arms, container_states) = state
+    (nested_fluent, value, probability) = fluent.args
+    known_needed = probability > ASSUMED_CONFIDENCE
+    item_locations = {item_name: (location, known) for (item_name, location, known) in item_states}
+    if nested_fluent.predicate == 'ContainerState':
+        return container_states[containers.index(nested_fluent.args[0])] == value
+    if nested_fluent.predicate == 'InHand' and value is None:
+        [arm] = nested_fluent.args
+        return arm not in [location for (location, _) in item_locations.values()] and \
+            (known_empty_arms[arms.index(arm)] or not known_needed)
+    if nested_fluent.predicate == 'InHand':
+        (item_name, location) = (value, nested_fluent.args[0])
+    else:
+        (item_name, location) = (nested_fluent.args[0], value)
+    if item_name not in item_locations:
+        return robot_location == location
+    return item_locations[item_name][0] == location and (item_locations[item_name][1] or not known_needed)
+
+
+def exact_costs(world_state, goals):
+    """
+    :return list[int]: the cost of the cheapest plan for each goal, with a breadth first search
+        until all the goals are reached
+    """
+    locations = list(world_state.environment.possible_locations)
+    containers = list(world_state.environment.container_locations)
+    arms = list(world_state.robot.possible_arms)
+    start = abstract_state(world_state)
+    costs = [None] * len(goals)
+    distances = {start: 0}
+    queue = collections.deque([start])
+    while queue and None in costs:
+        state = queue.popleft()
+        for (index, goal) in enumerate(goals):
+            if costs[index] is None and all(fluent_holds(fluent, state, containers, arms) for fluent in goal):
+                costs[index] = distances[state]
+        for successor in successors(state, locations, containers, arms):
+            if successor not in distances:
+                distances[successor] = distances[state] + 1
+                queue.append(successor)
+    return costs
+
+
+class HeuristicAdmissibilityTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.world_states = make_start_world_states()
+        cls.exact_costs = [exact_costs(world_state, GOALS) for world_state in cls.world_states]
+
+    def heuristic_values(self, heuristic):
+        return [[heuristic(hpn.fbch.State([], world_state), hpn.fbch.State(goal), [], [], True) for goal in GOALS]
+                for world_state in self.world_states]
+
+    def assert_at_most_exact(self, heuristic_values, goal_indices):
+        for (world_state_index, world_state_values) in enumerate(heuristic_values):
+            for goal_index in goal_indices:
+                self.assertLessEqual(world_state_values[goal_index], self.exact_costs[world_state_index][goal_index],
+                                     'start {}, goal {}'.format(world_state_index, GOALS[goal_index]))
+
+    def test_exact_costs(self):
+        # opening the drawer, going there, examining the cup, picking it up and examining the hand
+        self.assertEqual(self.exact_costs[0][3], 5)
+        self.assertEqual(self.exact_costs[1][3], 2)
+
+    def test_pattern_database_is_admissible(self):
+        for world_state in self.world_states:
+            # the database knows all the locations, so the heuristic doesn't fall back to counting false fluents
+            pattern_database = get_pattern_database(world_state)
+            for goal in GOALS:
+                self.assertIsNotNone(pattern_database.heuristic_value(world_state, goal))
+        self.assert_at_most_exact(self.heuristic_values(pattern_database_heuristic), range(len(GOALS)))
+
+    def test_relaxed_plan_is_admissible_for_single_facts(self):
+        # hFF is not admissible in general, the relaxed plan of the milk and cup conjunction is longer than the
+        # real one, but in the small kitchen, none of the single facts needs an action the real plans do without
+        single_fact_goal_indices = [index for (index, goal) in enumerate(GOALS) if len(goal) == 1]
+        self.assert_at_most_exact(self.heuristic_values(relaxed_plan_heuristic), single_fact_goal_indices)
+
+    def test_additive_is_at_least_relaxed_plan(self):
+        # hAdd counts the actions that goal facts share once per fact, so it's not admissible either
+        for (add_values, relaxed_plan_values) in zip(self.heuristic_values(relaxed_add_heuristic),
+                                                     self.heuristic_values(relaxed_plan_heuristic)):
+            for (add_value, relaxed_plan_value) in zip(add_values, relaxed_plan_values):
+                self.assertGreaterEqual(add_value, relaxed_plan_value)
+
+
+if __name__ == '__main__':
+    unittest.main()
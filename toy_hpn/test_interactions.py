@@ -0,0 +1,67 @@
+import unittest
+
+from toy_fetch_place.fluents import *
+from toy_fetch_place.operators import *
+from toy_fetch_place.heuristics_and_cost import false_fluents_heuristic
+from toy_fetch_place.interactions import ClobberTable
+from toy_fetch_place.plan_execution import Planner
+
+OPERATORS = [go_operator, manipulate_environment_operator, pick_up_operator, place_operator,
+             examine_environment_operator, examine_hand_operator]
+
+# going away first undoes the robot being on the floor, which opening the fridge needs from the start
+GO_THEN_OPEN_STEPS = [('Go', ['pr2', 'floor', 'sink_area_counter_top']),
+                      ('ManipulateEnvironment', ['pr2', 'fridge', 'open', 'right_arm', 'closed'])]
+GO_THEN_OPEN_GOAL = [Know([Location(['pr2']), 'sink_area_counter_top', 1], True),
+                     Know([ContainerState(['fridge']), 'open', 1], True)]
+# placing the spoon again undoes the goal of holding it, and it can only be placed after picking it up
+PICK_UP_THEN_PLACE_STEPS = [('PickUp', ['pr2', 'right_arm', 'spoon_1', 'sink_drawer_upper']),
+                            ('Place', ['pr2', 'right_arm', 'spoon_1', 'sink_drawer_upper'])]
+PICK_UP_THEN_PLACE_GOAL = [Know([InHand(['right_arm']), 'spoon_1', 1], True)]
+
+
+class ClobberTableTest(unittest.TestCase):
+    def setUp(self):
+        self.clobber_table = ClobberTable(OPERATORS)
+
+    def test_table_pairs(self):
+        self.assertIn(('Go', 'ManipulateEnvironment'), self.clobber_table.table)
+        self.assertIn(('Place', 'PickUp'), self.clobber_table.table)
+        # container states are only needed by Go and ManipulateEnvironment
+        self.assertNotIn(('ManipulateEnvironment', 'PickUp'), self.clobber_table.table)
+
+    def test_finds_precondition_threat(self):
+        self.assertEqual(self.clobber_table.find_threats(GO_THEN_OPEN_STEPS, GO_THEN_OPEN_GOAL),
+                         [(0, 1, ('Location', ['RobotName'], 'floor'))])
+        self.assertEqual(self.clobber_table.find_threats(list(reversed(GO_THEN_OPEN_STEPS)), GO_THEN_OPEN_GOAL), [])
+
+    def test_finds_goal_threat(self):
+        self.assertEqual(self.clobber_table.find_threats(PICK_UP_THEN_PLACE_STEPS, PICK_UP_THEN_PLACE_GOAL),
+                         [(1, 2, ('InHand', ['right_arm'], 'spoon_1'))])
+        self.assertEqual(self.clobber_table.step_clobbers_goal(PICK_UP_THEN_PLACE_STEPS[1], PICK_UP_THEN_PLACE_GOAL),
+                         PICK_UP_THEN_PLACE_GOAL)
+        self.assertEqual(self.clobber_table.step_clobbers_goal(PICK_UP_THEN_PLACE_STEPS[0], PICK_UP_THEN_PLACE_GOAL),
+                         [])
+
+    def test_reorders_plan(self):
+        self.assertEqual(self.clobber_table.reorder_plan(GO_THEN_OPEN_STEPS, GO_THEN_OPEN_GOAL),
+                         list(reversed(GO_THEN_OPEN_STEPS)))
+
+    def test_rejects_plan_without_working_order(self):
+        # placing first would take the picked up spoon as the free hand PickUp needs, but Place loses its producer
+        self.assertIsNone(self.clobber_table.reorder_plan(PICK_UP_THEN_PLACE_STEPS, PICK_UP_THEN_PLACE_GOAL))
+
+
+class PlannerThreatsTest(unittest.TestCase):
+    def test_counts_reordered_and_rejected_plans(self):
+        planner = Planner(OPERATORS, false_fluents_heuristic)
+        self.assertEqual(planner.without_threats(list(reversed(GO_THEN_OPEN_STEPS)), GO_THEN_OPEN_GOAL),
+                         list(reversed(GO_THEN_OPEN_STEPS)))
+        self.assertEqual(planner.without_threats(GO_THEN_OPEN_STEPS, GO_THEN_OPEN_GOAL),
+                         list(reversed(GO_THEN_OPEN_STEPS)))
+        self.assertIsNone(planner.without_threats(PICK_UP_THEN_PLACE_STEPS, PICK_UP_THEN_PLACE_GOAL))
+        self.assertEqual((planner.reordered_plans, planner.rejected_plans), (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os  # for the cache file
+import shutil  # for removing the cache directory
+import tempfile  # for the cache directory
+import unittest
+
+from toy_fetch_place.world_state import *
+from toy_fetch_place.fluents import *
+from toy_fetch_place.operators import *
+from toy_fetch_place.plan_execution import PlanExecutor
+from toy_fetch_place.plan_cache import PlanCache, load_plans
+from toy_fetch_place.tests import make_kitchen_world
+
+
+def go_goal_and_plan(location):
+    return ([Know([Location(['pr2']), location, 1], True)], [('Go', ['pr2', 'floor', location])])
+
+
+class PlanCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'plans.json')
+        self.world_state = WorldState.to_world_state(make_kitchen_world())
+        # plans are only simulated, so there's no world to execute them in
+        self.executor = PlanExecutor([go_operator, pick_up_operator, place_operator], None)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        (goal_fluents, plan) = go_goal_and_plan('kitchen_island_counter_top')
+        PlanCache(self.file_name).store(self.world_state, goal_fluents, plan)
+        plan_cache = PlanCache(self.file_name)
+        cached_plan = plan_cache.lookup(self.world_state, goal_fluents, self.executor)
+        self.assertEqual(cached_plan, plan)
+        self.assertIs(type(cached_plan[0][0]), str)
+        self.assertEqual((plan_cache.hits, plan_cache.misses), (1, 0))
+
+    def test_other_state_misses(self):
+        (goal_fluents, plan) = go_goal_and_plan('kitchen_island_counter_top')
+        plan_cache = PlanCache(self.file_name)
+        plan_cache.store(self.world_state, goal_fluents, plan)
+        self.world_state.manipulate_environment('fridge', 'open')
+        self.assertIsNone(plan_cache.lookup(self.world_state, goal_fluents, self.executor))
+        self.assertEqual(plan_cache.misses, 1)
+
+    def test_evicts_least_recently_used(self):
+        plan_cache = PlanCache(self.file_name, max_entries=2)
+        (first_goal_fluents, first_plan) = go_goal_and_plan('kitchen_island_counter_top')
+        (second_goal_fluents, second_plan) = go_goal_and_plan('sink_area_counter_top')
+        (third_goal_fluents, third_plan) = go_goal_and_plan('floor')
+        plan_cache.store(self.world_state, first_goal_fluents, first_plan)
+        plan_cache.store(self.world_state, second_goal_fluents, second_plan)
+        # using the first plan makes the second one the least recently used
+        self.assertEqual(plan_cache.lookup(self.world_state, first_goal_fluents, self.executor), first_plan)
+        plan_cache.store(self.world_state, third_goal_fluents, third_plan)
+        self.assertEqual(len(load_plans(self.file_name)), 2)
+        plan_cache = PlanCache(self.file_name, max_entries=2)
+        self.assertIsNone(plan_cache.lookup(self.world_state, second_goal_fluents, self.executor))
+        self.assertEqual(plan_cache.lookup(self.world_state, first_goal_fluents, self.executor), first_plan)
+        self.assertEqual(plan_cache.lookup(self.world_state, third_goal_fluents, self.executor), third_plan)
+
+    def test_drops_plan_that_stopped_working(self):
+        # going into the closed fridge doesn't work
+        (goal_fluents, plan) = go_goal_and_plan('fridge')
+        PlanCache(self.file_name).store(self.world_state, goal_fluents, plan)
+        plan_cache = PlanCache(self.file_name)
+        self.assertIsNone(plan_cache.lookup(self.world_state, goal_fluents, self.executor))
+        plan_cache.close()
+        self.assertEqual(load_plans(self.file_name), [])
+
+    def test_merges_plans_of_other_processes(self):
+        plan_cache = PlanCache(self.file_name)
+        other_plan_cache = PlanCache(self.file_name)
+        (goal_fluents, plan) = go_goal_and_plan('kitchen_island_counter_top')
+        (other_goal_fluents, other_plan) = go_goal_and_plan('sink_area_counter_top')
+        plan_cache.store(self.world_state, goal_fluents, plan)
+        other_plan_cache.store(self.world_state, other_goal_fluents, other_plan)
+        plan_cache = PlanCache(self.file_name)
+        self.assertEqual(plan_cache.lookup(self.world_state, goal_fluents, self.executor), plan)
+        self.assertEqual(plan_cache.lookup(self.world_state, other_goal_fluents, self.executor), other_plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+
+from toy_fetch_place.world_state import *
+from toy_fetch_place.fluents import *
+from toy_fetch_place.operators import *
+from toy_fetch_place.primitives_and_progress import *
+from toy_fetch_place.probability_lattice import *
+from toy_fetch_place.tests import make_kitchen_world
+
+OPERATORS = [go_operator, manipulate_environment_operator, pick_up_operator, place_operator,
+             examine_environment_operator, examine_hand_operator]
+
+
+class ProbabilityLatticeTest(unittest.TestCase):
+    def setUp(self):
+        self.world_state = WorldState.to_world_state(make_kitchen_world())
+        set_probability_lattice(self.world_state, OPERATORS)
+        self.lattice = self.world_state.probability_lattice
+
+    def assert_on_lattice(self, probability):
+        self.assertIn(round(probability, LEVEL_DECIMALS), self.lattice.levels)
+
+    def test_examine_levels_after_single_moves(self):
+        # PickUp observed to succeed or fail 0.75, Place observed to succeed 0.6 * 0.75 / (0.6 * 0.75 + 0.4 * 0.25)
+        # and to fail 0.4 * 0.75 / (0.4 * 0.75 + 0.6 * 0.25), and the initial confidence
+        self.assertEqual(self.lattice.examine_levels, [0.8182, 0.75, 0.6667, 0.5, 0])
+
+    def test_levels_match_belief_updates(self):
+        world_state = self.world_state
+        world_state.manipulate_environment('sink_drawer_upper', 'open')
+        world_state.move_item_or_robot('pr2', 'floor', 'sink_drawer_upper')
+        world_state.set_probability_of_item_at_location('spoon_1', None, 'sink_drawer_upper', 1.0)
+        pickUpProgress(world_state, ['pr2', 'right_arm', 'spoon_1', 'sink_drawer_upper'], 'sink_drawer_upper')
+        self.assert_on_lattice(world_state.get_probability_of_item_at_location('spoon_1', 'sink_drawer_upper'))
+        pickUpProgress(world_state, ['pr2', 'right_arm', 'spoon_1', 'sink_drawer_upper'], 'right_arm')
+        self.assert_on_lattice(world_state.get_probability_of_item_in_hand('spoon_1', 'right_arm'))
+        examineProgress(world_state, ['spoon_1', 'right_arm', 0.5], ['spoon_1'])
+        placeProgress(world_state, ['pr2', 'right_arm', 'spoon_1', 'sink_drawer_upper'], 'sink_drawer_upper')
+        self.assert_on_lattice(world_state.get_probability_of_item_at_location('spoon_1', 'sink_drawer_upper'))
+        # the milk in the hand was never perceived
+        placeProgress(world_state, ['pr2', 'left_arm', 'milk_1', 'sink_drawer_upper'], 'sink_drawer_upper')
+        self.assert_on_lattice(world_state.get_probability_of_item_at_location('milk_1', 'sink_drawer_upper'))
+
+    def test_disabled_operators_add_no_levels(self):
+        regrasp_operator = hpn.fbch.Operator('Regrasp', [], {}, [])
+        lattice = build_probability_lattice(OPERATORS + [regrasp_operator],
+                                            self.world_state.operator_fail_probabilities,
+                                            self.world_state.initial_confidence,
+                                            self.world_state.outcome_observation_accuracy,
+                                            len(self.world_state.environment.possible_locations))
+        self.assertTrue(set(self.lattice.levels) < set(lattice.levels))
+
+    def test_round_down(self):
+        self.assertEqual(self.lattice.round_down(1.0), 1.0)
+        self.assertEqual(self.lattice.round_down(0.8), max(level for level in self.lattice.levels if level <= 0.8))
+        self.assertEqual(self.lattice.round_down(0.8182), 0.8182)
+        self.assertEqual(self.lattice.round_down(0.75 - 1e-9), 0.75)
+        self.assertEqual(self.lattice.round_down(0.1), 0.0)
+
+    def test_know_compares_levels(self):
+        world_state = self.world_state
+        world_state.set_probability_of_item_at_location('cup_1', None, 'sink_drawer_middle', 0.8)
+        self.assertTrue(Know([Location(['cup_1']), 'sink_drawer_middle', 0.75], True).test(world_state))
+        self.assertFalse(Know([Location(['cup_1']), 'sink_drawer_middle', 0.85], True).test(world_state))
+        # between the same two levels as the confidence, so optimistically the same
+        self.assertTrue(Know([Location(['cup_1']), 'sink_drawer_middle', 0.81], True).test(world_state))
+        world_state.probability_lattice = None
+        self.assertFalse(Know([Location(['cup_1']), 'sink_drawer_middle', 0.81], True).test(world_state))
+
+
+if __name__ == '__main__':
+    unittest.main()
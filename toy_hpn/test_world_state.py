@@ -0,0 +1,45 @@
+import unittest
+
+from toy_fetch_place.world_state import *
+from toy_fetch_place.operators import *
+from toy_fetch_place.probability_lattice import set_probability_lattice
+from toy_fetch_place.tests import make_kitchen_world
+
+
+class CompactWorldStateTest(unittest.TestCase):
+    def test_round_trip(self):
+        world_state = WorldState.to_world_state(make_kitchen_world())
+        set_probability_lattice(world_state, [pick_up_operator, place_operator])
+        world_state.teleport_item('milk_1', 'fridge')
+        world_state.teleport_item('cup_1', 'right_arm')
+        # perception can see an item in both hands
+        world_state.robot.teleport_item_to_hand(world_state.robot.get_item_in_hand('right_arm'), 'left_arm')
+        world_state.environment.container_states_confidences['fridge'] = 0.3
+        world_state.bump_version()
+        compact_world_state = CompactWorldState.to_compact_world_state(world_state)
+        round_trip_world_state = compact_world_state.to_world_state()
+        for arm in ['left_arm', 'right_arm']:
+            self.assertEqual(round_trip_world_state.robot.get_item_in_hand(arm).name, 'cup_1')
+        self.assertEqual(round_trip_world_state.get_item_locations('milk_1'), ['fridge'])
+        self.assertEqual(round_trip_world_state.environment.container_states_confidences,
+                         world_state.environment.container_states_confidences)
+        self.assertEqual(round_trip_world_state.version, world_state.version)
+        self.assertIs(round_trip_world_state.probability_lattice, world_state.probability_lattice)
+        for item in world_state.items:
+            self.assertTrue((round_trip_world_state.locations_belief[round_trip_world_state.belief_rows[item.name]] ==
+                             world_state.locations_belief[world_state.belief_rows[item.name]]).all())
+        round_trip_compact_world_state = CompactWorldState.to_compact_world_state(round_trip_world_state,
+                                                                                  compact_world_state.encoding)
+        self.assertEqual(round_trip_compact_world_state, compact_world_state)
+        self.assertEqual(hash(round_trip_compact_world_state), hash(compact_world_state))
+
+    def test_container_confidence_is_state(self):
+        world_state = WorldState.to_world_state(make_kitchen_world())
+        compact_world_state = CompactWorldState.to_compact_world_state(world_state)
+        world_state.environment.container_states_confidences['fridge'] = 0.3
+        self.assertNotEqual(CompactWorldState.to_compact_world_state(world_state, compact_world_state.encoding),
+                            compact_world_state)
+
+
+if __name__ == '__main__':
+    unittest.main()
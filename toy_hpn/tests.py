@@ -1,3 +1,4 @@
+import argparse  # for the command line interface
 
 import hpn.fbch  # for State and HPN
 import hpn.globals # for rebindPenalty
@@ -6,11 +7,16 @@ import hpn.globals # for rebindPenalty
 from toy_fetch_place.world import *
 from toy_fetch_place.world_state import *
 from toy_fetch_place.operators import *
+from toy_fetch_place.landmarks import serialized_hpn
+from toy_fetch_place.invariants import make_pruning_heuristic
+from toy_fetch_place.probability_lattice import set_probability_lattice
+from toy_fetch_place.plan_execution import PlanExecutor, Planner
+from toy_fetch_place.plan_cache import PlanCache
 
 
 ########################## Tests ########################
 
-def test():
+def make_kitchen_world():
     cup = Item('cup_1', 'cup')
     bowl = Item('bowl_1', 'bowl')
     spoon = Item('spoon_1', 'spoon')
@@ -28,13 +34,11 @@ def test():
 
     fail_probabilities = {'Go': 0.1, 'PickUp': 0.5, 'Place': 0.4, 'Regrasp': 0.8, 'ManipulateEnvironment': 0.3}
 
-    world = World(environment, robot, fail_probabilities)
+    return World(environment, robot, fail_probabilities)
 
-    world_state = WorldState.to_world_state(world)
-    world_state.draw()
 
-    starting_state = hpn.fbch.State([], world_state)
-    goal_states = [
+def make_goal_states():
+    return [
         hpn.fbch.State([Know([ContainerState(['fridge']), 'open', 1], True)]),           # 0
         hpn.fbch.State([Know([Location(['pr2']), 'fridge', 1], True)]),                  # 1
         hpn.fbch.State([Know([Location(['milk_1']), 'fridge', 1], True)]),               # 2
@@ -47,18 +51,56 @@ def test():
                         Know([Location(['bowl_1']), 'sink_drawer_lower', 1], True)]),
     ]
 
-    # our perception operator relies on rebinding for probability values, so make rebinding cheaper
-    hpn.globals.glob.rebindPenalty = 5
 
-    hpn.fbch.HPN(starting_state, goal_states[7],
-                 [go_operator, manipulate_environment_operator, pick_up_operator, place_operator,
-                  examine_environment_operator, examine_hand_operator], #, regrasp_operator],
-                 world,
-                 h=false_fluents_heuristic,
-                 fileTag='test_visualization', hpnFileTag='test_visualization')
+def test(repair_plans=False, plan_cache_file=None):
+    """
+    :param bool repair_plans: plan once and repair the plan after failures (see plan_execution)
+        instead of running HPN
+    :param str plan_cache_file: JSON file to reuse plans from when repairing plans, see plan_cache
+    """
+    world = make_kitchen_world()
+
+    world_state = WorldState.to_world_state(world)
+    world_state.draw()
+
+    starting_state = hpn.fbch.State([], world_state)
+    goal_states = make_goal_states()
 
+    # our perception operator relies on rebinding for probability values, so make rebinding cheaper
+    hpn.globals.glob.rebindPenalty = 5
 
-test()
+    operators = [go_operator, manipulate_environment_operator, pick_up_operator, place_operator,
+                 examine_environment_operator, examine_hand_operator] #, regrasp_operator]
+    set_probability_lattice(world_state, operators)
+    # cut off regressed goals like IsRobot[spoon_1] = true right away
+    heuristic = make_pruning_heuristic(false_fluents_heuristic, operators)
+
+    if repair_plans:
+        plan_cache = PlanCache(plan_cache_file) if plan_cache_file else None
+        executor = PlanExecutor(operators, world, Planner(operators, heuristic, plan_cache=plan_cache))
+        print 'achieved:', executor.achieve(world_state, goal_states[7].fluents), \
+            executor.repairs, 'repairs', executor.replans, 'replans'
+        if plan_cache:
+            plan_cache.close()
+            print plan_cache.hits, 'cached plans used'
+        return
+
+    # plan for one conjunct after the other, ordered by their landmarks,
+    # so that achieving a conjunct doesn't undo the ones achieved before it
+    serialized_hpn(starting_state, goal_states[7],
+                   operators,
+                   world,
+                   h=heuristic,
+                   fileTag='test_visualization', hpnFileTag='test_visualization')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fetches and places items in the kitchen.')
+    parser.add_argument('--repair', action='store_true',
+                        help='plan once and repair the plan after failures instead of running HPN')
+    parser.add_argument('--plan-cache', help='JSON file to reuse plans from, with --repair')
+    arguments = parser.parse_args()
+    test(repair_plans=arguments.repair, plan_cache_file=arguments.plan_cache)
 
 
 ################### Questions ########################
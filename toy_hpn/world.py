@@ -33,6 +33,11 @@ class Robot(Item):
                 if item and item.item_type == 'robot':
                     raise Exception('Robot cannot be holding a robot in his hands: {}'.format(item.name))
                 self.items_in_hands[hand] = item
+        # maps item names to the hands holding them, so that we don't have to scan the hands
+        self.hands_holding_items = {}
+        for (hand, item) in self.items_in_hands.items():
+            if item:
+                self.hands_holding_items.setdefault(item.name, []).append(hand)
 
     ################ getters #############
 
@@ -51,7 +56,7 @@ class Robot(Item):
         :param str item_name: the name of the item we're looking for
         :return str: the hand or hands (one of self.possible_arms) which is/are holding the item, otherwise None
         """
-        return [hand for (hand, item) in self.items_in_hands.items() if item and item.name == item_name]
+        return list(self.hands_holding_items.get(item_name, []))
 
     ######### setters ##############
 
@@ -67,6 +72,7 @@ class Robot(Item):
         if item.item_type == 'robot':
             raise Exception('Robot cannot hold another robot or himself: {}.'.format(item.name))
         self.items_in_hands[hand] = item
+        self.hands_holding_items.setdefault(item.name, []).append(hand)
 
     def remove_item_from_hand(self, item, hand):
         """
@@ -80,6 +86,29 @@ class Robot(Item):
             raise Exception("item {} is not in robot's {}.".format(item.name, hand))
         # only one object can be held per hand, so if we remove the object, we're left with None
         self.items_in_hands[hand] = None
+        self.unindex_item_in_hand(item.name, hand)
+
+    def teleport_item_to_hand(self, item, hand):
+        """
+        Puts the item into the hand without any checks, whatever was in the hand before disappears from it.
+        Perception can teleport objects, so this is used when observing hands.
+        :param Item | None item: the item to put into the hand, or None to empty the hand
+        :param str hand: one of self.possible_arms
+        """
+        item_in_hand = self.items_in_hands[hand]
+        if item_in_hand:
+            self.unindex_item_in_hand(item_in_hand.name, hand)
+        self.items_in_hands[hand] = item
+        if item:
+            self.hands_holding_items.setdefault(item.name, []).append(hand)
+
+    def unindex_item_in_hand(self, item_name, hand):
+        hands = [hand_holding_item for hand_holding_item in self.hands_holding_items.get(item_name, [])
+                 if hand_holding_item != hand]
+        if hands:
+            self.hands_holding_items[item_name] = hands
+        else:
+            self.hands_holding_items.pop(item_name, None)
 
 
 class Environment:
@@ -92,21 +121,36 @@ class Environment:
 
     # TODO: for each item we need an associated confidence that it is there,
     #       so maybe it would've been easier to have a list of all items stored directly, not through locations
-    def __init__(self, name, items_at_locations=None, container_states=None):
+    def __init__(self, name, items_at_locations=None, container_states=None,
+                 possible_locations=None, container_locations=None):
         """
         :param str name: the name of the environment
         :param dict[str, list(Item)] items_at_locations: maps a location to a list of items located at it,
                                                          whereby a location has to be one of self.possible_locations
         :param dict[str, str] container_states: {'container': 'state'}, where state is either 'open' or 'closed'
+        :param list[str] possible_locations: overrides the class-level locations for this environment
+        :param list[str] container_locations: overrides the class-level containers, has to be among the locations
         """
         self.name = name
+        if possible_locations is not None:
+            self.possible_locations = tuple(possible_locations)
+        if container_locations is not None:
+            if set(container_locations).difference(set(self.possible_locations)):
+                raise Exception('container_locations can only be among the possible locations {}'.
+                                format(self.possible_locations))
+            self.container_locations = tuple(container_locations)
         if items_at_locations and set(items_at_locations.keys()).difference(set(self.possible_locations)):
             raise Exception('items_at_locations can only have locations as one of following strings: {}'.
-                            format(self.items_at_locations))
+                            format(self.possible_locations))
         self.items_at_locations = {location: [] for location in self.possible_locations}
         if items_at_locations:
             for (location, items) in items_at_locations.items():
                 self.items_at_locations[location] = items
+        # maps item names to their locations, so that we don't have to scan all the locations
+        self.locations_of_items = {}
+        for (location, items) in self.items_at_locations.items():
+            for item in items:
+                self.locations_of_items[item.name] = location
         if container_states and (set(container_states.keys()).difference(set(self.container_locations)) or
                                  set(container_states.values()).difference(set(self.possible_container_states))):
             raise Exception('container_states can only have keys as one of {} and values as one of {}'.
@@ -135,9 +179,7 @@ class Environment:
         return all_items
 
     def get_location_of_item(self, item_name):
-        location_as_list = [location for location, items in self.items_at_locations.items()
-                            if [item for item in items if item.name == item_name]]
-        return location_as_list[0] if location_as_list else None
+        return self.locations_of_items.get(item_name)
 
     ########### setters ############
 
@@ -161,11 +203,29 @@ class Environment:
         if location in self.container_locations and self.get_container_state(location) != 'open':
             raise Exception('cannot take item {} out of {} because it is unaccessible.'.format(item.name, location))
         self.items_at_locations[location] = [it for it in self.items_at_locations[location] if it.name != item.name]
+        del self.locations_of_items[item.name]
 
     def add_item_at_location(self, item, location):
         if location in self.container_locations and self.get_container_state(location) != 'open':
             raise Exception('cannot add item {} at {} because it is unaccessible.'.format(item.name, location))
         self.items_at_locations[location].append(item)
+        self.locations_of_items[item.name] = location
+
+    def teleport_item(self, item, location):
+        """
+        Moves the item to the location without checking if the old or new location is accessible.
+        Perception can teleport objects, and things can disappear from closed drawers, so this is used when observing.
+        :param Item item: the item to move
+        :param str | None location: one of self.possible_locations, or None to take the item out of the environment
+        """
+        current_location = self.get_location_of_item(item.name)
+        if current_location:
+            self.items_at_locations[current_location] = [it for it in self.items_at_locations[current_location]
+                                                         if it.name != item.name]
+            del self.locations_of_items[item.name]
+        if location:
+            self.items_at_locations[location].append(item)
+            self.locations_of_items[item.name] = location
 
 
 class World:
@@ -189,6 +249,7 @@ class World:
                 raise Exception('All items should have a location in the robot hand or environment. {} does not'.
                                 format(item.name))
         self.items = items
+        self.items_by_name = {item.name: item for item in items}
         self.operator_fail_probabilities = operator_fail_probabilities
 
     def draw(self):
@@ -219,9 +280,8 @@ class World:
         :param str name: name of the item we're looking for in the world
         :return Item: either an Item or an error if there isn't an item with that name in the world
         """
-        item_as_list = [item for item in self.items if item.name == name]
-        if item_as_list:
-            return item_as_list[0]
+        if name in self.items_by_name:
+            return self.items_by_name[name]
         else:
             raise Exception('There was no item {} in the world.'.format(name))
 
@@ -236,7 +296,15 @@ class World:
             return self.environment.get_items_at_location(location)
 
     def get_item_locations(self, item_name):
-        return [self.environment.get_location_of_item(item_name)] or self.robot.get_hands_holding_item(item_name)
+        """
+        :param str item_name:
+        :return list[str]: the environment location of the item or the hands holding it, empty if it's nowhere
+        """
+        environment_location = self.environment.get_location_of_item(item_name)
+        if environment_location:
+            return [environment_location]
+        else:
+            return self.robot.get_hands_holding_item(item_name)
 
     def get_robot_name(self):
         return self.robot.name
@@ -274,8 +342,7 @@ class World:
         :param str goal_location: goal location where we want to place the item
         """
         # check if item is indeed at the assumed start_location
-        if not self.get_items_at_location(start_location) or\
-                item_name not in map(lambda lambda_item: lambda_item.name, self.get_items_at_location(start_location)):
+        if start_location not in self.get_item_locations(item_name):
             raise Exception('Item {} is not at the expected location {}.'.format(item_name, start_location))
         # check if the goal location is the same as current location
         if start_location == goal_location:
@@ -1,9 +1,80 @@
 
 import copy  # for creating world state equivalents for real-world objects
 
+import numpy as np  # for the belief over item locations and the buffers of CompactWorldState
+
 from toy_fetch_place.world import Item, Robot, Environment, World
 
 
+class OverlayDict(object):
+    """
+    A dict of the changes made on top of a parent dict, which the overlay never changes, see WorldState.fork().
+    Chains of overlays are flattened into a plain dict once they get deeper than max_depth, so lookups stay cheap.
+    """
+    max_depth = 8
+    deleted = object()
+
+    def __init__(self, parent):
+        """
+        :param dict | OverlayDict parent: not to be changed anymore by its owner either
+        """
+        self.depth = parent.depth + 1 if isinstance(parent, OverlayDict) else 1
+        if self.depth > self.max_depth:
+            parent = dict(parent.items())
+            self.depth = 1
+        self.parent = parent
+        self.changes = {}
+
+    def __getitem__(self, key):
+        if key not in self.changes:
+            return self.parent[key]
+        value = self.changes[key]
+        if value is self.deleted:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def __setitem__(self, key, value):
+        self.changes[key] = value
+
+    def __delitem__(self, key):
+        self[key]
+        self.changes[key] = self.deleted
+
+    def items(self):
+        merged = dict(self.parent.items())
+        for (key, value) in self.changes.items():
+            if value is self.deleted:
+                merged.pop(key, None)
+            else:
+                merged[key] = value
+        return merged.items()
+
+    def keys(self):
+        return [key for (key, value) in self.items()]
+
+    def values(self):
+        return [value for (key, value) in self.items()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.items())
+
+
 class WorldStateItem(Item):
     def __init__(self, name, item_type):
         Item.__init__(self, name, item_type)
@@ -17,10 +88,8 @@ class WorldStateItem(Item):
 class WorldStateRobot(Robot):
     def __init__(self, name, items_in_hands=None):
         Robot.__init__(self, name, items_in_hands)
-        # Maps hand to confidence that I have the specific object in that hand
-        # Question: am I as confident about my beliefs of having objects in hands as not having anything in the hand?
-        # Things don't suddenly appear in my hand, but they do suddenly disappear -.- robot life...
-        self.items_in_hands_confidences = {arm: 0.5 for arm in self.items_in_hands.keys()}
+        # names of the containers this robot doesn't share with its forks, see fork()
+        self.owned = set()
 
     @classmethod
     def to_world_state(cls, robot):
@@ -30,20 +99,43 @@ class WorldStateRobot(Robot):
         world_state_robot = cls(robot.name, items_in_hands_copy)
         return world_state_robot
 
-    def get_item_in_hand_confidence(self, hand):
-        return self.items_in_hands_confidences[hand]
+    def fork(self):
+        """
+        Returns a copy that shares all the hand dicts with this robot until one of the two changes them.
+        :return WorldStateRobot:
+        """
+        forked_robot = copy.copy(self)
+        forked_robot.owned = set()
+        self.owned = set()
+        return forked_robot
+
+    def own_hands(self):
+        if 'hands' not in self.owned:
+            self.items_in_hands = dict(self.items_in_hands)
+            self.hands_holding_items = {item_name: list(hands)
+                                        for (item_name, hands) in self.hands_holding_items.items()}
+            self.owned.add('hands')
+
+    def set_item_in_hand(self, item, hand):
+        self.own_hands()
+        Robot.set_item_in_hand(self, item, hand)
 
-    def set_item_in_hand_confidence(self, hand, confidence):
-        self.items_in_hands_confidences[hand] = confidence
+    def remove_item_from_hand(self, item, hand):
+        self.own_hands()
+        Robot.remove_item_from_hand(self, item, hand)
+
+    def teleport_item_to_hand(self, item, hand):
+        self.own_hands()
+        Robot.teleport_item_to_hand(self, item, hand)
 
 
 class WorldStateEnvironment(Environment):
-    def __init__(self, name, items_at_locations=None, container_states=None):
-        Environment.__init__(self, name, items_at_locations, container_states)
+    def __init__(self, name, items_at_locations=None, container_states=None,
+                 possible_locations=None, container_locations=None):
+        Environment.__init__(self, name, items_at_locations, container_states, possible_locations, container_locations)
         self.container_states_confidences = {location: 0.5 for location in self.container_states.keys()}
-        self.items_at_locations_confidences = {}
-        for (location, items_list) in self.items_at_locations.items():
-            self.items_at_locations_confidences[location] = {item_name: 0.5 for item_name in items_list}
+        # names of the containers this environment doesn't share with its forks, see fork()
+        self.owned = set()
 
     @classmethod
     def to_world_state(cls, environment):
@@ -51,37 +143,122 @@ class WorldStateEnvironment(Environment):
         for (location, items_list) in environment.items_at_locations.items():
             items_at_locations_copy[location] = map(lambda item: WorldStateItem.to_world_state(item), items_list)
         container_states_copy = copy.copy(environment.container_states)
-        world_state_environment = cls(environment.name, items_at_locations_copy, container_states_copy)
+        world_state_environment = cls(environment.name, items_at_locations_copy, container_states_copy,
+                                      environment.possible_locations, environment.container_locations)
         return world_state_environment
 
+    def fork(self):
+        """
+        Returns a copy that shares all the location dicts and lists with this environment
+        until one of the two changes them. Then the changing one puts an overlay over the shared dicts
+        and copies only the list of the touched location.
+        :return WorldStateEnvironment:
+        """
+        forked_environment = copy.copy(self)
+        forked_environment.owned = set()
+        self.owned = set()
+        return forked_environment
+
+    def own_location(self, location):
+        if 'locations' not in self.owned:
+            self.items_at_locations = OverlayDict(self.items_at_locations)
+            self.locations_of_items = OverlayDict(self.locations_of_items)
+            self.owned.add('locations')
+        if location and ('location', location) not in self.owned:
+            self.items_at_locations[location] = list(self.items_at_locations[location])
+            self.owned.add(('location', location))
+
+    def own_container_states(self):
+        if 'container_states' not in self.owned:
+            self.container_states = dict(self.container_states)
+            self.owned.add('container_states')
+
+    def set_container_state(self, state, container):
+        self.own_container_states()
+        Environment.set_container_state(self, state, container)
+
+    def remove_item_from_location(self, item, location):
+        self.own_location(location)
+        Environment.remove_item_from_location(self, item, location)
+
+    def add_item_at_location(self, item, location):
+        self.own_location(location)
+        Environment.add_item_at_location(self, item, location)
+
+    def teleport_item(self, item, location):
+        self.own_location(self.get_location_of_item(item.name))
+        self.own_location(location)
+        Environment.teleport_item(self, item, location)
+
     def get_location_state_confidence(self, container):
         # return self.container_states_confidences[container] if container in self.container_locations else 1.0
         # decided that because there's no way to perceive a container state atm, we should just have 1.0 confidence
         return 1.0
 
-    def get_item_at_location_confidence(self, location, item_name):
-        if item_name in self.items_at_locations_confidences[location].keys():
-            return self.items_at_locations_confidences[location][item_name]
-        else:
-            return 0.5
-
-    def set_item_at_location_confidence(self, item_location, item_name, confidence):
-        if confidence == 0:
-            self.items_at_locations_confidences[item_location].pop(item_name, None)
-        else:
-            self.items_at_locations_confidences[item_location][item_name] = confidence
 
+def predict_move(row, start_column, goal_column, fail_probability):
+    """
+    Bayes prediction step of a belief row with World.object_location_transition_model:
+    the item moves from the start column to the goal column with probability (1 - fail_probability)
+    :param np.ndarray row: P(item at location) per location, changed in place
+    :param int start_column:
+    :param int goal_column:
+    :param float fail_probability:
+    """
+    moved_probability = row[start_column] * (1.0 - fail_probability)
+    row[start_column] -= moved_probability
+    row[goal_column] += moved_probability
 
 
+def observe_outcome(row, column, accuracy):
+    """
+    Bayes update of a belief row with the observed outcome of a move, which is right with probability accuracy:
+    P(observed | at location) is the accuracy for the observed column and 1 - accuracy for all the others.
+    :param np.ndarray row: P(item at location) per location, changed in place
+    :param int column: where the item was observed to end up
+    :param float accuracy:
+    """
+    row *= 1.0 - accuracy
+    row[column] *= accuracy / (1.0 - accuracy)
+    row_sum = row.sum()
+    if row_sum > 0:
+        row /= row_sum
+    else:
+        row[column] = 1.0
 
 
 class WorldState(World):
+    # confidence of an item being at its assumed location before it has ever been perceived
+    initial_confidence = 0.5
+    # P(observed outcome | actual outcome) of PickUp, Place and Regrasp,
+    # such that a certain item is believed to be where the outcome says with the 0.75 of the operator results
+    outcome_observation_accuracy = 0.75
+
     def __init__(self, environment, robot, operator_fail_probabilities):
         World.__init__(self, environment, robot, operator_fail_probabilities)
+        # Every setter bumps the version and drops the cache of evaluations of the state, e.g., of fluent tests.
+        # The cache statistics are shared with the forks of the state.
+        self.version = 0
+        self.evaluation_cache = {}
+        self.cache_statistics = {'hits': 0, 'misses': 0}
+        # the operators of the heuristics per name and fluent, shared with the forks, see fluents.get_heuristic_operator
+        self.heuristic_operators = {}
+        # The belief is a matrix of P(item at location): one row per item, one column per location or arm.
+        # Each row sums up to 1. An arm can hold one item at most, so P(arm empty) is 1 - sum of arm's column.
+        self.belief_locations = tuple(self.environment.possible_locations) + tuple(self.robot.possible_arms)
+        self.belief_columns = {location: column for (column, location) in enumerate(self.belief_locations)}
+        self.belief_rows = {item.name: row for (row, item) in enumerate(self.items)}
+        self.locations_belief = np.zeros((len(self.items), len(self.belief_locations)))
+        self.owns_belief = True
+        for item in self.items:
+            self.set_probability_of_item_at_location(item.name, None, self.get_item_locations(item.name)[0],
+                                                     self.initial_confidence)
         # set the confidence in robot location to 1, assume the localization is really good
         robot_name = self.get_robot_name()
         robot_location = self.get_item_locations(robot_name)[0]
-        self.environment.set_item_at_location_confidence(robot_location, robot_name, 1)
+        self.set_probability_of_item_at_location(robot_name, None, robot_location, 1)
+        # the confidences the planning operators can reach, see probability_lattice.set_probability_lattice
+        self.probability_lattice = None
 
     @classmethod
     def to_world_state(cls, world):
@@ -90,6 +267,47 @@ class WorldState(World):
                           copy.copy(world.operator_fail_probabilities))
         return world_state
 
+    def fork(self):
+        """
+        Returns a snapshot of this world state in constant time, e.g., for evaluating hypothetical operator outcomes
+        with the progress functions. The snapshot shares everything with this state, and whichever of the two
+        is changed afterwards through the setters only copies the location or arm that it touches.
+        Items are never changed, so they are always shared.
+        :return WorldState:
+        """
+        forked_world_state = copy.copy(self)
+        forked_world_state.environment = self.environment.fork()
+        forked_world_state.robot = self.robot.fork()
+        # the belief matrix is copied as a whole by whichever of the two states updates it first
+        forked_world_state.owns_belief = False
+        self.owns_belief = False
+        return forked_world_state
+
+    def bump_version(self):
+        self.version += 1
+        # don't clear the old cache, a fork might still be using it
+        self.evaluation_cache = {}
+
+    def get_or_evaluate(self, key, evaluate):
+        """
+        Returns the cached result of evaluating key in the current version of the state,
+        or evaluates it and caches the result.
+        :param key: any hashable
+        :param evaluate: function without arguments
+        """
+        if key in self.evaluation_cache:
+            self.cache_statistics['hits'] += 1
+            return self.evaluation_cache[key]
+        self.cache_statistics['misses'] += 1
+        result = evaluate()
+        self.evaluation_cache[key] = result
+        return result
+
+    def own_belief(self):
+        if not self.owns_belief:
+            self.locations_belief = self.locations_belief.copy()
+            self.owns_belief = True
+
     def draw(self):
         chars_in_left_column = 40
         print 'ROBOT {}:'.format(self.robot.name)
@@ -98,27 +316,28 @@ class WorldState(World):
             print left_column_entry + ' ' * (chars_in_left_column - len(left_column_entry)),
             item_in_hand = self.robot.get_item_in_hand(arm)
             print (item_in_hand.name if item_in_hand else 'None'),
-            print '({})'.format(self.robot.get_item_in_hand_confidence(arm))
+            print '({})'.format(self.get_probability_of_item_in_hand(item_in_hand.name if item_in_hand else None,
+                                                                     arm))
         print
         print 'ENVIRONMENT {}:'.format(self.environment.name)
         for location in self.environment.possible_locations:
             left_column_entry = '   {}({}): '.format(location, self.environment.get_container_state(location))
             print left_column_entry + ' ' * (chars_in_left_column - len(left_column_entry)),
             for item in self.environment.get_items_at_location(location):
-                print item.name + ' ({})'.format(self.environment.get_item_at_location_confidence(location, item.name))\
-                      + '  ',
+                print item.name + ' ({})'.format(self.get_probability_of_item_at_location(item.name, location)) + '  ',
             print
         print
 
     def get_probability_of_item_in_hand(self, item_name, hand):
         """
-        :param str item_name:
+        :param str | None item_name: None for the probability that the hand is empty
         :param str hand:
         :return float: returns the probability that the item is indeed in the hand
         """
-        # TODO: for now ignoring item_name, but should actually compare with the belief state maybe?
-        # if self.get_item_in_hand[hand] == item_name
-        return self.robot.get_item_in_hand_confidence(hand)
+        column = self.belief_columns[hand]
+        if item_name is None:
+            return max(0.0, 1.0 - float(self.locations_belief[:, column].sum()))
+        return float(self.locations_belief[self.belief_rows[item_name], column])
 
     def get_probability_of_container_state(self, container_name, container_state):
         """
@@ -129,19 +348,316 @@ class WorldState(World):
         return self.environment.get_location_state_confidence(container_name)
 
     def get_probability_of_item_at_location(self, item_name, item_location):
-        if item_location in self.environment.possible_locations:
-            return self.environment.get_item_at_location_confidence(item_location, item_name)
-        elif item_location in self.robot.possible_arms:
-            return self.get_probability_of_item_in_hand(item_name, item_location)
+        if item_location in self.belief_columns:
+            return float(self.locations_belief[self.belief_rows[item_name], self.belief_columns[item_location]])
 
     def set_probability_of_item_at_location(self, item_name, old_location, new_location, confidence):
-        # remove old confidence
-        if old_location in self.environment.possible_locations:
-            self.environment.set_item_at_location_confidence(old_location, item_name, 0)
-        elif old_location in self.robot.possible_arms:
-            self.robot.set_item_in_hand_confidence(old_location, 0.5)
-        # add new confidence
-        if new_location in self.environment.possible_locations:
-            self.environment.set_item_at_location_confidence(new_location, item_name, confidence)
-        elif new_location in self.robot.possible_arms:
-            self.robot.set_item_in_hand_confidence(new_location, confidence)
\ No newline at end of file
+        """
+        Sets P(item at new_location) to confidence and scales the probabilities of all the other locations,
+        including old_location, such that they sum up to 1 - confidence. Without any other probabilities,
+        1 - confidence is spread over the other environment locations only, an item is never assumed in a hand
+        without evidence, which keeps every arm column summing up to 1 at most.
+        :param str item_name:
+        :param str | None old_location: kept for the progress functions, the old location is one of the others
+        :param str new_location:
+        :param float confidence:
+        """
+        self.own_belief()
+        self.bump_version()
+        row = self.locations_belief[self.belief_rows[item_name]]
+        column = self.belief_columns[new_location]
+        row[column] = 0.0
+        others_sum = row.sum()
+        if others_sum > 0:
+            row *= (1.0 - confidence) / others_sum
+        else:
+            self.spread_over_environment_locations(row, column, 1.0 - confidence)
+        row[column] = confidence
+
+    def spread_over_environment_locations(self, row, excluded_column, probability):
+        """
+        Sets the environment columns of the belief row other than excluded_column to equal shares of probability,
+        and the arm columns to 0.
+        """
+        environment_columns = len(self.environment.possible_locations)
+        row[:] = 0.0
+        shared_columns = environment_columns - (1 if excluded_column < environment_columns else 0)
+        if shared_columns > 0:
+            row[0:environment_columns] = probability / shared_columns
+            if excluded_column < environment_columns:
+                row[excluded_column] = 0.0
+
+    ############ belief updates ##############
+
+    def predict_item_move(self, item_name, start_location, goal_location, fail_probability):
+        """
+        Bayes prediction step with World.object_location_transition_model:
+        the item moves from start_location to goal_location with probability (1 - fail_probability)
+        :param str item_name:
+        :param str start_location:
+        :param str goal_location:
+        :param float fail_probability:
+        """
+        if start_location == goal_location:
+            return
+        self.own_belief()
+        self.bump_version()
+        predict_move(self.locations_belief[self.belief_rows[item_name]], self.belief_columns[start_location],
+                     self.belief_columns[goal_location], fail_probability)
+
+    def observe_item_move_outcome(self, item_name, observed_location):
+        """
+        Bayes update after predict_item_move with the observed outcome of the move, which is right
+        with probability outcome_observation_accuracy: P(observed | at location) is the accuracy for the
+        observed location and 1 - accuracy for all the others.
+        :param str item_name:
+        :param str observed_location: where the item was observed to end up
+        """
+        self.own_belief()
+        self.bump_version()
+        observe_outcome(self.locations_belief[self.belief_rows[item_name]], self.belief_columns[observed_location],
+                        self.outcome_observation_accuracy)
+
+    def observe_items_at_location(self, location, observed_item_names):
+        """
+        Bayes update of all the items with perfect perception of location:
+        observed items are certainly there, and the other ones are certainly not.
+        :param str location: one of the environment locations or arms
+        :param list[str] observed_item_names:
+        """
+        self.own_belief()
+        self.bump_version()
+        column = self.belief_columns[location]
+        observed = np.zeros(len(self.items), dtype=bool)
+        observed[[self.belief_rows[item_name] for item_name in observed_item_names]] = True
+        # P(not seen | at location) = 0
+        self.locations_belief[~observed, column] = 0.0
+        row_sums = self.locations_belief.sum(axis=1)
+        # items that we were sure about but didn't see could now be at any other environment location
+        lost = ~observed & (row_sums <= 0)
+        for lost_row in np.flatnonzero(lost):
+            self.spread_over_environment_locations(self.locations_belief[lost_row], column, 1.0)
+        row_sums[lost] = 1.0
+        self.locations_belief /= row_sums[:, np.newaxis]
+        # P(seen | at location) = 1
+        self.locations_belief[observed] = 0.0
+        self.locations_belief[observed, column] = 1.0
+
+    def get_most_probable_environment_locations(self, item_name):
+        """
+        :param str item_name:
+        :return list[str]: the environment locations with the highest probability, more than one if they tie
+        """
+        environment_columns = len(self.environment.possible_locations)
+        row = self.locations_belief[self.belief_rows[item_name], 0:environment_columns]
+        return [self.belief_locations[column] for column in np.flatnonzero(np.isclose(row, row.max()))]
+
+    def get_most_probable_environment_location(self, item_name, previous_location=None):
+        """
+        :param str item_name:
+        :param str previous_location: preferred on ties
+        :return str:
+        """
+        most_probable_locations = self.get_most_probable_environment_locations(item_name)
+        if previous_location in most_probable_locations:
+            return previous_location
+        return most_probable_locations[0]
+
+    ########### setters ##############
+
+    def remove_item_at_location(self, item_name, location):
+        self.bump_version()
+        World.remove_item_at_location(self, item_name, location)
+
+    def add_item_at_location(self, item_name, location):
+        self.bump_version()
+        World.add_item_at_location(self, item_name, location)
+
+    def manipulate_environment(self, container_name, goal_state):
+        self.bump_version()
+        World.manipulate_environment(self, container_name, goal_state)
+
+    ########### low-level setters ##############
+
+    def teleport_item(self, item_name, location):
+        """
+        Moves the item to the location without checking anything, e.g., because perception found it there.
+        :param str item_name:
+        :param str location: one of the environment locations or arms
+        """
+        self.bump_version()
+        item = self.get_item_with_name(item_name)
+        for current_location in self.get_item_locations(item_name):
+            if current_location in self.robot.possible_arms:
+                self.robot.teleport_item_to_hand(None, current_location)
+        if location in self.robot.possible_arms:
+            self.environment.teleport_item(item, None)
+            item_in_hand = self.robot.get_item_in_hand(location)
+            self.robot.teleport_item_to_hand(item, location)
+            if item_in_hand and item_in_hand.name != item_name:
+                # there's only one item per hand, so the old one must be somewhere else
+                self.teleport_item(item_in_hand.name, self.get_most_probable_environment_location(item_in_hand.name))
+        else:
+            self.environment.teleport_item(item, location)
+
+
+class WorldStateEncoding:
+    """
+    Interns the names of items, locations, arms, containers and container states of a world to small integers.
+    All the compact states of one world should share the same encoding, otherwise they cannot be compared.
+    """
+    def __init__(self, world_state):
+        """
+        :param WorldState world_state: the world whose items, locations and containers to intern
+        """
+        self.environment_name = world_state.environment.name
+        self.robot_name = world_state.get_robot_name()
+        # sort the items, such that worlds with the same items end up with the same encoding
+        items = sorted(world_state.items, key=lambda item: item.name)
+        self.item_names = tuple(item.name for item in items)
+        self.item_types = tuple(item.item_type for item in items)
+        self.item_indices = {item_name: index for (index, item_name) in enumerate(self.item_names)}
+        # environment locations come first, arms afterwards
+        self.locations = tuple(world_state.environment.possible_locations) + tuple(world_state.robot.possible_arms)
+        self.location_indices = {location: index for (index, location) in enumerate(self.locations)}
+        self.arms = tuple(world_state.robot.possible_arms)
+        self.containers = tuple(world_state.environment.container_locations)
+        self.container_states = tuple(world_state.environment.possible_container_states)
+        self.container_state_indices = {state: index for (index, state) in enumerate(self.container_states)}
+        self.operator_fail_probabilities = copy.copy(world_state.operator_fail_probabilities)
+
+    def key(self):
+        return (self.environment_name, self.robot_name, self.item_names, self.item_types,
+                self.locations, self.containers, self.container_states)
+
+
+class CompactWorldState:
+    """
+    WorldState packed into fixed-size integer and float numpy arrays, which are cheap to copy, hash and compare:
+      * item_locations: item index -> index of the environment location (-1 if the item is in no location)
+      * hand_items: arm index -> item index (-1 if the hand is empty), an item can be held in both hands
+      * locations_belief: item index * number of locations + location index -> P(item at location)
+      * container_states: container index -> container state index
+      * container_states_confidences: container index -> confidence in the container state
+    The version and the probability lattice of the world state are kept for the round trip,
+    but they are not part of the state, so they are neither hashed nor compared.
+    The hash is cached, so don't change the buffers of a state once it's been hashed, change a copy() instead.
+    """
+    def __init__(self, encoding, item_locations, hand_items, locations_belief, container_states,
+                 container_states_confidences, version=0, probability_lattice=None):
+        """
+        :param WorldStateEncoding encoding:
+        :param np.ndarray item_locations: of dtype int16
+        :param np.ndarray hand_items: of dtype int16
+        :param np.ndarray locations_belief: of dtype float64, item index * number of locations + location index
+        :param np.ndarray container_states: of dtype int8
+        :param np.ndarray container_states_confidences: of dtype float64
+        :param int version: of the world state
+        :param ProbabilityLattice probability_lattice: of the world state
+        """
+        self.encoding = encoding
+        self.item_locations = item_locations
+        self.hand_items = hand_items
+        self.locations_belief = locations_belief
+        self.container_states = container_states
+        self.container_states_confidences = container_states_confidences
+        self.version = version
+        self.probability_lattice = probability_lattice
+        self.hash = None
+
+    @classmethod
+    def to_compact_world_state(cls, world_state, encoding=None):
+        """
+        :param WorldState world_state:
+        :param WorldStateEncoding encoding: reuse it for all the states of the same world
+        :return CompactWorldState:
+        """
+        if not encoding:
+            encoding = WorldStateEncoding(world_state)
+        item_locations = np.full(len(encoding.item_names), -1, dtype=np.int16)
+        for (index, item_name) in enumerate(encoding.item_names):
+            locations = [location for location in world_state.get_item_locations(item_name)
+                         if location not in encoding.arms]
+            if locations:
+                item_locations[index] = encoding.location_indices[locations[0]]
+        hand_items = np.full(len(encoding.arms), -1, dtype=np.int16)
+        for (index, arm) in enumerate(encoding.arms):
+            item_in_hand = world_state.robot.get_item_in_hand(arm)
+            if item_in_hand:
+                hand_items[index] = encoding.item_indices[item_in_hand.name]
+        # the belief columns are in the same order as the encoded locations
+        belief_rows = [world_state.belief_rows[item_name] for item_name in encoding.item_names]
+        locations_belief = world_state.locations_belief[belief_rows].astype(np.float64).ravel()
+        container_states = np.array([encoding.container_state_indices[world_state.environment.get_container_state(
+                                         container)] for container in encoding.containers], dtype=np.int8)
+        container_states_confidences = np.array([world_state.environment.container_states_confidences[container]
+                                                 for container in encoding.containers], dtype=np.float64)
+        return cls(encoding, item_locations, hand_items, locations_belief, container_states,
+                   container_states_confidences, world_state.version, world_state.probability_lattice)
+
+    def to_world_state(self):
+        """
+        :return WorldState: a new world state equivalent to this compact state
+        """
+        encoding = self.encoding
+        items = [WorldStateItem(item_name, item_type)
+                 for (item_name, item_type) in zip(encoding.item_names, encoding.item_types)]
+        items_at_locations = {location: [] for location in encoding.locations[0:-len(encoding.arms)]}
+        for (index, location_index) in enumerate(self.item_locations):
+            if location_index >= 0:
+                items_at_locations[encoding.locations[location_index]].append(items[index])
+        # the world can only be made with every item in one place, so the other hands holding an item are filled in
+        # after making it, like perception does
+        placed_item_indices = set(index for (index, location_index) in enumerate(self.item_locations)
+                                  if location_index >= 0)
+        items_in_hands = {arm: None for arm in encoding.arms}
+        other_hands = []
+        for (arm, item_index) in zip(encoding.arms, self.hand_items):
+            if item_index < 0:
+                continue
+            if item_index in placed_item_indices:
+                other_hands.append((arm, items[item_index]))
+            else:
+                items_in_hands[arm] = items[item_index]
+                placed_item_indices.add(item_index)
+        container_states = {container: encoding.container_states[self.container_states[index]]
+                            for (index, container) in enumerate(encoding.containers)}
+        world_state = WorldState(WorldStateEnvironment(encoding.environment_name, items_at_locations, container_states,
+                                                       encoding.locations[0:-len(encoding.arms)], encoding.containers),
+                                 WorldStateRobot(encoding.robot_name, items_in_hands),
+                                 copy.copy(encoding.operator_fail_probabilities))
+        for (arm, item) in other_hands:
+            world_state.robot.teleport_item_to_hand(item, arm)
+        for (index, container) in enumerate(encoding.containers):
+            world_state.environment.container_states_confidences[container] = \
+                float(self.container_states_confidences[index])
+        locations_belief = self.locations_belief.reshape(len(encoding.item_names), len(encoding.locations))
+        for (index, item_name) in enumerate(encoding.item_names):
+            world_state.locations_belief[world_state.belief_rows[item_name]] = locations_belief[index]
+        world_state.version = self.version
+        world_state.probability_lattice = self.probability_lattice
+        return world_state
+
+    def copy(self):
+        return CompactWorldState(self.encoding, self.item_locations.copy(), self.hand_items.copy(),
+                                 self.locations_belief.copy(), self.container_states.copy(),
+                                 self.container_states_confidences.copy(), self.version, self.probability_lattice)
+
+    def __hash__(self):
+        if self.hash is None:
+            self.hash = hash((self.item_locations.tostring(), self.hand_items.tostring(),
+                              self.locations_belief.tostring(), self.container_states.tostring(),
+                              self.container_states_confidences.tostring()))
+        return self.hash
+
+    def __eq__(self, other):
+        return isinstance(other, CompactWorldState) and \
+               (self.encoding is other.encoding or self.encoding.key() == other.encoding.key()) and \
+               np.array_equal(self.item_locations, other.item_locations) and \
+               np.array_equal(self.hand_items, other.hand_items) and \
+               np.array_equal(self.locations_belief, other.locations_belief) and \
+               np.array_equal(self.container_states, other.container_states) and \
+               np.array_equal(self.container_states_confidences, other.container_states_confidences)
+
+    def __ne__(self, other):
+        return not self == other